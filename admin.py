@@ -1,4 +1,13 @@
-from django.contrib import admin
+from django.apps import apps
+from django.contrib import admin, messages
+from django.contrib.auth import get_permission_codename
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
+from django.db.models import Count
+from django.utils.translation import gettext_lazy as _
+
+from cmnsdjango import audit
+from cmnsdjango.models import AuditEntry
+from cmnsdjango.counters import get_count_columns
 
 class BaseModelAdmin(admin.ModelAdmin):
   list_display = ('__str__', 'status', 'user')
@@ -12,6 +21,19 @@ class BaseModelAdmin(admin.ModelAdmin):
     get_data['user'] = request.user.pk
     return get_data 
   
+  def get_queryset(self, request):
+    # The default manager, all_objects, includes revoked and deleted objects
+    # so they can be restored
+    queryset = super(BaseModelAdmin, self).get_queryset(request)
+    # Fetch the data for list_display columns in the changelist query 
+    # instead of running a query per row
+    list_display = self.get_list_display(request)
+    if 'user' in list_display:
+      queryset = queryset.select_related('user')
+    if 'count_sites' in list_display:
+      queryset = queryset.annotate(sites_count=Count('sites', distinct=True))
+    return queryset
+
   def get_list_display(self, request):
     # Start with the base list_display
     list_display = list(self.list_display)
@@ -20,4 +42,44 @@ class BaseModelAdmin(admin.ModelAdmin):
       list_display.append('count_sites')
     if hasattr(self.model, 'get_current'):
       list_display.append('get_current_version')
-    return list_display
\ No newline at end of file
+    # Add denormalized related object counts
+    list_display += [column for column in get_count_columns(self.model) if column not in list_display]
+    return list_display
+
+
+@admin.register(AuditEntry)
+class AuditEntryAdmin(admin.ModelAdmin):
+  list_display = ('date_created', 'user', 'model', 'object_id', 'field', 'action', 'old_value', 'new_value')
+  list_filter = ('model', 'action')
+  search_fields = ('object_id', 'field')
+  date_hierarchy = 'date_created'
+  ordering = ('-date_created',)
+  actions = ['undo_changes']
+
+  def has_add_permission(self, request):
+    return False
+
+  def has_change_permission(self, request, obj=None):
+    return False
+
+  def has_undo_permission(self, request):
+    return request.user.has_perm(f'{ self.opts.app_label }.{ get_permission_codename("undo", self.opts) }')
+
+  @admin.action(permissions=['undo'], description=_('Undo selected changes'))
+  def undo_changes(self, request, queryset):
+    undone, skipped = 0, []
+    # Newest first, so repeated changes of a field end at the oldest value
+    for entry in queryset.order_by('-date_created'):
+      try:
+        opts = apps.get_model(entry.model)._meta
+        if not request.user.has_perm(f'{ opts.app_label }.{ get_permission_codename("change", opts) }'):
+          skipped.append(_('{}: no permission to change {}').format(entry, opts.verbose_name_plural))
+          continue
+        audit.undo(entry, request.user)
+      except (LookupError, FieldDoesNotExist, ObjectDoesNotExist) as e:
+        skipped.append(f'{ entry }: { e }')
+        continue
+      undone += 1
+    self.message_user(request, _('undid {} changes').format(undone).capitalize())
+    if skipped:
+      self.message_user(request, _('skipped {} changes: {}').format(len(skipped), '; '.join(skipped)).capitalize(), level=messages.WARNING)
@@ -4,3 +4,25 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cmnsdjango'
+
+    def ready(self):
+        from django.apps import apps
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_save, post_delete
+        from cmnsdjango import events
+        from cmnsdjango.counters import connect_counters
+        from cmnsdjango.instrumentation import install_query_counter
+        from cmnsdjango.models import BaseModel
+        from cmnsdjango.views import suggestion_cache
+        connect_counters()
+        # Pass queries to the instrumentation and query budgets
+        connection_created.connect(install_query_counter, dispatch_uid='cmnsdjango_count_query')
+        # Invalidate cached suggestion candidates when objects change
+        for model in apps.get_models():
+            if issubclass(model, BaseModel):
+                post_save.connect(suggestion_cache.invalidate, sender=model)
+                post_delete.connect(suggestion_cache.invalidate, sender=model)
+        # Publish change events of changes made outside JsonSetAttribute
+        if getattr(settings, 'JSON_EVENTS', False):
+            events.connect_signals([model for model in apps.get_models() if issubclass(model, BaseModel)])
@@ -0,0 +1,249 @@
+import json
+import time
+from collections import defaultdict
+from itertools import islice
+
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+from django.utils.text import slugify
+
+from cmnsdjango.counters import counters
+from cmnsdjango.views.json_utils import get_defaults
+from cmnsdjango.views.suggestion_cache import invalidate
+
+''' Attribute Transfer
+    Streams the attributes of objects between environments as NDJSON, one
+    value or many-to-many link per line:
+
+      {"model": "archive.location", "object": "home", "field": "tags", "value": "Apple"}
+
+    Objects are identified by their slug, or by their primary key if the
+    model has no slug. Related objects are identified like JsonSetAttribute
+    does: by name or title, so missing related objects can be created, or
+    else by slug or primary key.
+
+    The export reads with values_list() and iterator(), so memory use does
+    not depend on the number of objects. The import reads batches of lines,
+    resolves the objects of a batch with one __in query per model, creates
+    through rows with bulk_create() and changes other fields with
+    bulk_update(). Missing related objects are created one by one with
+    save(), so the save() and signals of the model run. Values that can not
+    be resolved are collected in AttributeImporter.unresolved. Used by the
+    export_attributes and import_attributes management commands.
+'''
+
+TEXT_KEYS = ['name', 'title']
+
+
+def get_object_key(model):
+  ''' The field identifying objects of model: slug, or the primary key '''
+  if 'slug' in [field.name for field in model._meta.concrete_fields]:
+    return 'slug'
+  return model._meta.pk.name
+
+
+def get_related_key(model):
+  ''' The field identifying related objects of model: name or title, like JsonSetAttribute '''
+  names = [field.name for field in model._meta.concrete_fields]
+  for key in TEXT_KEYS:
+    if key in names:
+      return key
+  return get_object_key(model)
+
+
+def get_field(model, name):
+  ''' The field of model that can be transferred, or ValueError '''
+  field = model._meta.get_field(name)
+  if field.many_to_many and not field.auto_created:
+    if not field.remote_field.through._meta.auto_created:
+      raise ValueError(f"{model._meta.label}.{name} has a custom through model, which is not supported.")
+    return field
+  if not field.concrete or field.primary_key:
+    raise ValueError(f"{model._meta.label}.{name} can not be transferred.")
+  return field
+
+
+def batched(iterable, size):
+  iterator = iter(iterable)
+  while batch := list(islice(iterator, size)):
+    yield batch
+
+
+class Progress:
+  """
+  Reports the number of processed lines and the throughput at most every
+  interval seconds.
+  """
+
+  def __init__(self, write, interval=2):
+    self.write = write
+    self.interval = interval
+    self.start = self.reported = time.monotonic()
+
+  def rate(self, count):
+    return count / max(time.monotonic() - self.start, 1e-9)
+
+  def update(self, count):
+    if time.monotonic() - self.reported >= self.interval:
+      self.reported = time.monotonic()
+      self.write(f'{count} lines, {self.rate(count):.0f} lines/s')
+
+  def summary(self, count):
+    return f'{count} lines in {time.monotonic() - self.start:.2f}s, {self.rate(count):.0f} lines/s'
+
+
+class AttributeExporter:
+  def __init__(self, model, chunk_size=2000):
+    self.model = model
+    self.chunk_size = chunk_size
+    self.label = model._meta.label_lower
+    self.object_key = get_object_key(model)
+
+  def get_queryset(self, field):
+    ''' (object, value) rows of the field '''
+    if field.many_to_many:
+      through = field.remote_field.through
+      related_key = get_related_key(field.related_model)
+      return through._base_manager.order_by('pk').values_list(
+        f'{ field.m2m_field_name() }__{ self.object_key }',
+        f'{ field.m2m_reverse_field_name() }__{ related_key }',
+      )
+    value = f'{ field.name }__{ get_related_key(field.related_model) }' if field.is_relation else field.name
+    return self.model._base_manager.order_by('pk').values_list(self.object_key, value)
+
+  def records(self, name):
+    field = get_field(self.model, name)
+    for obj, value in self.get_queryset(field).iterator(chunk_size=self.chunk_size):
+      yield {'model': self.label, 'object': obj, 'field': field.name, 'value': value}
+
+  def lines(self, names):
+    for name in names:
+      for record in self.records(name):
+        yield json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+class AttributeImporter:
+  """
+  Imports records in batches. Links that already exist are ignored, values
+  of other fields are overwritten. Records of objects that do not exist are
+  skipped. Related values that do not match an object and could not be
+  created are skipped and collected per model in unresolved.
+  """
+
+  def __init__(self, batch_size=1000, create_missing=True, user=None):
+    self.batch_size = batch_size
+    self.create_missing = create_missing
+    self.user = user
+    self.stats = defaultdict(int)
+    self.linked_fields = set()
+    self.unresolved = defaultdict(set)
+
+  def get_key_map(self, model, key, values):
+    ''' Map the values of key to primary keys, case-insensitively for name and title '''
+    values = list(values)
+    if not values:
+      return {}
+    queryset = model._base_manager.all()
+    if key in TEXT_KEYS:
+      queryset = queryset.alias(lookup_value=Lower(key)).filter(lookup_value__in=[value.lower() for value in values])
+      return {value.lower(): pk for value, pk in queryset.values_list(key, 'pk')}
+    return dict(queryset.filter(**{f'{ key }__in': values}).values_list(key, 'pk'))
+
+  def create_related(self, model, key, values):
+    ''' Create related objects with save(), skipping names without a slug of their own '''
+    has_slug = 'slug' in [field.name for field in model._meta.concrete_fields]
+    slugs = set()
+    for value in values:
+      fields = {key: value}
+      if has_slug:
+        slug = slugify(value)
+        if not slug or slug in slugs:
+          # No slug, or the slug of another new object
+          continue
+        slugs.add(slug)
+        fields['slug'] = slug
+      try:
+        with transaction.atomic():
+          model(**get_defaults(model, fields, self.user)).save()
+      except IntegrityError:
+        # The slug is taken by an object with another name
+        pass
+
+  def resolve_related(self, model, values):
+    ''' Map the values to primary keys of related objects, creating the missing ones '''
+    key = get_related_key(model)
+    found = self.get_key_map(model, key, values)
+    normalize = str.lower if key in TEXT_KEYS else (lambda value: value)
+    if key in TEXT_KEYS and self.create_missing:
+      missing = {value.lower(): value for value in values if value.lower() not in found}
+      if missing:
+        self.create_related(model, key, missing.values())
+        created = self.get_key_map(model, key, missing.values())
+        self.stats['created'] += len(created)
+        found |= created
+        invalidate(model)
+    self.unresolved[model._meta.label_lower].update(value for value in values if normalize(value) not in found)
+    return found
+
+  def import_records(self, model, field, records):
+    objects = self.get_key_map(model, get_object_key(model), {record['object'] for record in records})
+    records = [record for record in records if record['object'] in objects]
+    if field.is_relation:
+      related_model = field.related_model
+      values = {record['value'] for record in records if record['value'] is not None}
+      related = self.resolve_related(related_model, values)
+      normalize = str.lower if get_related_key(related_model) in TEXT_KEYS else (lambda value: value)
+    if field.many_to_many:
+      through = field.remote_field.through
+      source = through._meta.get_field(field.m2m_field_name()).attname
+      target = through._meta.get_field(field.m2m_reverse_field_name()).attname
+      rows = [
+        through(**{source: objects[record['object']], target: related[normalize(record['value'])]})
+        for record in records if record['value'] is not None and normalize(record['value']) in related
+      ]
+      through._base_manager.bulk_create(rows, batch_size=self.batch_size, ignore_conflicts=True)
+      self.stats['linked'] += len(rows)
+      self.linked_fields.add((model, field.name))
+      return len(rows)
+    instances = []
+    for record in records:
+      if field.is_relation:
+        value = None if record['value'] is None else related.get(normalize(record['value']))
+        if value is None and record['value'] is not None:
+          continue
+      else:
+        value = field.to_python(record['value'])
+      instances.append(model(**{model._meta.pk.attname: objects[record['object']], field.attname: value}))
+    model._base_manager.bulk_update(instances, [field.attname], batch_size=self.batch_size)
+    self.stats['updated'] += len(instances)
+    return len(instances)
+
+  def import_batch(self, records):
+    groups = defaultdict(list)
+    for record in records:
+      groups[(record['model'], record['field'])].append(record)
+    with transaction.atomic():
+      for (label, name), group in groups.items():
+        model = apps.get_model(label)
+        imported = self.import_records(model, get_field(model, name), group)
+        self.stats['skipped'] += len(group) - imported
+
+  def import_lines(self, lines):
+    ''' Import NDJSON lines, yields the number of lines read after every batch '''
+    count = 0
+    records = (json.loads(line) for line in lines if line.strip())
+    for batch in batched(records, self.batch_size):
+      self.import_batch(batch)
+      count += len(batch)
+      yield count
+
+  def rebuild_counts(self):
+    ''' Recount the counted relations that received links, bulk_create() sends no m2m_changed '''
+    rebuilt = []
+    for counter in counters:
+      if (counter.model, counter.field.name) in self.linked_fields:
+        counter.rebuild(batch_size=self.batch_size)
+        rebuilt.append(counter.key)
+    return rebuilt
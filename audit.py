@@ -0,0 +1,242 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from cmnsdjango import events
+
+''' Audit
+    Records who changed which field of which object through JsonSetAttribute,
+    with the old and the new value, when JSON_AUDIT is True. Events are
+    recorded by JsonUtils.record_change() and put on a bounded in-process
+    queue when the transaction of the change commits, so changes that are
+    rolled back are not recorded and writing them does not add latency to
+    the request. A background thread writes them in batches to the sinks in
+    JSON_AUDIT_SINKS:
+    - 'cmnsdjango.audit.DatabaseSink' (default): AuditEntry rows, written
+      with bulk_create(). Run migrate to create the table.
+    - 'cmnsdjango.audit.JsonlSink': appends a JSON line per event to the
+      file in JSON_AUDIT_JSONL_PATH.
+    A sink is a class with a write(events) method.
+
+    Settings:
+    - JSON_AUDIT_QUEUE_SIZE (default 10000): events waiting to be written.
+      When the queue is full, events are dropped and logged, requests never
+      wait for the sinks.
+    - JSON_AUDIT_BATCH_SIZE (default 500): events written at once.
+    - JSON_AUDIT_FLUSH_INTERVAL (default 1): seconds to wait for more events
+      before writing a partial batch.
+    The queue is flushed when the process exits.
+
+    The values of an event are enough to revert it, see undo(), which
+    records the reversal as an event of its own.
+'''
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeEvent:
+  """
+  A change of a field of an object. Values of related fields are primary
+  keys: for many-to-many fields the added object is the new value and the
+  removed object is the old value.
+  """
+
+  def __init__(self, model, object_id, field, action, old_value=None, new_value=None, user_id=None, date_created=None):
+    self.model = model
+    self.object_id = str(object_id)
+    self.field = field
+    self.action = action
+    self.old_value = to_json(old_value)
+    self.new_value = to_json(new_value)
+    self.user_id = user_id
+    self.date_created = date_created or timezone.now()
+
+  @classmethod
+  def from_change(cls, obj, field, action, old_value=None, new_value=None, user=None):
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    return cls(obj._meta.label_lower, obj.pk, field, action, old_value, new_value, user_id)
+
+  def as_dict(self):
+    return {
+      'date_created': self.date_created.isoformat(),
+      'user': self.user_id,
+      'model': self.model,
+      'object_id': self.object_id,
+      'field': self.field,
+      'action': self.action,
+      'old_value': self.old_value,
+      'new_value': self.new_value,
+    }
+
+
+def to_json(value):
+  ''' The value as stored in the audit log, such as ISO strings for dates '''
+  return json.loads(json.dumps(value, cls=DjangoJSONEncoder))
+
+
+def undo(event, user=None):
+  """
+  Revert a ChangeEvent or AuditEntry: restore the old value of the field,
+  or remove an added object from, or add a removed object to, a
+  many-to-many field. The reversal is recorded as a change with the action
+  'undo' when JSON_AUDIT is True, so it can be undone in turn.
+  """
+  from django.apps import apps
+  model = apps.get_model(event.model)
+  obj = model._base_manager.get(pk=event.object_id)
+  field = model._meta.get_field(event.field)
+  if field.many_to_many:
+    related_manager = getattr(obj, field.name)
+    if event.new_value is not None:
+      related_manager.remove(event.new_value)
+    if event.old_value is not None:
+      related_manager.add(event.old_value)
+    # The removed object is the old value and the added object the new value
+    old_value, new_value = event.new_value, event.old_value
+  else:
+    old_value, new_value = getattr(obj, field.attname), event.old_value
+    setattr(obj, field.attname, event.old_value)
+    update_fields = [field.name] + [f.name for f in model._meta.concrete_fields if getattr(f, 'auto_now', False)]
+    obj.save(update_fields=update_fields)
+  if getattr(settings, 'JSON_AUDIT', False):
+    record(ChangeEvent.from_change(obj, field.name, 'undo', old_value, new_value, user), obj._state.db)
+  return obj
+
+
+class DatabaseSink:
+  def write(self, events):
+    from cmnsdjango.models import AuditEntry
+    AuditEntry.objects.bulk_create([
+      AuditEntry(
+        date_created=event.date_created,
+        user_id=event.user_id,
+        model=event.model,
+        object_id=event.object_id,
+        field=event.field,
+        action=event.action,
+        old_value=event.old_value,
+        new_value=event.new_value,
+      ) for event in events
+    ])
+
+
+class JsonlSink:
+  def __init__(self):
+    self.path = getattr(settings, 'JSON_AUDIT_JSONL_PATH', None)
+    if not self.path:
+      raise ImproperlyConfigured('JsonlSink requires JSON_AUDIT_JSONL_PATH')
+
+  def write(self, events):
+    with open(self.path, 'a', encoding='utf-8') as file:
+      file.writelines(json.dumps(event.as_dict(), ensure_ascii=False) + '\n' for event in events)
+
+
+class AuditWriter:
+  """
+  Writes the queued events to the sinks in a background thread. The thread
+  is started on the first event of a process, so forked workers start their
+  own.
+  """
+
+  def __init__(self, sinks, queue_size=10000, batch_size=500, interval=1):
+    self.sinks = sinks
+    self.queue_size = queue_size
+    self.batch_size = batch_size
+    self.interval = interval
+    self.lock = threading.Lock()
+    self.pid = None
+    self.thread = None
+    self.dropped = 0
+
+  def start(self):
+    with self.lock:
+      if self.pid != os.getpid():
+        self.pid = os.getpid()
+        self.queue = queue.Queue(self.queue_size)
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='cmnsdjango-audit', daemon=True)
+        self.thread.start()
+
+  def put(self, event):
+    if self.pid != os.getpid():
+      self.start()
+    try:
+      self.queue.put_nowait(event)
+    except queue.Full:
+      self.dropped += 1
+      logger.warning('Audit queue is full, dropped %s events', self.dropped)
+
+  def next_batch(self):
+    ''' Wait for an event, then take the events that are queued up to batch_size '''
+    try:
+      batch = [self.queue.get(timeout=self.interval)]
+    except queue.Empty:
+      return []
+    while len(batch) < self.batch_size:
+      try:
+        batch.append(self.queue.get_nowait())
+      except queue.Empty:
+        break
+    # None only wakes the thread to stop
+    return [event for event in batch if event is not None]
+
+  def run(self):
+    while True:
+      batch = self.next_batch()
+      if batch:
+        self.write(batch)
+      if self.stopping.is_set() and self.queue.empty():
+        return
+
+  def write(self, batch):
+    close_old_connections()
+    for sink in self.sinks:
+      try:
+        sink.write(batch)
+      except Exception:
+        logger.exception('Audit sink %s failed to write %s events', sink.__class__.__name__, len(batch))
+
+  def flush(self, timeout=10):
+    ''' Write the queued events and stop the thread, called when the process exits '''
+    if self.thread is None or self.pid != os.getpid():
+      return
+    self.stopping.set()
+    try:
+      self.queue.put(None, timeout=timeout)
+    except queue.Full:
+      # The thread is busy writing and stops when the queue is empty
+      pass
+    self.thread.join(timeout)
+
+
+writer = None
+writer_lock = threading.Lock()
+
+def get_writer():
+  global writer
+  with writer_lock:
+    if writer is None:
+      sinks = [import_string(path)() for path in getattr(settings, 'JSON_AUDIT_SINKS', ['cmnsdjango.audit.DatabaseSink'])]
+      writer = AuditWriter(
+        sinks,
+        queue_size=getattr(settings, 'JSON_AUDIT_QUEUE_SIZE', 10000),
+        batch_size=getattr(settings, 'JSON_AUDIT_BATCH_SIZE', 500),
+        interval=getattr(settings, 'JSON_AUDIT_FLUSH_INTERVAL', 1),
+      )
+      atexit.register(writer.flush)
+  return writer
+
+
+def record(event, using=None):
+  ''' Queue a ChangeEvent to be written to the sinks when the transaction on the database commits '''
+  events.on_commit(lambda: get_writer().put(event), using)
@@ -0,0 +1,7 @@
+''' Benchmarks for cmnsdjango
+
+    Run from the repository root:
+      python benchmarks/run.py --rows 10000 --output results.json
+
+    See docs/benchmarks.md for the options and the output format.
+'''
@@ -0,0 +1,45 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+
+from cmnsdjango.models import BaseModel, MultiSiteBaseModel, case_insensitive_unique
+
+''' Benchmark models
+    Minimal models resembling a CMNS project: locations with tags, a
+    visibility field and a user profile with family members, as used by
+    the visibility filters.
+'''
+
+visibility_choices = (
+  ('p', 'public'),
+  ('c', 'community'),
+  ('f', 'family'),
+  ('q', 'private'),
+)
+
+class Tag(BaseModel):
+  name = models.CharField(max_length=100)
+  slug = models.SlugField(unique=True)
+  location_count = models.PositiveIntegerField(default=0, editable=False)
+  allow_read_attribute = True
+
+  class Meta(BaseModel.Meta):
+    constraints = [case_insensitive_unique('name')]
+
+class Location(MultiSiteBaseModel):
+  name = models.CharField(max_length=100)
+  slug = models.SlugField(unique=True)
+  description = models.TextField(blank=True)
+  featured = models.BooleanField(default=False)
+  visibility = models.CharField(max_length=1, choices=visibility_choices, default='p')
+  tags = models.ManyToManyField(Tag, blank=True)
+  allow_read_attribute = True
+  allow_suggest_attribute = True
+  allow_set_attribute = True
+  counted_relations = ['tags']
+
+class Profile(models.Model):
+  user = models.OneToOneField(get_user_model(), on_delete=models.CASCADE, related_name='profile')
+  family = models.ManyToManyField(get_user_model(), blank=True, related_name='family_of')
+  hide_least_liked = models.BooleanField(default=False)
+  dislike = models.ManyToManyField(Location, blank=True)
+  ignored_tags = models.ManyToManyField(Tag, blank=True)
@@ -0,0 +1,105 @@
+import random
+import time
+
+''' Fixture generator for the benchmarks
+
+    Generates users, tags and locations with bulk inserts, so fixtures of
+    10^3 to 10^6 locations can be created in reasonable time. The related
+    set sizes are configurable: every location gets tags_per_object tags,
+    picked from a pool of tags tags. Names are made of syllables so search
+    queries on a prefix have realistic numbers of matches.
+    Import after Django has been set up.
+'''
+
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+
+from cmnsdjango.benchmarks.benchapp.models import Location, Profile, Tag
+from cmnsdjango.counters import counters
+
+syllables = ['ba', 'ca', 'da', 'el', 'fo', 'ga', 'hu', 'in', 'jo', 'ka', 'lu', 'mi', 'no', 'or', 'pa', 'ri', 'sa', 'tu', 've', 'zo']
+
+
+def chunks(iterable, size):
+  chunk = []
+  for item in iterable:
+    chunk.append(item)
+    if len(chunk) == size:
+      yield chunk
+      chunk = []
+  if chunk:
+    yield chunk
+
+
+def bulk_create(model, objects, batch_size):
+  for chunk in chunks(objects, batch_size):
+    model.objects.bulk_create(chunk, batch_size=batch_size)
+
+
+def make_name(rng, index):
+  word = ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+  return f'{word} {index}'
+
+
+def generate(rows=1000, tags=100, tags_per_object=5, users=10, seed=0, batch_size=1000):
+  """
+  Generate the benchmark fixtures and return the number of created objects.
+  Statuses and visibilities are distributed like a typical project: mostly
+  published and public, with some concepts, revoked and private objects.
+  """
+  rng = random.Random(seed)
+  start = time.perf_counter()
+  User = get_user_model()
+  bulk_create(User, (User(username=f'user{index}', password='!') for index in range(users)), batch_size)
+  user_pks = list(User.objects.order_by('pk').values_list('pk', flat=True))
+  bulk_create(Profile, (Profile(user_id=pk) for pk in user_pks), batch_size)
+  # Every user has the next user as family member
+  Profile.family.through.objects.bulk_create([
+    Profile.family.through(profile_id=profile_pk, user_id=user_pks[(index + 1) % len(user_pks)])
+    for index, profile_pk in enumerate(Profile.objects.order_by('user_id').values_list('pk', flat=True))
+  ], batch_size=batch_size)
+
+  bulk_create(Tag, (
+    Tag(name=make_name(rng, index), slug=f'tag-{index}', status=rng.choices('pcr', weights=[90, 5, 5])[0], user_id=rng.choice(user_pks))
+    for index in range(tags)
+  ), batch_size)
+  tag_pks = list(Tag.objects.all_with_deleted().values_list('pk', flat=True))
+
+  bulk_create(Location, (
+    Location(
+      name=make_name(rng, index),
+      slug=f'location-{index}',
+      description=' '.join(make_name(rng, index) for _ in range(5)),
+      status=rng.choices('pcrx', weights=[85, 5, 5, 5])[0],
+      visibility=rng.choices('pcfq', weights=[70, 10, 10, 10])[0],
+      user_id=rng.choice(user_pks),
+    )
+    for index in range(rows)
+  ), batch_size)
+
+  site = Site.objects.get_current()
+  location_pks = list(Location.objects.all_with_deleted().values_list('pk', flat=True))
+  for chunk in chunks(location_pks, batch_size):
+    Location.sites.through.objects.bulk_create(
+      [Location.sites.through(location_id=pk, site_id=site.pk) for pk in chunk],
+      batch_size=batch_size,
+    )
+    Location.tags.through.objects.bulk_create(
+      [
+        Location.tags.through(location_id=pk, tag_id=tag_pk)
+        for pk in chunk
+        for tag_pk in rng.sample(tag_pks, min(tags_per_object, len(tag_pks)))
+      ],
+      batch_size=batch_size,
+    )
+  # Bulk inserts do not send m2m_changed, so rebuild the counts
+  for counter in counters:
+    counter.rebuild(batch_size=batch_size)
+
+  return {
+    'seconds': round(time.perf_counter() - start, 3),
+    'users': len(user_pks),
+    'tags': len(tag_pks),
+    'locations': rows,
+    'location_tags': Location.tags.through.objects.count(),
+  }
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Measure the import time of cmnsdjango modules and check it against a budget,
+so slow or unrelated imports do not creep into the startup of every worker.
+
+Every module is imported in a fresh interpreter after django.setup() and
+timed with time.perf_counter(), so modules imported in any way, also with
+importlib.import_module(), are counted. The minimum of the runs is reported,
+which is the least disturbed by other processes. The budget of 'cmnsdjango'
+is the app itself: the time django.setup() takes with cmnsdjango in
+INSTALLED_APPS, including its models and ready(), minus the time without
+it, measured in alternating runs. Both runs first import the modules that
+django.setup() imports without the app, so most of the timed part is the
+app itself. The app also has a budget for the number of modules it adds,
+which does not vary between runs. The slowest imported modules are listed from
+an extra run with python -X importtime, which does not list modules
+imported with importlib.import_module() and slows down the imports, so its
+times are not used for the budget. Modules in --forbid must not be imported
+at all, for example heavy libraries that should only be imported on first
+use. Exits with status 1 when a budget is exceeded, the app measures a
+negative time or a forbidden module is imported.
+
+Usage:
+  python benchmarks/importtime.py [--budget cmnsdjango.urls=50] [--modules cmnsdjango=35] [--repeat 20] [--top 10]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from project import repository
+
+APP = 'cmnsdjango'
+MARKER = 'cmnsdjango-importtime-start'
+BUDGETS = {
+  # django.setup() with the app, see above. Includes the views, which the
+  # ready() of the app imports through cmnsdjango.views.
+  APP: 20,
+  'cmnsdjango.urls': 50,
+  'cmnsdjango.middleware': 10,
+  'cmnsdjango.templatetags.markdown': 10,
+  'cmnsdjango.templatetags.textmanipulation': 10,
+}
+MODULE_BUDGETS = {
+  # Modules the app adds to django.setup()
+  APP: 35,
+}
+FORBIDDEN = ['markdown', 'redis', 'archive']
+INSTALLED_APPS = [
+  'django.contrib.auth',
+  'django.contrib.contenttypes',
+  'django.contrib.sessions',
+  'django.contrib.messages',
+  'django.contrib.sites',
+]
+
+BOOTSTRAP = '''
+import json
+import sys
+import time
+import django
+from django.conf import settings
+settings.configure(
+  INSTALLED_APPS=__APPS__,
+  DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+  DEFAULT_AUTO_FIELD='django.db.models.BigAutoField',
+)
+for name in __PRELOAD__:
+  try:
+    __import__(name)
+  except Exception:
+    pass
+start = time.perf_counter()
+django.setup()
+setup = time.perf_counter() - start
+loaded = set(sys.modules)
+print('__MARKER__', file=sys.stderr, flush=True)
+start = time.perf_counter()
+import __MODULE__
+duration = time.perf_counter() - start
+print(json.dumps({
+  'setup': setup,
+  'import': duration,
+  'setup_modules': sorted(loaded),
+  'modules': sorted(set(sys.modules) - loaded),
+}))
+'''
+
+
+def parse_arguments():
+  parser = argparse.ArgumentParser(description='Check the import time of cmnsdjango modules against a budget')
+  parser.add_argument('--budget', action='append', default=[], metavar='MODULE=MS', help='Budget in milliseconds for a module, can be repeated')
+  parser.add_argument('--modules', action='append', default=[], metavar='MODULE=COUNT', help='Maximum number of modules a module imports, can be repeated')
+  parser.add_argument('--forbid', action='append', default=[], metavar='MODULE', help='Module that must not be imported, can be repeated')
+  parser.add_argument('--repeat', type=int, default=20, help='Measurements per module, the minimum is reported')
+  parser.add_argument('--top', type=int, default=10, help='Number of slowest imported modules to list')
+  return parser.parse_args()
+
+
+def parse_importtime(output, start=True):
+  ''' Return the (module, self_us) pairs imported after the marker, or before it when start is False '''
+  before, _, after = output.partition(MARKER)
+  modules = []
+  for line in (after if start else before).splitlines():
+    if not line.startswith('import time:') or 'self [us]' in line:
+      continue
+    self_us, cumulative_us, name = line[len('import time:'):].split('|')
+    modules.append((name.strip(), int(self_us)))
+  return modules
+
+
+def measure(module, workdir, apps, importtime=False, preload=()):
+  ''' Return the measurement of a fresh interpreter, and the -X importtime list of its imports if importtime '''
+  code = BOOTSTRAP.replace('__MARKER__', MARKER).replace('__MODULE__', module).replace('__APPS__', repr(apps)).replace('__PRELOAD__', repr(sorted(preload)))
+  environment = os.environ | {'PYTHONPATH': str(workdir)}
+  options = ['-X', 'importtime'] if importtime else []
+  result = subprocess.run([sys.executable, *options, '-c', code], capture_output=True, text=True, env=environment)
+  if result.returncode != 0:
+    raise SystemExit(f'Importing {module} failed:\n{result.stderr[-2000:]}')
+  return json.loads(result.stdout), result.stderr
+
+
+def measure_app(workdir, repeat):
+  ''' Return the time the app adds to django.setup() in ms, the modules and the importtime output '''
+  measurement, output = measure('django', workdir, INSTALLED_APPS + [APP], importtime=True)
+  baseline = measure('django', workdir, INSTALLED_APPS)[0]
+  imported = set(measurement['setup_modules']) - set(baseline['setup_modules'])
+  # Import what django.setup() imports without the app beforehand, so the
+  # timed part is mostly the app and its noise is small
+  preload = baseline['setup_modules']
+  with_app, without_app = [], []
+  for _ in range(repeat):
+    # Alternate the runs, so a slow period affects both equally
+    with_app.append(measure('django', workdir, INSTALLED_APPS + [APP], preload=preload)[0]['setup'])
+    without_app.append(measure('django', workdir, INSTALLED_APPS, preload=preload)[0]['setup'])
+  total = (min(with_app) - min(without_app)) * 1000
+  return total, imported, [(name, self_us) for name, self_us in parse_importtime(output, start=False) if name in imported]
+
+
+def measure_module(module, workdir, repeat):
+  ''' Return the minimum import time of the module in ms, the modules and the importtime output '''
+  total = min(measure(module, workdir, INSTALLED_APPS + [APP])[0]['import'] for _ in range(repeat)) * 1000
+  measurement, output = measure(module, workdir, INSTALLED_APPS + [APP], importtime=True)
+  return total, measurement['modules'], parse_importtime(output)
+
+
+def main():
+  arguments = parse_arguments()
+  budgets = BUDGETS | {key: float(value) for key, value in (budget.split('=') for budget in arguments.budget)}
+  module_budgets = MODULE_BUDGETS | {key: int(value) for key, value in (budget.split('=') for budget in arguments.modules)}
+  forbidden = FORBIDDEN + arguments.forbid
+  workdir = Path(tempfile.mkdtemp(prefix='cmnsdjango-importtime-'))
+  os.symlink(repository, workdir / 'cmnsdjango')
+  failures = []
+  try:
+    for module, budget in budgets.items():
+      if module == APP:
+        total, imported, timed = measure_app(workdir, arguments.repeat)
+      else:
+        total, imported, timed = measure_module(module, workdir, arguments.repeat)
+      module_budget = module_budgets.get(module)
+      status = 'ok'
+      if total < 0:
+        status = 'UNRELIABLE'
+        failures.append(f'{module} took {total:.1f} ms, the measurement is too noisy, try a higher --repeat')
+      elif total > budget:
+        status = 'OVER BUDGET'
+        failures.append(f'{module} took {total:.1f} ms, budget is {budget:g} ms')
+      if module_budget is not None and len(imported) > module_budget:
+        status = 'OVER BUDGET'
+        failures.append(f'{module} imported {len(imported)} modules, budget is {module_budget}')
+      counted = f' (budget {module_budget})' if module_budget is not None else ''
+      print(f'{module}: {total:.1f} ms (budget {budget:g} ms), {len(imported)} modules imported{counted}: {status}')
+      for name, self_us in sorted(timed, key=lambda item: item[1], reverse=True)[:arguments.top]:
+        print(f'  {self_us / 1000:8.1f} ms  {name}')
+      for name in forbidden:
+        if any(imported_name == name or imported_name.startswith(f'{name}.') for imported_name in imported):
+          failures.append(f'{module} imports {name}')
+  finally:
+    shutil.rmtree(workdir, ignore_errors=True)
+  if failures:
+    print('\n'.join(['', 'Import budget exceeded:'] + failures))
+    raise SystemExit(1)
+
+
+if __name__ == '__main__':
+  main()
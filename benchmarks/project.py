@@ -0,0 +1,145 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+''' Throwaway Django project for the benchmarks
+
+    The repository is the cmnsdjango app itself, so it is made importable
+    by a symlink named cmnsdjango in a temporary directory. The database is
+    created with the test database machinery of Django and destroyed
+    afterwards, so the benchmarks never touch an existing database.
+
+    PostgreSQL uses the standard PG* environment variables for the
+    connection and requires psycopg to be installed. With replica=True, a
+    second SQLite database is configured as the 'replica' alias, which
+    copy_to_replica() fills with a copy of the default database.
+'''
+
+repository = Path(__file__).resolve().parent.parent
+
+
+def get_database(engine, workdir):
+  if engine == 'sqlite':
+    database = workdir / 'bench.sqlite3'
+    return {
+      'ENGINE': 'django.db.backends.sqlite3',
+      'NAME': str(database),
+      'TEST': {'NAME': str(database)},
+    }
+  if engine == 'postgresql':
+    try:
+      import psycopg  # noqa: F401
+    except ImportError:
+      try:
+        import psycopg2  # noqa: F401
+      except ImportError:
+        raise SystemExit('PostgreSQL benchmarks require psycopg or psycopg2')
+    return {
+      'ENGINE': 'django.db.backends.postgresql',
+      'NAME': os.environ.get('PGDATABASE', 'postgres'),
+      'USER': os.environ.get('PGUSER', ''),
+      'PASSWORD': os.environ.get('PGPASSWORD', ''),
+      'HOST': os.environ.get('PGHOST', ''),
+      'PORT': os.environ.get('PGPORT', ''),
+      'TEST': {'NAME': 'test_cmnsdjango_benchmarks'},
+    }
+  raise SystemExit(f'Unsupported database: {engine}')
+
+
+class Project:
+  """
+  Configures Django, creates the benchmark database and cleans up afterwards.
+  Use as a context manager:
+    with Project('sqlite'):
+      ...
+  """
+
+  def __init__(self, engine='sqlite', settings={}, replica=False):
+    if replica and engine != 'sqlite':
+      raise SystemExit('A replica is only supported with SQLite')
+    self.engine = engine
+    self.settings = settings
+    self.replica = replica
+    self.workdir = None
+    self.old_name = None
+
+  def __enter__(self):
+    self.workdir = Path(tempfile.mkdtemp(prefix='cmnsdjango-benchmarks-'))
+    os.symlink(repository, self.workdir / 'cmnsdjango')
+    sys.path.insert(0, str(self.workdir))
+    self.configure()
+    import django
+    django.setup()
+    from django.db import connection
+    self.old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    return self
+
+  def __exit__(self, *exc_info):
+    from django.db import connection
+    try:
+      connection.creation.destroy_test_db(self.old_name, verbosity=0)
+    finally:
+      sys.path.remove(str(self.workdir))
+      shutil.rmtree(self.workdir, ignore_errors=True)
+
+  def get_databases(self):
+    databases = {'default': get_database(self.engine, self.workdir)}
+    if self.replica:
+      replica = self.workdir / 'replica.sqlite3'
+      databases['replica'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(replica), 'TEST': {'NAME': str(replica)}}
+    return databases
+
+  def copy_to_replica(self):
+    ''' Copy the default database to the replica, like a replica that caught up '''
+    from django.db import connections
+    connections['replica'].close()
+    source = sqlite3.connect(connections['default'].settings_dict['NAME'])
+    target = sqlite3.connect(connections['replica'].settings_dict['NAME'])
+    try:
+      source.backup(target)
+    finally:
+      source.close()
+      target.close()
+
+  def configure(self):
+    from django.conf import settings
+    settings.configure(**({
+      'DEBUG': False,
+      'SECRET_KEY': 'cmnsdjango-benchmarks',
+      'ALLOWED_HOSTS': ['*'],
+      'INSTALLED_APPS': [
+        'django.contrib.auth',
+        'django.contrib.contenttypes',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+        'django.contrib.sites',
+        'cmnsdjango',
+        'cmnsdjango.benchmarks.benchapp',
+      ],
+      'MIDDLEWARE': [
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+      ],
+      'DATABASES': self.get_databases(),
+      'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+      'ROOT_URLCONF': 'cmnsdjango.benchmarks.benchapp.urls',
+      'TEMPLATES': [{
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'APP_DIRS': True,
+        'OPTIONS': {
+          'context_processors': [
+            'django.template.context_processors.request',
+            'django.contrib.auth.context_processors.auth',
+          ],
+        },
+      }],
+      'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+      'DEFAULT_AUTO_FIELD': 'django.db.models.BigAutoField',
+      'SITE_ID': 1,
+      'USE_TZ': True,
+    } | self.settings))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Check the read routing of the JSON views with two SQLite databases, the
+default database and a 'replica' set as JSON_READ_DATABASE, and time the
+reads from both.
+
+After the fixtures are copied to the replica, the script checks that
+- JsonGetAttributes reads the object from the replica,
+- JsonSetAttribute writes to the default database and sets the
+  cmnsdjango_write cookie,
+- with the cookie, reads go to the default database and show the change,
+- without the cookie, reads go to the replica again, which has not seen
+  the change.
+Exits with status 1 when a check fails.
+
+Usage:
+  python benchmarks/read_database.py [--rows 200] [--iterations 50]
+"""
+import argparse
+import json
+import statistics
+import time
+
+from project import Project
+
+
+def parse_arguments():
+  parser = argparse.ArgumentParser(description='Check and time reads from JSON_READ_DATABASE')
+  parser.add_argument('--rows', type=int, default=200, help='Number of locations')
+  parser.add_argument('--iterations', type=int, default=50, help='Measured reads per database')
+  return parser.parse_args()
+
+
+def get_object_queries(alias, table, function):
+  ''' Call function and return its result and the queries on the table of the database alias '''
+  from django.db import connections
+  from django.test.utils import CaptureQueriesContext
+  with CaptureQueriesContext(connections[alias]) as context:
+    result = function()
+  return result, [query['sql'] for query in context.captured_queries if table in query['sql']]
+
+
+def main():
+  options = parse_arguments()
+  with Project('sqlite', {'JSON_READ_DATABASE': 'replica'}, replica=True) as project:
+    import fixtures
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+    from cmnsdjango.benchmarks.benchapp.models import Location
+    from cmnsdjango.views.json_utils import WRITE_COOKIE
+
+    fixtures.generate(rows=options.rows, tags=20, tags_per_object=2, users=2)
+    project.copy_to_replica()
+    client = Client()
+    client.force_login(get_user_model().objects.order_by('pk').first())
+    location = Location.objects.published().filter(visibility='p').first()
+    url = f'/json/location/{location.slug}/attribute/featured/'
+    table = Location._meta.db_table
+    failures = []
+
+    def read():
+      ''' The featured value and the databases the location was read from '''
+      def get():
+        response = client.get(url)
+        return response.json()['payload'] if response.status_code == 200 else response.status_code
+      (payload, default), replica = get_object_queries('replica', table, lambda: get_object_queries('default', table, get))
+      return payload, bool(default), bool(replica)
+
+    def check(name, condition):
+      print(f"{'ok' if condition else 'FAILED'}: {name}")
+      if not condition:
+        failures.append(name)
+
+    before, default, replica = read()
+    check('reads go to JSON_READ_DATABASE', replica and not default)
+    response = client.post(f'/json/location/{location.slug}/set/featured/', json.dumps({'value': '1'}), content_type='application/json')
+    check('the change is written to the default database', response.status_code == 200 and Location.objects.using('default').get(pk=location.pk).featured != location.featured)
+    check(f'the change sets the {WRITE_COOKIE} cookie', WRITE_COOKIE in response.cookies)
+    after, default, replica = read()
+    check('with the cookie, reads go to the default database', default and not replica)
+    check('with the cookie, the change is visible', after != before)
+    client.cookies.pop(WRITE_COOKIE, None)
+    stale, default, replica = read()
+    check('without the cookie, reads go to the replica again', replica and not default)
+    check('the replica has not seen the change', stale == before)
+
+    for name, cookies in [('replica', {}), ('default', {WRITE_COOKIE: str(time.time())})]:
+      timings = []
+      for _ in range(options.iterations):
+        client.cookies.pop(WRITE_COOKIE, None)
+        for key, value in cookies.items():
+          client.cookies[key] = value
+        start = time.perf_counter()
+        client.get(url)
+        timings.append(time.perf_counter() - start)
+      print(f'read from {name}: median {statistics.median(timings) * 1000:.2f} ms over {options.iterations} reads')
+
+  if failures:
+    print('\n'.join(['', 'Read routing failed:'] + failures))
+    raise SystemExit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Benchmark the cmnsdjango JSON endpoints and queryset filters.
+
+Sets up a throwaway Django project, generates fixtures and measures latency
+percentiles, query counts and peak memory per scenario. The results are
+written as JSON so runs can be compared across commits.
+
+Usage:
+  python benchmarks/run.py [--rows 1000] [--database sqlite|postgresql] [--output results.json]
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from project import Project, repository
+
+
+def parse_arguments():
+  parser = argparse.ArgumentParser(description='Benchmark the cmnsdjango JSON endpoints')
+  parser.add_argument('--database', choices=['sqlite', 'postgresql'], default='sqlite', help='Database backend')
+  parser.add_argument('--rows', type=int, default=1000, help='Number of locations')
+  parser.add_argument('--tags', type=int, default=100, help='Number of tags')
+  parser.add_argument('--tags-per-object', type=int, default=5, help='Number of tags per location')
+  parser.add_argument('--users', type=int, default=10, help='Number of users')
+  parser.add_argument('--iterations', type=int, default=100, help='Measured iterations per scenario')
+  parser.add_argument('--warmup', type=int, default=5, help='Unmeasured iterations per scenario')
+  parser.add_argument('--memory-iterations', type=int, default=10, help='Iterations traced for peak memory')
+  parser.add_argument('--seed', type=int, default=0, help='Seed for fixtures and scenarios')
+  parser.add_argument('--scenario', action='append', help='Only run this scenario, can be repeated')
+  parser.add_argument('--output', help='Write the results to this file instead of stdout')
+  return parser.parse_args()
+
+
+def get_commit():
+  try:
+    result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repository, capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def summarize(timings, queries, peak_memory, errors):
+  # Inclusive: percentiles stay between the fastest and the slowest iteration
+  percentiles = statistics.quantiles(timings, n=100, method='inclusive') if len(timings) > 1 else timings * 99
+  return {
+    'iterations': len(timings),
+    'errors': errors,
+    'latency_ms': {
+      'min': round(min(timings) * 1000, 3),
+      'mean': round(statistics.fmean(timings) * 1000, 3),
+      'p50': round(percentiles[49] * 1000, 3),
+      'p90': round(percentiles[89] * 1000, 3),
+      'p99': round(percentiles[98] * 1000, 3),
+      'max': round(max(timings) * 1000, 3),
+    },
+    'queries': {
+      'min': min(queries),
+      'mean': round(statistics.fmean(queries), 2),
+      'max': max(queries),
+    },
+    'peak_memory_kb': round(peak_memory / 1024, 1),
+  }
+
+
+def measure(scenario, options):
+  """
+  Run a scenario: a callable taking the iteration number and returning
+  False on errors. Memory is traced in a separate pass, as tracing slows
+  down the measured iterations.
+  """
+  from django.db import connection
+  from django.test.utils import CaptureQueriesContext
+  errors = 0
+  for iteration in range(options.warmup):
+    scenario(iteration)
+  timings, queries = [], []
+  for iteration in range(options.iterations):
+    with CaptureQueriesContext(connection) as context:
+      start = time.perf_counter()
+      if scenario(iteration) is False:
+        errors += 1
+      timings.append(time.perf_counter() - start)
+    queries.append(len(context))
+  tracemalloc.start()
+  for iteration in range(options.memory_iterations):
+    scenario(iteration)
+  peak_memory = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return summarize(timings, queries, peak_memory, errors)
+
+
+def get_scenarios(options):
+  ''' The scenarios by name, sharing a logged in client and the fixtures '''
+  from django.contrib.auth import get_user_model
+  from django.test import Client
+  from cmnsdjango.benchmarks.benchapp.models import Location, Tag
+  from cmnsdjango.templatetags.filter_by_visibility import filter_by_visibility
+  from cmnsdjango.views.json_utils import JsonUtils
+
+  rng = random.Random(options.seed)
+  user = get_user_model().objects.order_by('pk').first()
+  client = Client()
+  client.force_login(user)
+  slugs = list(Location.objects.published().filter(visibility='p').values_list('slug', flat=True)[:1000])
+  tags = list(Tag.objects.published().values_list('slug', 'name')[:1000])
+  queries = [name[:rng.randint(2, 4)] for _, name in tags]
+
+  def pick(values, iteration):
+    return values[iteration % len(values)]
+
+  def get(url):
+    return client.get(url).status_code == 200
+
+  def post(url, data):
+    return client.post(url, json.dumps(data), content_type='application/json').status_code == 200
+
+  utils = JsonUtils()
+  return {
+    'get_attributes': lambda i: get(f'/json/location/{pick(slugs, i)}/attribute/tags/'),
+    'get_suggestions': lambda i: get(f'/json/location/{pick(slugs, i)}/suggest/tags/'),
+    'get_suggestions_q': lambda i: get(f'/json/location/{pick(slugs, i)}/suggest/tags/?q={pick(queries, i)}'),
+    'set_attribute_toggle_tag': lambda i: post(f'/json/location/{pick(slugs, i // 2)}/set/tags/', {'set_slug': pick(tags, i // 2)[0]}),
+    'set_attribute_toggle_boolean': lambda i: post(f'/json/location/{pick(slugs, i)}/set/featured/', {'value': '1'}),
+    'filter_by_visibility': lambda i: list(filter_by_visibility(Location.objects.all(), user)[:50]) is not None,
+    'filter_queryset_by_fields': lambda i: list(utils.filter_queryset_by_fields(Location.objects.all(), ['name', 'description', 'tags'], pick(queries, i))[:50]) is not None,
+  }
+
+
+def main():
+  options = parse_arguments()
+  with Project(options.database):
+    import django
+    import fixtures
+    output = {
+      'meta': {
+        'commit': get_commit(),
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': options.database,
+        'options': vars(options),
+      },
+      'fixtures': fixtures.generate(
+        rows=options.rows,
+        tags=options.tags,
+        tags_per_object=options.tags_per_object,
+        users=options.users,
+        seed=options.seed,
+      ),
+      'results': {},
+    }
+    for name, scenario in get_scenarios(options).items():
+      if options.scenario and name not in options.scenario:
+        continue
+      print(f'Running {name}', file=sys.stderr)
+      output['results'][name] = measure(scenario, options)
+  results = json.dumps(output, indent=2)
+  if options.output:
+    with open(options.output, 'w') as file:
+      file.write(results + '\n')
+  else:
+    print(results)
+
+
+if __name__ == '__main__':
+  main()
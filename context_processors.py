@@ -1,6 +1,10 @@
+from types import MappingProxyType
+
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 
-''' Context Processors for CMNS Django Project 
+''' Context Processors for CMNS Django Project
 
     Add this to your settings.py:
     TEMPLATES = [
@@ -14,15 +18,29 @@ from django.conf import settings
         },
       },
     ]
+
+    The context of setting_data only depends on settings, so it is built
+    once and shared by all requests, and rebuilt when a setting changes
+    (for example with override_settings in tests). Add project level context
+    that does not depend on the request with register_setting_data:
+
+      from cmnsdjango.context_processors import register_setting_data
+
+      @register_setting_data
+      def contact_data(settings):
+        return {'contact_email': getattr(settings, 'CONTACT_EMAIL', '')}
 '''
 
-def setting_data(request):
-  ''' Re-useable defaults'''
-  default_ajax_load = True
-  ''' Return Context Variables 
-      with default fallback values if not set in project/settings.py 
+''' Re-useable defaults'''
+default_ajax_load = True
+
+setting_data_providers = []
+cached_setting_data = None
+
+def default_setting_data(settings):
+  ''' Return Context Variables
+      with default fallback values if not set in project/settings.py
   '''
-  
   return {
     'project_name': getattr(settings, 'SITE_NAME', 'A CMNS Django Project'),
     'meta_description': getattr(settings, 'META_DESCRIPTION', 'A CMNS Django Project'),#
@@ -31,4 +49,29 @@ def setting_data(request):
     'ajax_load_default': getattr(settings, 'AJAX_LOAD_DEFAULT', default_ajax_load),
     'ajax_load_attributes': getattr(settings, 'AJAX_LOAD_ATTRIBUTES', default_ajax_load),
     'disallow_delete_attribute': getattr(settings, 'DISALLOW_DELETE_ATTRIBUTE', False),
-  }
\ No newline at end of file
+  }
+
+def register_setting_data(provider):
+  ''' Add the context returned by provider(settings) to setting_data, usable as decorator '''
+  global cached_setting_data
+  setting_data_providers.append(provider)
+  cached_setting_data = None
+  return provider
+
+def get_setting_data():
+  ''' The shared, read-only context of setting_data '''
+  global cached_setting_data
+  if cached_setting_data is None:
+    data = {}
+    for provider in [default_setting_data, *setting_data_providers]:
+      data.update(provider(settings))
+    cached_setting_data = MappingProxyType(data)
+  return cached_setting_data
+
+@receiver(setting_changed)
+def reset_setting_data(**kwargs):
+  global cached_setting_data
+  cached_setting_data = None
+
+def setting_data(request):
+  return get_setting_data()
@@ -0,0 +1,154 @@
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured, FieldDoesNotExist
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, pre_delete, post_delete
+
+''' Related object counters
+
+    Keep a denormalized count of how often a related object is used, so
+    suggestions can be ordered by popularity and "used by N" can be shown
+    without aggregating over the many-to-many table on every request.
+
+    Declare the counted many-to-many relations on the model that holds the
+    relation, and add an integer column for the count on the related model:
+
+      class Tag(BaseModel):
+        location_count = models.PositiveIntegerField(default=0, editable=False)
+
+      class Location(BaseModel):
+        tags = models.ManyToManyField(Tag)
+        counted_relations = ['tags']
+
+    The column name defaults to "<model name>_count". Use a dictionary to
+    choose the column, for example counted_relations = {'tags': 'usage_count'}.
+    Counts are updated with F() expressions when relations are added, removed
+    or cleared and when an object is deleted. Run
+    "python manage.py rebuild_relation_counts" to rebuild them.
+'''
+
+counters = []
+
+def get_counted_relations(model):
+  ''' Return a dictionary of counted field names and their count columns '''
+  relations = getattr(model, 'counted_relations', None) or {}
+  if not isinstance(relations, dict):
+    relations = {field: f'{model._meta.model_name}_count' for field in relations}
+  return relations
+
+def get_count_column(model, field_name):
+  ''' Return the count column for a relation of model, or None if it is not counted '''
+  return get_counted_relations(model).get(field_name)
+
+def get_count_columns(related_model):
+  ''' Return the count columns that are maintained on related_model '''
+  return [counter.column for counter in counters if counter.related_model is related_model]
+
+def connect_counters():
+  ''' Register and connect a RelationCounter for each counted relation '''
+  for model in apps.get_models():
+    for field_name, column in get_counted_relations(model).items():
+      counter = RelationCounter(model, field_name, column)
+      counter.connect()
+      counters.append(counter)
+
+
+class RelationCounter:
+  """
+  Maintains the count column on the related model of a many-to-many field.
+  """
+
+  def __init__(self, model, field_name, column):
+    try:
+      self.field = model._meta.get_field(field_name)
+    except FieldDoesNotExist:
+      raise ImproperlyConfigured(f"{model._meta.label}.counted_relations: field '{field_name}' does not exist.")
+    if not self.field.many_to_many or self.field.auto_created:
+      raise ImproperlyConfigured(f"{model._meta.label}.counted_relations: '{field_name}' is not a many-to-many field.")
+    self.model = model
+    self.column = column
+    self.related_model = self.field.related_model
+    try:
+      self.related_model._meta.get_field(column)
+    except FieldDoesNotExist:
+      raise ImproperlyConfigured(f"{model._meta.label}.counted_relations: {self.related_model._meta.label} has no count column '{column}'.")
+    self.through = self.field.remote_field.through
+    # Names of the foreign keys on the through model
+    self.source_field = self.field.m2m_field_name()
+    self.target_field = self.field.m2m_reverse_field_name()
+    self.key = f'{model._meta.label_lower}.{field_name}'
+
+  def connect(self):
+    dispatch_uid = f'cmnsdjango.counters.{self.key}'
+    m2m_changed.connect(self.m2m_changed, sender=self.through, weak=False, dispatch_uid=dispatch_uid)
+    pre_delete.connect(self.pre_delete, sender=self.model, weak=False, dispatch_uid=dispatch_uid)
+    post_delete.connect(self.post_delete, sender=self.model, weak=False, dispatch_uid=dispatch_uid)
+
+  def update(self, pks, delta):
+    ''' Add delta to the count of the related objects with the given primary keys '''
+    if pks and delta:
+      self.related_model._base_manager.filter(pk__in=pks).update(**{self.column: F(self.column) + delta})
+
+  def linked(self, **filters):
+    return self.through._base_manager.filter(**filters)
+
+  def remember(self, instance, value):
+    instance.__dict__.setdefault('_relation_counter_pending', {})[self.key] = value
+
+  def recall(self, instance):
+    return instance.__dict__.get('_relation_counter_pending', {}).pop(self.key, None)
+
+  def m2m_changed(self, sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+      # instance holds the relation, pk_set contains related objects
+      if action == 'post_add':
+        self.update(pk_set, 1)
+      elif action == 'pre_remove':
+        # Only objects that are actually linked are removed
+        self.remember(instance, list(self.linked(**{self.source_field: instance.pk, f'{self.target_field}__in': pk_set}).values_list(self.target_field, flat=True)))
+      elif action == 'pre_clear':
+        self.remember(instance, list(self.linked(**{self.source_field: instance.pk}).values_list(self.target_field, flat=True)))
+      elif action in ['post_remove', 'post_clear']:
+        self.update(self.recall(instance), -1)
+    else:
+      # instance is the related object, pk_set contains objects holding the relation
+      if action == 'post_add':
+        self.update([instance.pk], len(pk_set))
+      elif action == 'pre_remove':
+        self.remember(instance, self.linked(**{self.target_field: instance.pk, f'{self.source_field}__in': pk_set}).count())
+      elif action == 'pre_clear':
+        self.remember(instance, self.linked(**{self.target_field: instance.pk}).count())
+      elif action in ['post_remove', 'post_clear']:
+        self.update([instance.pk], -(self.recall(instance) or 0))
+
+  def pre_delete(self, sender, instance, **kwargs):
+    # The through rows are deleted without m2m_changed signals
+    self.remember(instance, list(self.linked(**{self.source_field: instance.pk}).values_list(self.target_field, flat=True)))
+
+  def post_delete(self, sender, instance, **kwargs):
+    self.update(self.recall(instance), -1)
+
+  def rebuild(self, batch_size=1000):
+    """
+    Recount the column for all related objects, batch_size objects per query.
+
+    Returns:
+        int: The number of related objects updated.
+    """
+    count = Subquery(
+      self.linked(**{self.target_field: OuterRef('pk')})
+        .order_by()
+        .values(self.target_field)
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    updated = 0
+    last_pk = None
+    queryset = self.related_model._base_manager.order_by('pk')
+    while True:
+      batch = queryset.filter(pk__gt=last_pk) if last_pk is not None else queryset
+      pks = list(batch.values_list('pk', flat=True)[:batch_size])
+      if not pks:
+        return updated
+      updated += self.related_model._base_manager.filter(pk__in=pks).update(**{self.column: Coalesce(count, 0)})
+      last_pk = pks[-1]
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from fnmatch import fnmatchcase
+
+''' Event Relay
+    A stand-in for Redis publish/subscribe, for RedisBroker on a single host
+    without a Redis server. It speaks enough of the Redis protocol for the
+    redis package, in protocol version 2 and 3: PUBLISH, SUBSCRIBE, PSUBSCRIBE,
+    their UNSUBSCRIBE commands, HELLO, PING, SELECT, CLIENT and QUIT. Nothing
+    is stored. Run it with
+
+      python manage.py run_event_relay --port 6379
+
+    and point JSON_EVENTS_REDIS_URL to it, for example 'redis://localhost:6379'.
+'''
+
+logger = logging.getLogger(__name__)
+
+
+def encode(value, protocol=2, push=False):
+  ''' A reply in the Redis serialization protocol, push replies are messages of subscriptions '''
+  if value is None:
+    return b'_\r\n' if protocol == 3 else b'$-1\r\n'
+  if isinstance(value, int):
+    return b':%d\r\n' % value
+  if isinstance(value, str):
+    value = value.encode()
+  if isinstance(value, bytes):
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+  if isinstance(value, dict):
+    if protocol == 3:
+      return b'%%%d\r\n' % len(value) + b''.join(encode(key, protocol) + encode(item, protocol) for key, item in value.items())
+    value = [item for pair in value.items() for item in pair]
+  prefix = b'>' if push and protocol == 3 else b'*'
+  return prefix + b'%d\r\n' % len(value) + b''.join(encode(item, protocol) for item in value)
+
+
+class Client:
+  def __init__(self, relay, reader, writer):
+    self.relay = relay
+    self.reader = reader
+    self.writer = writer
+    self.channels = set()
+    self.patterns = set()
+    self.protocol = 2
+
+  @property
+  def subscriptions(self):
+    return len(self.channels) + len(self.patterns)
+
+  async def read_command(self):
+    ''' The next command as a list of bytes, or None when the client disconnected '''
+    line = await self.reader.readline()
+    if not line:
+      return None
+    if not line.startswith(b'*'):
+      # Inline command, as sent by telnet or redis-cli without arguments
+      return line.split()
+    arguments = []
+    for _ in range(int(line[1:])):
+      length = int((await self.reader.readline())[1:])
+      arguments.append((await self.reader.readexactly(length + 2))[:-2])
+    return arguments
+
+  def send(self, value, push=False):
+    self.writer.write(encode(value, self.protocol, push))
+
+  async def serve(self):
+    try:
+      while (command := await self.read_command()) is not None:
+        if not command:
+          continue
+        name, arguments = command[0].decode().upper(), command[1:]
+        if name == 'QUIT':
+          self.writer.write(b'+OK\r\n')
+          await self.writer.drain()
+          break
+        self.handle(name, arguments)
+        await self.writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+      pass
+    finally:
+      self.relay.clients.discard(self)
+      self.writer.close()
+
+  def handle(self, name, arguments):
+    if name == 'PUBLISH' and len(arguments) == 2:
+      self.send(self.relay.publish(*arguments))
+    elif name in ('SUBSCRIBE', 'PSUBSCRIBE'):
+      subscribed = self.channels if name == 'SUBSCRIBE' else self.patterns
+      for argument in arguments:
+        subscribed.add(argument)
+        self.send([name.lower(), argument, self.subscriptions], push=True)
+    elif name in ('UNSUBSCRIBE', 'PUNSUBSCRIBE'):
+      subscribed = self.channels if name == 'UNSUBSCRIBE' else self.patterns
+      for argument in arguments or list(subscribed):
+        subscribed.discard(argument)
+        self.send([name.lower(), argument, self.subscriptions], push=True)
+      if not arguments and not subscribed:
+        self.send([name.lower(), None, self.subscriptions], push=True)
+    elif name == 'HELLO':
+      version = int(arguments[0]) if arguments and arguments[0].isdigit() else self.protocol
+      if version not in (2, 3):
+        self.writer.write(b'-NOPROTO unsupported protocol version\r\n')
+        return
+      self.protocol = version
+      self.send({'server': 'cmnsdjango-event-relay', 'version': '1.0', 'proto': version, 'mode': 'standalone', 'role': 'master', 'modules': []})
+    elif name == 'PING':
+      if self.subscriptions and self.protocol == 2:
+        self.send(['pong', arguments[0] if arguments else b''])
+      else:
+        self.writer.write(b'+PONG\r\n' if not arguments else encode(arguments[0]))
+    elif name in ('SELECT', 'CLIENT'):
+      self.writer.write(b'+OK\r\n')
+    else:
+      self.writer.write(b'-ERR unknown command \'%s\'\r\n' % name.encode())
+
+
+class EventRelay:
+  def __init__(self):
+    self.clients = set()
+
+  def publish(self, channel, message):
+    ''' Deliver a message to the subscribers of the channel, returns their number '''
+    receivers = 0
+    for client in list(self.clients):
+      if channel in client.channels:
+        client.send(['message', channel, message], push=True)
+        receivers += 1
+      for pattern in client.patterns:
+        if fnmatchcase(channel.decode(errors='replace'), pattern.decode(errors='replace')):
+          client.send(['pmessage', pattern, channel, message], push=True)
+          receivers += 1
+    return receivers
+
+  async def connect(self, reader, writer):
+    client = Client(self, reader, writer)
+    self.clients.add(client)
+    await client.serve()
+
+  async def serve(self, host='127.0.0.1', port=6379):
+    server = await asyncio.start_server(self.connect, host, port)
+    logger.info('Event relay listening on %s:%s', host, port)
+    async with server:
+      await server.serve_forever()
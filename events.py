@@ -0,0 +1,243 @@
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.utils.module_loading import import_string
+
+''' Change events
+
+    Changes of objects are published as events to a broker, so the
+    JsonEvents views can stream them to the browser with Server-Sent Events.
+    Events are published by JsonSetAttribute through JsonUtils.record_change()
+    and by model signals for changes made elsewhere, such as the admin.
+
+    Events are published on the channel of the changed field, or on the
+    channel of the object when the changed fields are unknown. A client
+    subscribed to (model, pk, field) listens on both channels.
+
+    The broker is set with JSON_EVENTS_BROKER:
+    - 'cmnsdjango.events.LocalBroker' (default): events are only delivered
+      within the process, use it with a single worker process.
+    - 'cmnsdjango.events.RedisBroker': events are delivered through Redis
+      publish/subscribe, or a Redis compatible server such as Valkey, to all
+      processes. Requires the redis package and JSON_EVENTS_REDIS_URL.
+      Without a Redis server, run the stand-in of event_relay.py with
+      manage.py run_event_relay to deliver events between the processes of
+      one host.
+
+    Events are published when the transaction of the change commits, so
+    clients do not refetch before the change is visible, and changes that
+    are rolled back are not published.
+'''
+
+logger = logging.getLogger(__name__)
+
+# Set while JsonSetAttribute changes an object, which publishes its own events
+signals_suppressed = ContextVar('cmnsdjango_events_signals_suppressed', default=False)
+
+
+def get_object_channel(model, pk):
+  return f'cmnsdjango:{ model._meta.label_lower }:{ pk }'
+
+def get_field_channel(model, pk, field):
+  return f'{ get_object_channel(model, pk) }:{ field }'
+
+
+class Subscription:
+  """
+  Events of the subscribed channels, read with get() in synchronous code or
+  aget() in a coroutine. Subscriptions created in a coroutine deliver events
+  to an asyncio queue of their event loop.
+  """
+
+  def __init__(self, broker, channels):
+    self.broker = broker
+    self.channels = channels
+    try:
+      self.loop = asyncio.get_running_loop()
+      self.queue = asyncio.Queue()
+    except RuntimeError:
+      self.loop = None
+      self.queue = queue.Queue()
+
+  def put(self, event):
+    if self.loop:
+      self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+    else:
+      self.queue.put(event)
+
+  def get(self, timeout=None):
+    ''' Return the next event, or None after timeout seconds '''
+    try:
+      return self.queue.get(timeout=timeout)
+    except queue.Empty:
+      return None
+
+  async def aget(self, timeout=None):
+    try:
+      return await asyncio.wait_for(self.queue.get(), timeout)
+    except asyncio.TimeoutError:
+      return None
+
+  def close(self):
+    self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+  """
+  Delivers events to the subscriptions of the current process.
+  """
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.subscriptions = {}
+
+  def publish(self, channel, event):
+    with self.lock:
+      subscriptions = list(self.subscriptions.get(channel, ()))
+    for subscription in subscriptions:
+      subscription.put(event)
+
+  def subscribe(self, channels):
+    subscription = Subscription(self, channels)
+    with self.lock:
+      for channel in channels:
+        self.subscriptions.setdefault(channel, set()).add(subscription)
+    return subscription
+
+  def unsubscribe(self, subscription):
+    with self.lock:
+      for channel in subscription.channels:
+        self.subscriptions.get(channel, set()).discard(subscription)
+        if not self.subscriptions.get(channel, True):
+          del self.subscriptions[channel]
+
+
+class RedisBroker(LocalBroker):
+  """
+  Publishes events to Redis, so subscriptions in all processes receive them.
+  A listener thread per process receives the events of all cmnsdjango
+  channels and hands them to the local subscriptions.
+  """
+
+  def __init__(self):
+    super().__init__()
+    try:
+      import redis
+    except ImportError:
+      raise ImproperlyConfigured('RedisBroker requires the redis package')
+    url = getattr(settings, 'JSON_EVENTS_REDIS_URL', None)
+    if not url:
+      raise ImproperlyConfigured('RedisBroker requires JSON_EVENTS_REDIS_URL')
+    self.redis = redis.Redis.from_url(url)
+    self.listener = None
+
+  def publish(self, channel, event):
+    self.redis.publish(channel, json.dumps(event))
+
+  def subscribe(self, channels):
+    with self.lock:
+      if self.listener is None:
+        self.listener = threading.Thread(target=self.listen, name='cmnsdjango-events', daemon=True)
+        self.listener.start()
+    return super().subscribe(channels)
+
+  def listen(self):
+    ''' Hand the events to the local subscriptions, reconnecting when the connection is lost '''
+    delay = 1
+    while True:
+      try:
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe('cmnsdjango:*')
+        delay = 1
+        for message in pubsub.listen():
+          if message['type'] == 'pmessage':
+            super().publish(message['channel'].decode(), json.loads(message['data']))
+      except Exception:
+        # Events published until the listener is subscribed again are missed
+        logger.warning('Lost the connection to JSON_EVENTS_REDIS_URL, reconnecting in %s s', delay, exc_info=True)
+        time.sleep(delay)
+        delay = min(delay * 2, 30)
+
+
+broker = None
+broker_lock = threading.Lock()
+
+def get_broker():
+  global broker
+  with broker_lock:
+    if broker is None:
+      broker = import_string(getattr(settings, 'JSON_EVENTS_BROKER', 'cmnsdjango.events.LocalBroker'))()
+  return broker
+
+
+def on_commit(func, using=None):
+  ''' Call func when the transaction on the database commits, or now outside a transaction '''
+  try:
+    asyncio.get_running_loop()
+  except RuntimeError:
+    transaction.on_commit(func, using=using, robust=True)
+  else:
+    # The async ORM does not run in a transaction, and the connection can not be used here
+    func()
+
+def publish(model, pk, field=None, using=None, **data):
+  ''' Publish a change event of an object or one of its fields when its transaction commits '''
+  event = {'model': model._meta.model_name, 'pk': pk, 'field': field} | data
+  channel = get_field_channel(model, pk, field) if field else get_object_channel(model, pk)
+  on_commit(lambda: get_broker().publish(channel, event), using)
+
+
+@contextmanager
+def suppress_signals():
+  ''' Do not publish events from signals, as the caller publishes them itself '''
+  token = signals_suppressed.set(True)
+  try:
+    yield
+  finally:
+    signals_suppressed.reset(token)
+
+
+''' Signal receivers '''
+def connect_signals(models):
+  ''' Publish the changes of models made outside JsonSetAttribute '''
+  for model in models:
+    post_save.connect(publish_saved, sender=model, dispatch_uid=f'cmnsdjango_events_save_{ model._meta.label_lower }')
+    post_delete.connect(publish_deleted, sender=model, dispatch_uid=f'cmnsdjango_events_delete_{ model._meta.label_lower }')
+    for field in model._meta.many_to_many:
+      m2m_changed.connect(publish_m2m_changed, sender=field.remote_field.through, dispatch_uid=f'cmnsdjango_events_m2m_{ field.remote_field.through._meta.label_lower }')
+
+def publish_saved(sender, instance, update_fields=None, using=None, **kwargs):
+  if signals_suppressed.get():
+    return
+  if update_fields:
+    for field in update_fields:
+      publish(sender, instance.pk, field, using, action='save')
+  else:
+    publish(sender, instance.pk, using=using, action='save')
+
+def publish_deleted(sender, instance, using=None, **kwargs):
+  if not signals_suppressed.get():
+    publish(sender, instance.pk, using=using, action='delete')
+
+def publish_m2m_changed(sender, instance, action, reverse, model, pk_set, using=None, **kwargs):
+  if signals_suppressed.get() or action not in ('post_add', 'post_remove', 'post_clear'):
+    return
+  # Publish for the objects that hold the relation
+  if reverse:
+    model, pks = model, pk_set or ()
+  else:
+    model, pks = instance.__class__, [instance.pk]
+  for field in model._meta.many_to_many:
+    if field.remote_field.through is sender:
+      for pk in pks:
+        publish(model, pk, field.name, using, action=action[5:])
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Stand-in voor supervisorctl, om de reload strategieen van update.py te proberen
+zonder process manager:
+
+    python update.py --supervisorctl "python fake_supervisorctl.py" --reload rolling
+
+De programma's en hun status staan in het JSON bestand in FAKE_SUPERVISOR_STATE
+(standaard fake_supervisor.json), bijvoorbeeld
+{"programs": {"camping:camping_8001": "RUNNING", "camping:camping_8002": "FATAL"}}.
+Elk commando wordt aan "calls" in hetzelfde bestand toegevoegd. Ondersteunt
+status, start, stop, restart en signal, met exit codes zoals supervisorctl 4.
+"""
+
+import fnmatch
+import json
+import os
+import sys
+from pathlib import Path
+
+STATE_FILE = Path(os.environ.get("FAKE_SUPERVISOR_STATE", "fake_supervisor.json"))
+
+def load():
+    if STATE_FILE.exists():
+        return json.loads(STATE_FILE.read_text())
+    return {"programs": {}}
+
+def save(state):
+    STATE_FILE.write_text(json.dumps(state, indent=2))
+
+def match(programs, names):
+    """De programma's voor de namen: een programma, een groep of groep:*."""
+    matched = []
+    for name in names:
+        pattern = f"{name}:*" if ":" not in name else name
+        found = [program for program in programs if fnmatch.fnmatchcase(program, pattern)]
+        if not found:
+            print(f"{name}: ERROR (no such process)")
+            return None
+        matched += found
+    return matched
+
+def main(argv):
+    state = load()
+    state.setdefault("calls", []).append(argv)
+    programs = state["programs"]
+    command, names = (argv[0], argv[1:]) if argv else ("status", [])
+    signal = None
+    if command == "signal":
+        signal, names = names[0], names[1:]
+    matched = match(programs, names) if names else list(programs)
+    if matched is None:
+        save(state)
+        return 2
+
+    exit_code = 0
+    for program in matched:
+        current = programs[program]
+        if command == "status":
+            pid = "pid 1234, uptime 0:01:00" if current == "RUNNING" else ""
+            print(f"{program:<32} {current:<10} {pid}".rstrip())
+            if current != "RUNNING":
+                exit_code = 3
+        elif command in ("stop", "restart"):
+            if current == "RUNNING":
+                print(f"{program}: stopped")
+                programs[program] = "STOPPED"
+            else:
+                print(f"{program}: ERROR (not running)")
+                exit_code = 1
+        if command in ("start", "restart"):
+            if programs[program] == "RUNNING":
+                print(f"{program}: ERROR (already started)")
+                exit_code = 1
+            else:
+                print(f"{program}: started")
+                programs[program] = "RUNNING"
+        elif command == "signal":
+            if current == "RUNNING":
+                print(f"{program}: signalled {signal}")
+            else:
+                print(f"{program}: ERROR (not running)")
+                exit_code = 1
+    save(state)
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tests voor de change detection en de reload strategieen van update.py, met
+fake_supervisorctl.py als supervisorctl. Draai vanuit de repository met
+
+    python -m unittest discover -s helpers
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import update
+
+FAKE_SUPERVISORCTL = Path(__file__).resolve().parent / "fake_supervisorctl.py"
+
+
+class HealthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class ChangesTest(unittest.TestCase):
+    def test_code(self):
+        self.assertTrue(update.Changes(["cmnsdjango/views/json_utils.py"]).code)
+        self.assertTrue(update.Changes(["archive/templates/archive/location.html"]).code)
+        self.assertTrue(update.Changes(["locale/nl/LC_MESSAGES/django.mo"]).code)
+        self.assertFalse(update.Changes(["cmnsdjango/static/js/cmnsdjango.js"]).code)
+        self.assertFalse(update.Changes(["readme.md", "docs/helpers.md", "requirements.txt"]).code)
+
+    def test_reload_skipped_for_static_files(self):
+        args = update.parse_args(["--reload", "skip"])
+        steps = {step.name: step for step in update.get_steps(update.Changes(["archive/static/css/site.css"]), args)}
+        self.assertFalse(steps["reload"].enabled)
+        self.assertTrue(steps["collectstatic"].enabled)
+
+
+class ReloadTest(unittest.TestCase):
+    programs = {"camping:camping_8001": "RUNNING", "camping:camping_8002": "RUNNING"}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.state_file = Path(directory.name, "supervisor.json")
+        self.state_file.write_text(json.dumps({"programs": self.programs}))
+        environment = os.environ.copy()
+        os.environ["FAKE_SUPERVISOR_STATE"] = str(self.state_file)
+        self.addCleanup(os.environ.update, environment)
+
+    def reload(self, *argv):
+        args = update.parse_args(["--pool", "camping", "--supervisorctl", f"{sys.executable} {FAKE_SUPERVISORCTL}", *argv])
+        with redirect_stdout(StringIO()):
+            update.RELOADERS[args.reload](args).reload()
+        return json.loads(self.state_file.read_text())
+
+    def test_restart(self):
+        self.assertEqual(self.reload("--reload", "restart")["calls"], [["restart", "camping"]])
+
+    def test_hup(self):
+        self.assertEqual(self.reload("--reload", "hup")["calls"], [["signal", "HUP", "camping"]])
+
+    def test_skip(self):
+        self.assertNotIn("calls", self.reload("--reload", "skip"))
+
+    def test_rolling(self):
+        self.assertEqual(self.reload("--reload", "rolling")["calls"], [
+            ["status", "camping:*"],
+            ["restart", "camping:camping_8001"],
+            ["restart", "camping:camping_8002"],
+        ])
+
+    def test_rolling_with_stopped_program(self):
+        self.state_file.write_text(json.dumps({"programs": self.programs | {"camping:camping_8002": "FATAL"}}))
+        state = self.reload("--reload", "rolling")
+        self.assertEqual(state["calls"][1:], [["restart", "camping:camping_8001"], ["start", "camping:camping_8002"]])
+        self.assertEqual(set(state["programs"].values()), {"RUNNING"})
+
+    def test_rolling_health_check(self):
+        server = HTTPServer(("127.0.0.1", 0), HealthHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_port}/"
+        state = self.reload("--reload", "rolling", "--health-url", url)
+        self.assertEqual(len(state["calls"]), 3)
+
+    def test_rolling_stops_when_unhealthy(self):
+        with self.assertRaises(SystemExit):
+            self.reload("--reload", "rolling", "--health-url", "http://127.0.0.1:9/", "--health-timeout", "0.5")
+        # Het tweede programma draait nog de vorige versie
+        state = json.loads(self.state_file.read_text())
+        self.assertEqual(state["calls"], [["status", "camping:*"], ["restart", "camping:camping_8001"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
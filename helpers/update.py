@@ -2,34 +2,127 @@
 """
 Update script for Django applications with submodule support.
 Performs a git pull, updates submodules (and ensures the submodules are on the correct branch),
-checks if there are changes in migrations, static files, or requirements.txt,
+determines the files changed by the pull in the main repository and in every submodule,
 activates the virtual environment, installs new requirements, runs migrations,
-collects static files and finally restarts the application with supervisorctl.
+collects changed static files and finally reloads the application with supervisorctl.
+
+Only the steps needed for the changed files are run. Submodules are updated
+concurrently, and steps that do not depend on each other (migrations and
+collectstatic) run concurrently as well. A timing report is printed at the end.
+
+The application is reloaded with the strategy set by --reload: a restart of the
+pool (default), a graceful reload with HUP, a rolling restart of the programs of
+the pool with a health check after each program, or no reload at all. The reload
+is skipped when only static files changed. Run with --help for all options.
 
 # Author: Arne Coomans
-# Version: 1.3.0
+# Version: 1.5.0
 
 """
 
+import argparse
 import os
 import sys
 import subprocess
 import shlex
-from pathlib import Path
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path, PurePosixPath
+
+MAX_WORKERS = 8
+SUPERVISOR_STATES = {"STOPPED", "STARTING", "RUNNING", "BACKOFF", "STOPPING", "EXITED", "FATAL", "UNKNOWN"}
+print_lock = threading.Lock()
+
+def log(message):
+    """Print vanuit meerdere threads zonder dat regels door elkaar lopen."""
+    with print_lock:
+        print(message, flush=True)
 
 def run_command(cmd, cwd=None, capture_output=True, text=True, check=True):
     """Wrapper om een command uit te voeren en de output terug te geven."""
-    print(f"Running command: {cmd}")
+    log(f"Running command: {cmd}" + (f" (in {cwd})" if cwd else ""))
     result = subprocess.run(shlex.split(cmd), cwd=cwd, capture_output=capture_output, text=text)
     if check and result.returncode != 0:
-        print(f"Command failed: {cmd}")
-        print(f"Output: {result.stdout}")
-        print(f"Error: {result.stderr}")
+        log(f"Command failed: {cmd}\nOutput: {result.stdout}\nError: {result.stderr}")
         sys.exit(result.returncode)
     return result
 
+
+class Timings:
+    """Houdt de duur van elke stap bij voor het rapport aan het einde."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.steps = []
+
+    def record(self, name, status, duration):
+        with self.lock:
+            self.steps.append((name, status, duration))
+
+    def report(self, total):
+        log("\nTiming report:")
+        for name, status, duration in self.steps:
+            log(f"  {name:<24} {status:<8} {duration:7.2f}s")
+        log(f"  {'total':<24} {'':<8} {total:7.2f}s")
+
+timings = Timings()
+
+
+''' Change detection '''
+def get_head(cwd=None):
+    result = run_command("git rev-parse HEAD", cwd=cwd, check=False)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+def get_changed_files(before, after, cwd=None):
+    """De bestanden die tussen twee commits gewijzigd, toegevoegd of verwijderd zijn."""
+    if before == after:
+        return []
+    if before is None:
+        # Nieuwe checkout: alle bestanden zijn nieuw
+        result = run_command("git ls-files", cwd=cwd)
+    else:
+        result = run_command(f"git diff --name-only {before} {after}", cwd=cwd)
+    return result.stdout.strip().splitlines()
+
+
+class Changes:
+    """De gewijzigde bestanden, relatief ten opzichte van de hoofdrepository."""
+
+    def __init__(self, files=()):
+        self.files = [PurePosixPath(file) for file in files]
+
+    def add(self, files, prefix=None):
+        self.files += [PurePosixPath(prefix, file) if prefix else PurePosixPath(file) for file in files]
+
+    @property
+    def requirements(self):
+        return PurePosixPath("requirements.txt") in self.files
+
+    @property
+    def migrations(self):
+        return any("migrations" in file.parts and file.suffix == ".py" for file in self.files)
+
+    @property
+    def static(self):
+        return any("static" in file.parts[:-1] for file in self.files)
+
+    @property
+    def code(self):
+        """Wijzigingen die een reload nodig hebben: Python code, templates (gecached door de template loader) en vertalingen."""
+        return any(
+            file.suffix == ".py"
+            or "templates" in file.parts[:-1]
+            or ("locale" in file.parts[:-1] and file.suffix in (".po", ".mo"))
+            for file in self.files
+        )
+
+
+''' Git '''
 def update_main_repo():
     print("Pulling latest changes from Git (main repository)...")
+    before = get_head()
     result = run_command("git pull", capture_output=True, text=True, check=False)
     git_output = result.stdout + result.stderr
 
@@ -38,76 +131,106 @@ def update_main_repo():
         print(git_output)
         sys.exit(1)
 
-    print("Git pull complete.")
-    if "Already up to date" in git_output:
-        print("No changes detected in main repository.")
-    else:
-        print("Changes detected in the main repository.")
+    after = get_head()
+    changed_files = get_changed_files(before, after)
+    print(f"Git pull complete, {len(changed_files)} changed files in main repository.")
+    return changed_files
 
-    return git_output
+def get_submodules():
+    """De paden en branches van de submodules volgens .gitmodules."""
+    result = run_command("git config -f .gitmodules --get-regexp path", check=False)
+    submodules = []
+    for line in result.stdout.strip().splitlines():
+        # line voorbeeld: submodule.cmnsdjango.path cmnsdjango
+        key, path = line.split(maxsplit=1)
+        name = key[len("submodule."):-len(".path")]
+        branch = run_command(f"git config -f .gitmodules submodule.{name}.branch", check=False).stdout.strip()
+        submodules.append((path, branch or "main"))
+    return submodules
 
-def update_submodules():
-    submodule_changes = ""
-    static_changes_in_submodules = False
-
-    gitmodules = Path(".gitmodules")
-    if gitmodules.exists():
-        print("Checking for submodule updates...")
-        # Initialize/update submodules recursively.
-        run_command("git submodule update --init --recursive")
-
-        # Ensure each submodule is on its tracked branch.
-        run_command("git submodule foreach --recursive 'git checkout $(git config -f $toplevel/.gitmodules submodule.$name.branch || echo main)'")
-
-        # Update submodules to the latest commit on their tracked branch.
-        run_command("git submodule update --remote --merge")
-
-        # Get diff for submodules
-        result = run_command("git diff --submodule=log", capture_output=True, text=True, check=False)
-        submodule_changes = result.stdout.strip()
-
-        # Na update opnieuw initialiseren om consistentie te verzekeren.
-        run_command("git submodule update --init --recursive")
-
-        if submodule_changes:
-            print("Submodule updates detected:")
-            print(submodule_changes)
-        else:
-            print("No updates detected in submodules.")
-
-        # Controleer voor elke submodule of er wijzigingen zijn in een "static/"-map.
-        # Hiervoor lezen we de paden uit .gitmodules en controleren we per submodule.
-        submodules = []
-        with open(gitmodules) as f:
-            for line in f:
-                if line.strip().startswith("path"):
-                    # line voorbeeld: path = submodule_dir
-                    _, path_value = line.split("=")
-                    submodules.append(path_value.strip())
-        for submodule in submodules:
-            submodule_path = Path(submodule)
-            if submodule_path.exists():
-                # Vergelijk de laatste twee commits in de submodule.
-                # Opmerking: dit werkt alleen als de submodule minstens 2 commits heeft.
-                try:
-                    head_commit = run_command("git rev-parse HEAD", cwd=submodule, capture_output=True).stdout.strip()
-                    # Bepaal een vorige commit: HEAD~1
-                    prev_commit = run_command("git rev-parse HEAD~1", cwd=submodule, capture_output=True).stdout.strip()
-                    diff_result = run_command(f"git diff --name-only {prev_commit} {head_commit}", cwd=submodule, capture_output=True)
-                    changed_files = diff_result.stdout.strip().splitlines()
-                    for file in changed_files:
-                        if file.startswith("static"):
-                            print(f"Detected static changes in submodule '{submodule}': {file}")
-                            static_changes_in_submodules = True
-                            break  # Eén wijziging is voldoende
-                except Exception as e:
-                    print(f"Warning: could not determine diff for submodule {submodule}: {e}")
-            else:
-                print(f"Warning: submodule path {submodule} does not exist.")
+def update_submodule(path, branch, before):
+    """Zet de submodule op zijn branch, haal de laatste commits op en geef de gewijzigde bestanden terug."""
+    start = time.monotonic()
+    run_command(f"git checkout {branch}", cwd=path)
+    run_command(f"git pull origin {branch}", cwd=path)
+    changed_files = get_changed_files(before, get_head(path), cwd=path)
+    if changed_files:
+        log(f"Submodule '{path}': {len(changed_files)} changed files.")
     else:
+        log(f"No updates detected in submodule '{path}'.")
+    timings.record(f"submodule {path}", "done", time.monotonic() - start)
+    return changed_files
+
+def update_submodules():
+    changes = Changes()
+    if not Path(".gitmodules").exists():
         print("No .gitmodules file found. Skipping submodule updates.")
+        return changes
+
+    print("Checking for submodule updates...")
+    submodules = get_submodules()
+    # Bewaar de commits van voor de update, de checkout hieronder kan ze wijzigen
+    before = {path: get_head(path) if Path(path, ".git").exists() else None for path, _ in submodules}
+    # Initialiseer nieuwe submodules
+    run_command("git submodule update --init --recursive")
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            path: executor.submit(update_submodule, path, branch, before[path])
+            for path, branch in submodules if Path(path).exists()
+        }
+    for path, branch in submodules:
+        if path not in futures:
+            print(f"Warning: submodule path {path} does not exist.")
+            continue
+        changes.add(futures[path].result(), prefix=path)
+    return changes
+
+
+''' Steps '''
+class Step:
+    """Een stap van de update, die pas start als de stappen in requires klaar zijn."""
+
+    def __init__(self, name, function, requires=(), enabled=True, reason=""):
+        self.name = name
+        self.function = function
+        self.requires = set(requires)
+        self.enabled = enabled
+        self.reason = reason
+
+    def run(self):
+        start = time.monotonic()
+        log(f"Starting step '{self.name}'...")
+        self.function()
+        timings.record(self.name, "done", time.monotonic() - start)
+        log(f"Step '{self.name}' complete.")
 
-    return submodule_changes, static_changes_in_submodules
+def run_steps(steps):
+    """Voer de stappen uit in volgorde van hun afhankelijkheden, onafhankelijke stappen tegelijk."""
+    pending = {step.name: step for step in steps}
+    done = set()
+    running = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        while pending or running:
+            for name, step in list(pending.items()):
+                if not step.requires <= done:
+                    continue
+                del pending[name]
+                if step.enabled:
+                    running[executor.submit(step.run)] = name
+                else:
+                    log(f"Skipping step '{name}': {step.reason}")
+                    timings.record(name, "skipped", 0)
+                    done.add(name)
+            if not running:
+                if pending:
+                    raise RuntimeError(f"Unresolvable step dependencies: {', '.join(pending)}")
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                # Een mislukte stap stopt de update
+                future.result()
+                done.add(running.pop(future))
 
 def modify_env_for_venv():
     """Wijzig de omgeving zodat de virtual environment in .venv/bin eerst in PATH staat."""
@@ -119,64 +242,184 @@ def modify_env_for_venv():
     else:
         print("No .venv/bin directory found. Proceeding without virtual environment adjustments.")
 
-def main():
+def install_requirements():
+    run_command("python -m pip install --upgrade pip")
+    run_command("python -m pip install -r requirements.txt")
+
+def migrate():
+    run_command("python manage.py migrate")
+
+def collectstatic():
+    # Kopieer alleen gewijzigde bestanden, met collectstatic als terugval als cmnsdjango niet geinstalleerd is
+    result = run_command("python manage.py collectstatic_incremental", check=False)
+    if result.returncode != 0:
+        log(f"Incremental collectstatic failed, collecting all static files.\n{result.stderr}")
+        run_command("python manage.py collectstatic --noinput")
+    else:
+        log(result.stdout.strip())
+
+def get_pool_name():
+    # Bepaal de poolnaam door de eerste token (voor de eerste punt) van de huidige directorynaam.
+    return Path.cwd().name.split(".")[0]
+
+
+''' Reload strategies '''
+class Reloader:
+    """Laadt de applicatie opnieuw via supervisorctl na de update."""
+
+    def __init__(self, args):
+        self.supervisorctl = args.supervisorctl
+        self.pool = args.pool or get_pool_name()
+
+    def run_supervisorctl(self, command, check=True):
+        return run_command(f"{self.supervisorctl} {command}", check=check)
+
+    def reload(self):
+        raise NotImplementedError
+
+
+class RestartReloader(Reloader):
+    """Herstart alle workers tegelijk, lopende requests worden afgebroken."""
+
+    def reload(self):
+        log(f"Restarting application with supervisor for pool '{self.pool}'...")
+        self.run_supervisorctl(f"restart {self.pool}")
+
+
+class HupReloader(Reloader):
+    """Graceful reload: gunicorn en uwsgi starten bij een HUP nieuwe workers en laten de oude hun requests afmaken."""
+
+    def reload(self):
+        log(f"Sending HUP to pool '{self.pool}' for a graceful reload...")
+        self.run_supervisorctl(f"signal HUP {self.pool}")
+
+
+class RollingReloader(Reloader):
+    """Herstart de programma's van de pool een voor een, met een health check na elk programma."""
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.programs = args.programs
+        self.health_urls = args.health_url
+        self.health_timeout = args.health_timeout
+
+    def get_programs(self):
+        """De programma's van de pool met hun status."""
+        targets = " ".join(self.programs) if self.programs else f"{self.pool}:*"
+        # Status geeft exit code 3 als een programma niet RUNNING is, dus niet stoppen bij een fout
+        result = self.run_supervisorctl(f"status {targets}", check=False)
+        # Statusregel voorbeeld: camping:camping_8001   RUNNING   pid 1234, uptime 1 day
+        states = {}
+        for line in result.stdout.strip().splitlines():
+            parts = line.split()
+            if len(parts) >= 2 and parts[1] in SUPERVISOR_STATES:
+                states[parts[0]] = parts[1]
+        if self.programs:
+            return [(program, states.get(program, "UNKNOWN")) for program in self.programs]
+        return list(states.items())
+
+    def get_health_url(self, index):
+        if not self.health_urls:
+            return None
+        # Een enkele URL geldt voor alle programma's, anders een URL per programma
+        return self.health_urls[index] if len(self.health_urls) > 1 else self.health_urls[0]
+
+    def check_health(self, url):
+        deadline = time.monotonic() + self.health_timeout
+        while time.monotonic() < deadline:
+            try:
+                with urllib.request.urlopen(url, timeout=2) as response:
+                    if response.status < 400:
+                        return True
+            except (OSError, ValueError):
+                pass
+            time.sleep(0.5)
+        return False
+
+    def reload(self):
+        programs = self.get_programs()
+        if not programs:
+            log(f"No programs found for pool '{self.pool}', restarting the pool.")
+            self.run_supervisorctl(f"restart {self.pool}")
+            return
+        if self.health_urls and len(self.health_urls) not in (1, len(programs)):
+            log(f"Expected 1 or {len(programs)} health URLs, got {len(self.health_urls)}.")
+            sys.exit(1)
+        for index, (program, state) in enumerate(programs):
+            # Een gestopt of gecrasht programma wordt gestart, restart geeft dan een fout
+            command = "restart" if state in ("RUNNING", "STARTING", "UNKNOWN") else "start"
+            log(f"Restarting program '{program}' ({index + 1}/{len(programs)}, {state})...")
+            self.run_supervisorctl(f"{command} {program}")
+            url = self.get_health_url(index)
+            if url and not self.check_health(url):
+                # Stop de rollout, de overige programma's draaien de vorige versie nog
+                log(f"Health check of '{program}' at {url} failed after {self.health_timeout}s, aborting rolling restart.")
+                sys.exit(1)
+
+
+class SkipReloader(Reloader):
+    def reload(self):
+        log("Skipping application reload.")
+
+
+RELOADERS = {
+    "restart": RestartReloader,
+    "hup": HupReloader,
+    "rolling": RollingReloader,
+    "skip": SkipReloader,
+}
+
+def get_steps(changes, args):
+    reloader = RELOADERS[args.reload](args)
+    return [
+        Step("install requirements", install_requirements,
+             enabled=changes.requirements, reason="requirements.txt not changed"),
+        # Nieuwe requirements kunnen apps met migraties of static files toevoegen
+        Step("migrate", migrate, requires=["install requirements"],
+             enabled=changes.migrations, reason="no migrations changed"),
+        Step("collectstatic", collectstatic, requires=["install requirements"],
+             enabled=changes.static, reason="no static files changed"),
+        Step("reload", reloader.reload, requires=["migrate", "collectstatic"],
+             enabled=changes.code or args.always_reload, reason="no code or template changes"),
+    ]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Update the django project and reload the application.")
+    parser.add_argument("--reload", choices=RELOADERS, default="restart",
+                        help="How to reload the application: restart all workers (default), "
+                             "send HUP for a graceful reload, restart the programs of the pool one by one, or skip")
+    parser.add_argument("--always-reload", action="store_true",
+                        help="Reload even when only static files changed")
+    parser.add_argument("--pool", help="Supervisor program or group, defaults to the first part of the directory name")
+    parser.add_argument("--supervisorctl", default="sudo supervisorctl",
+                        help="Command to run supervisorctl (default: 'sudo supervisorctl')")
+    parser.add_argument("--programs", nargs="+",
+                        help="Programs to restart one by one with --reload rolling, defaults to the programs of the pool group")
+    parser.add_argument("--health-url", action="append",
+                        help="URL to check after restarting a program with --reload rolling, once or once per program")
+    parser.add_argument("--health-timeout", type=float, default=30,
+                        help="Seconds to wait for a healthy response (default: 30)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    start = time.monotonic()
     # Zorg dat het script in zijn eigen directory draait
     script_dir = Path(__file__).resolve().parent
     os.chdir(script_dir)
     print(f"Changed directory to {script_dir}")
 
-    git_output = update_main_repo()
-    submodule_changes, static_submodule_flag = update_submodules()
-
-    # Combineer veranderingen van main repo en submodules.
-    all_changes = git_output + "\n" + submodule_changes
-
-    # Check op relevante wijzigingen: migrations, static files, of requirements.txt.
-    relevant_change = False
-    if ("migration" in all_changes.lower() or
-        "requirements.txt" in all_changes.lower() or
-        "static" in all_changes.lower() or
-        static_submodule_flag):
-        relevant_change = True
-
-    if relevant_change:
-        print("Changes detected in requirements, migrations, static files, or submodules.")
-        modify_env_for_venv()
-
-        # Installeer nieuwe requirements als requirements.txt gewijzigd is.
-        if "requirements.txt" in all_changes:
-            print("Installing new requirements...")
-            run_command("python -m pip install --upgrade pip")
-            run_command("python -m pip install -r requirements.txt")
-            print("Requirements installed.")
-        else:
-            print("No changes in requirements detected. Skipping requirement installation.")
-
-        # Voer migraties uit als er migratiewijzigingen zijn.
-        if "migration" in all_changes.lower():
-            print("Running migrations...")
-            run_command("python manage.py migrate")
-            print("Migrations complete.")
-        else:
-            print("No changes in migrations detected. Skipping migration.")
-
-        # Voer collectstatic uit als er wijzigingen in static files zijn.
-        # Hierbij wordt ook specifiek gekeken of er in submodules static changes zijn.
-        if "static" in all_changes.lower() or static_submodule_flag:
-            print("Collecting static files...")
-            run_command("python manage.py collectstatic --noinput")
-            print("Static files collected.")
-        else:
-            print("No changes in static files detected. Skipping collectstatic.")
-    else:
-        print("No relevant changes detected. Skipping migrations and static collection.")
+    step_start = time.monotonic()
+    changes = Changes(update_main_repo())
+    timings.record("git pull", "done", time.monotonic() - step_start)
+    step_start = time.monotonic()
+    changes.add(update_submodules().files)
+    timings.record("submodules", "done", time.monotonic() - step_start)
 
-    # Bepaal de poolnaam door de eerste token (voor de eerste punt) van de huidige directorynaam.
-    current_dir = Path.cwd().name
-    pool_name = current_dir.split(".")[0]
-    print(f"Restarting application with supervisor for pool '{pool_name}'...")
-    run_command(f"sudo supervisorctl restart {pool_name}")
-    print(f"Application restart for pool '{pool_name}' complete.")
+    print(f"Changes: requirements={changes.requirements}, migrations={changes.migrations}, static={changes.static}, code={changes.code}")
+    modify_env_for_venv()
+    run_steps(get_steps(changes, args))
+    timings.report(time.monotonic() - start)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,68 @@
+import html
+import re
+from functools import lru_cache
+
+from django.utils.html import conditional_escape, escape
+from django.utils.safestring import mark_safe
+
+''' Highlight
+    Highlights the terms of a search query in text. A Highlighter compiles
+    the terms of a query once into a single case-insensitive pattern, with
+    the longest terms first so "apple pie" wins over "apple". Highlighters
+    are kept in an LRU cache per query, so rendering many suggestions for
+    the same query compiles the pattern once.
+
+    Text is escaped before highlighting. In HTML, only the text between the
+    tags is highlighted, never the tags, attributes or entities themselves.
+'''
+
+HIGHLIGHT_FORMAT = "<span class='highlight'>{}</span>"
+TAG = re.compile(r'(<[^>]*>)')
+
+
+class Highlighter:
+  def __init__(self, query):
+    self.query = query
+    terms = {term.lower(): term for term in str(query).split()}
+    self.terms = sorted(terms.values(), key=len, reverse=True)
+    self.pattern = re.compile('|'.join(re.escape(term) for term in self.terms), re.IGNORECASE) if self.terms else None
+
+  def __bool__(self):
+    return self.pattern is not None
+
+  def spans(self, text):
+    ''' The (start, end) positions of the terms in plain text '''
+    if not self.pattern:
+      return []
+    return [match.span() for match in self.pattern.finditer(text)]
+
+  def highlight_text(self, text, spans=None):
+    ''' Escape plain text and wrap the spans, preserving the original case '''
+    spans = self.spans(text) if spans is None else spans
+    parts = []
+    position = 0
+    for start, end in spans:
+      parts.append(escape(text[position:start]))
+      parts.append(HIGHLIGHT_FORMAT.format(escape(text[start:end])))
+      position = end
+    parts.append(escape(text[position:]))
+    return mark_safe(''.join(parts))
+
+  def highlight(self, value):
+    """
+    Return value as safe HTML with the terms highlighted. Plain text is
+    escaped first, safe HTML is highlighted between its tags.
+    """
+    value = conditional_escape(value)
+    if not self.pattern:
+      return value
+    parts = TAG.split(value)
+    for index in range(0, len(parts), 2):
+      # Even parts are text between tags, with entities such as &amp;
+      parts[index] = self.highlight_text(html.unescape(parts[index]))
+    return mark_safe(''.join(parts))
+
+
+@lru_cache(maxsize=256)
+def get_highlighter(query):
+  return Highlighter(query)
@@ -0,0 +1,267 @@
+import functools
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from inspect import iscoroutinefunction
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+''' Instrumentation for cmnsdjango views
+
+    Enable with JSON_INSTRUMENTATION = True in settings. For every request
+    handled by a JsonUtils view, a RequestTimer records the wall time per
+    phase (parameters, model, object, field value, search, rendering and
+    serialization), the number and duration of SQL queries and the number
+    of template renders. The results are
+    - added to the response as a Server-Timing header,
+    - logged as a JSON line to the 'cmnsdjango.instrumentation' logger,
+    - aggregated in histograms that can be scraped in Prometheus text format
+      from MetricsView (staff only).
+    Phase times are exclusive: time spent in a nested phase is only counted
+    for the nested phase.
+'''
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float('inf'))
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, float('inf'))
+
+# The recorders of the current request or test, such as a RequestTimer or a
+# QueryBudget. Context variables are copied to the threads of sync_to_async,
+# so queries of the async ORM are recorded as well.
+current_recorders = ContextVar('cmnsdjango_recorders', default=())
+
+# The open phases of the current task as (timer, nested intervals) frames. Tasks
+# started in a phase, such as by asyncio.gather(), get a copy, so concurrent
+# phases do not pop each other's frames.
+phase_stack = ContextVar('cmnsdjango_phase_stack', default=())
+
+
+def count_query(execute, sql, params, many, context):
+  ''' Database execute wrapper that passes queries to the current recorders '''
+  recorders = current_recorders.get()
+  if not recorders:
+    return execute(sql, params, many, context)
+  start = time.perf_counter()
+  try:
+    return execute(sql, params, many, context)
+  finally:
+    duration = time.perf_counter() - start
+    for recorder in recorders:
+      recorder.record_query(sql, params, many, duration)
+
+
+def covered(intervals):
+  ''' Time covered by (start, end) intervals, concurrent phases can overlap '''
+  total = 0.0
+  last = float('-inf')
+  for start, end in sorted(intervals):
+    if end > last:
+      total += end - max(start, last)
+      last = end
+  return total
+
+
+def count_render():
+  ''' Pass a template render to the current recorders '''
+  for recorder in current_recorders.get():
+    recorder.record_render()
+
+
+def install_query_counter(connection, **kwargs):
+  """
+  Add count_query to a connection, each thread has its own connections.
+  It is added as the outermost wrapper, because connection.execute_wrapper()
+  removes the last wrapper when its context exits, and the connection may be
+  created inside such a context. Connected to connection_created by
+  CoreConfig.ready().
+  """
+  if count_query not in connection.execute_wrappers:
+    connection.execute_wrappers.insert(0, count_query)
+
+
+@contextmanager
+def recording(recorder):
+  """
+  Pass the queries on all database connections and the template renders
+  of JsonUtils views to recorder, which implements record_query() and
+  record_render(), while the context is active.
+  """
+  for alias in connections:
+    install_query_counter(connections[alias])
+  token = current_recorders.set(current_recorders.get() + (recorder,))
+  try:
+    yield recorder
+  finally:
+    current_recorders.reset(token)
+
+
+def timed(phase):
+  ''' Decorator that records the time spent in a JsonUtils method as phase '''
+  def decorator(method):
+    if iscoroutinefunction(method):
+      @functools.wraps(method)
+      async def async_wrapper(self, *args, **kwargs):
+        timer = getattr(self, 'timer', None)
+        if timer is None:
+          return await method(self, *args, **kwargs)
+        with timer.phase(phase):
+          return await method(self, *args, **kwargs)
+      return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+      timer = getattr(self, 'timer', None)
+      if timer is None:
+        return method(self, *args, **kwargs)
+      with timer.phase(phase):
+        return method(self, *args, **kwargs)
+    return wrapper
+  return decorator
+
+
+class RequestTimer:
+  """
+  Collects phase timings, query counts and template renders of a request.
+  """
+
+  def __init__(self, view_name):
+    self.view_name = view_name
+    self.phases = defaultdict(float)
+    self.queries = 0
+    self.query_time = 0.0
+    self.renders = 0
+    self.total = 0.0
+
+  @contextmanager
+  def phase(self, name):
+    start = time.perf_counter()
+    parents = phase_stack.get()
+    nested = []
+    token = phase_stack.set(parents + ((self, nested),))
+    try:
+      yield
+    finally:
+      end = time.perf_counter()
+      phase_stack.reset(token)
+      self.phases[name] += end - start - covered(nested)
+      if parents and parents[-1][0] is self:
+        parents[-1][1].append((start, end))
+
+  def record_query(self, sql, params, many, duration):
+    self.queries += 1
+    self.query_time += duration
+
+  def record_render(self):
+    self.renders += 1
+
+  @contextmanager
+  def instrument(self):
+    ''' Time the request and record its queries and renders '''
+    start = time.perf_counter()
+    try:
+      with recording(self):
+        yield self
+    finally:
+      self.total = time.perf_counter() - start
+
+  def server_timing(self):
+    ''' Value for the Server-Timing response header, durations in milliseconds '''
+    metrics = [f'{name};dur={duration * 1000:.2f}' for name, duration in self.phases.items()]
+    metrics.append(f'db;dur={self.query_time * 1000:.2f};desc="{self.queries} queries"')
+    metrics.append(f'render;desc="{self.renders} renders"')
+    metrics.append(f'total;dur={self.total * 1000:.2f}')
+    return ', '.join(metrics)
+
+  def as_dict(self):
+    return {
+      'view': self.view_name,
+      'total_ms': round(self.total * 1000, 2),
+      'phases_ms': {name: round(duration * 1000, 2) for name, duration in self.phases.items()},
+      'queries': self.queries,
+      'query_ms': round(self.query_time * 1000, 2),
+      'renders': self.renders,
+    }
+
+  def finish(self, request, response):
+    ''' Publish the results to the response, the log and the histograms '''
+    response['Server-Timing'] = self.server_timing()
+    logger.info(json.dumps(self.as_dict() | {'path': request.path, 'status': response.status_code}))
+    metrics.observe(self)
+    return response
+
+
+class Histogram:
+  def __init__(self, buckets):
+    self.buckets = buckets
+    self.counts = [0] * len(buckets)
+    self.sum = 0.0
+    self.count = 0
+
+  def observe(self, value):
+    for index, bound in enumerate(self.buckets):
+      if value <= bound:
+        self.counts[index] += 1
+        break
+    self.sum += value
+    self.count += 1
+
+
+class Metrics:
+  """
+  In-process histograms of request timings, per view and phase.
+  Every process keeps its own histograms.
+  """
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.reset()
+
+  def reset(self):
+    self.phases = {}
+    self.totals = {}
+    self.queries = {}
+    self.renders = {}
+
+  def get(self, histograms, key, buckets=BUCKETS):
+    if key not in histograms:
+      histograms[key] = Histogram(buckets)
+    return histograms[key]
+
+  def observe(self, timer):
+    with self.lock:
+      for phase, duration in timer.phases.items():
+        self.get(self.phases, (timer.view_name, phase)).observe(duration)
+      self.get(self.totals, (timer.view_name,)).observe(timer.total)
+      self.get(self.queries, (timer.view_name,), QUERY_BUCKETS).observe(timer.queries)
+      self.get(self.renders, (timer.view_name,), QUERY_BUCKETS).observe(timer.renders)
+
+  def render_prometheus(self):
+    ''' Render all histograms in the Prometheus text exposition format '''
+    lines = []
+    with self.lock:
+      for name, help_text, histograms, labels in [
+        ('cmnsdjango_phase_seconds', 'Time spent per phase of a cmnsdjango view', self.phases, ('view', 'phase')),
+        ('cmnsdjango_request_seconds', 'Total time of a cmnsdjango view', self.totals, ('view',)),
+        ('cmnsdjango_request_queries', 'SQL queries per request of a cmnsdjango view', self.queries, ('view',)),
+        ('cmnsdjango_request_renders', 'Template renders per request of a cmnsdjango view', self.renders, ('view',)),
+      ]:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for key, histogram in sorted(histograms.items()):
+          label = ','.join(f'{label}="{value}"' for label, value in zip(labels, key))
+          cumulative = 0
+          for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{name}_bucket{{{label},le="{le}"}} {cumulative}')
+          lines.append(f'{name}_sum{{{label}}} {histogram.sum}')
+          lines.append(f'{name}_count{{{label}}} {histogram.count}')
+    return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
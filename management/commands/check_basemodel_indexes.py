@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.apps import apps
+from django.db import connections, DEFAULT_DB_ALIAS
+
+from cmnsdjango.models import BaseModel
+
+class Command(BaseCommand):
+  help = 'Report concrete BaseModel subclasses that lack the default BaseModel indexes'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to inspect when using --check-database')
+    parser.add_argument('--check-database', action='store_true', help='Also verify that the indexes exist in the database')
+    parser.add_argument('--fail', action='store_true', help='Exit with a non-zero status when indexes are missing')
+
+  def handle(self, *args, **options):
+    expected = [self.signature(index) for index in BaseModel.Meta.indexes]
+    missing_total = 0
+    for model in apps.get_models():
+      if not issubclass(model, BaseModel) or model._meta.proxy or not model._meta.managed:
+        continue
+      declared = [self.signature(index) for index in model._meta.indexes]
+      missing = [signature for signature in expected if signature not in declared]
+      if options['check_database']:
+        missing += [signature for signature in expected if signature in declared and not self.in_database(model, signature, options['database'])]
+      label = model._meta.label
+      if missing:
+        missing_total += len(missing)
+        for fields, condition in missing:
+          description = ', '.join(fields) + (f' where {condition}' if condition else '')
+          self.stdout.write(self.style.WARNING(f'{label}: missing index on {description}'))
+      elif options['verbosity'] > 1:
+        self.stdout.write(self.style.SUCCESS(f'{label}: all default indexes present'))
+    if missing_total:
+      self.stdout.write(f'{missing_total} missing index(es). Declare Meta.indexes by extending BaseModel.Meta or add them to your own Meta.indexes.')
+      if options['fail']:
+        raise SystemExit(1)
+    else:
+      self.stdout.write(self.style.SUCCESS('All BaseModel subclasses have the default indexes.'))
+
+  def signature(self, index):
+    ''' Compare indexes by fields and condition, as names differ per model '''
+    return (tuple(index.fields), str(index.condition) if index.condition else None)
+
+  def in_database(self, model, signature, database):
+    ''' Check if an index on the same columns exists in the database.
+        Conditions are not introspected, only the column order is compared.
+    '''
+    columns = [model._meta.get_field(field.lstrip('-')).column for field in signature[0]]
+    connection = connections[database]
+    with connection.cursor() as cursor:
+      constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    return any(constraint['index'] and constraint['columns'] == columns for constraint in constraints.values())
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+MANIFEST_NAME = '.cmnsdjango-static-manifest.json'
+
+class Command(BaseCommand):
+  help = 'Collect only the static files whose content changed since the last run, based on a manifest of content hashes'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--dry-run', action='store_true', help='Report the files that would be copied and deleted, without changing anything')
+    parser.add_argument('--manifest', help=f'Path of the manifest, defaults to {MANIFEST_NAME} in STATIC_ROOT')
+    parser.add_argument('--full', action='store_true', help='Run a full collectstatic and rebuild the manifest')
+
+  def handle(self, *args, **options):
+    if not apps.is_installed('django.contrib.staticfiles'):
+      raise CommandError('django.contrib.staticfiles is not installed.')
+    if not settings.STATIC_ROOT:
+      raise CommandError('STATIC_ROOT is not set.')
+    self.dry_run = options['dry_run']
+    self.verbosity = options['verbosity']
+    manifest_path = options['manifest'] or os.path.join(settings.STATIC_ROOT, MANIFEST_NAME)
+    start = time.monotonic()
+    manifest = self.load_manifest(manifest_path)
+    sources = self.find_sources()
+    if manifest is None or options['full']:
+      manifest = self.collect_full(sources, 'No manifest found' if manifest is None else 'Full collection requested')
+    elif hasattr(staticfiles_storage, 'post_process'):
+      # Storages such as ManifestStaticFilesStorage rewrite the references between files
+      manifest = self.collect_full(sources, 'The static files storage post processes files')
+    else:
+      manifest = self.collect_changed(sources, manifest)
+    if not self.dry_run:
+      self.save_manifest(manifest_path, manifest)
+    self.stdout.write(f'Finished in {time.monotonic() - start:.2f}s.')
+
+  ''' Manifest '''
+  def load_manifest(self, path):
+    try:
+      with open(path) as file:
+        return json.load(file)['files']
+    except (OSError, ValueError, KeyError):
+      return None
+
+  def save_manifest(self, path, manifest):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.tmp', 'w') as file:
+      json.dump({'version': 1, 'files': manifest}, file)
+    os.replace(f'{path}.tmp', path)
+
+  def get_entry(self, storage, path, stat=None):
+    stat = stat or os.stat(storage.path(path))
+    digest = hashlib.sha256()
+    with storage.open(path) as file:
+      for chunk in file.chunks():
+        digest.update(chunk)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': digest.hexdigest()}
+
+  ''' Sources '''
+  def find_sources(self):
+    ''' The source file of every prefixed path, the first finder wins like in collectstatic '''
+    ignore_patterns = apps.get_app_config('staticfiles').ignore_patterns
+    sources = {}
+    for finder in finders.get_finders():
+      for path, storage in finder.list(ignore_patterns):
+        prefixed_path = os.path.join(storage.prefix, path) if getattr(storage, 'prefix', None) else path
+        sources.setdefault(prefixed_path, (storage, path))
+    return sources
+
+  ''' Collecting '''
+  def collect_full(self, sources, reason):
+    self.stdout.write(f'{reason}, collecting all static files.')
+    if self.dry_run:
+      size = sum(os.stat(storage.path(path)).st_size for storage, path in sources.values())
+      self.stdout.write(f'Would copy {len(sources)} files ({size / 1024 / 1024:.1f} MB).')
+      return {}
+    call_command('collectstatic', interactive=False, verbosity=self.verbosity)
+    return {prefixed_path: self.get_entry(storage, path) for prefixed_path, (storage, path) in sources.items()}
+
+  def collect_changed(self, sources, manifest):
+    result = {}
+    copied = deleted = hashed = copied_size = 0
+    for prefixed_path, (storage, path) in sources.items():
+      stat = os.stat(storage.path(path))
+      entry = manifest.get(prefixed_path)
+      if entry and (entry['size'], entry['mtime']) == (stat.st_size, stat.st_mtime) and staticfiles_storage.exists(prefixed_path):
+        # Unchanged size and modification time: skip hashing
+        result[prefixed_path] = entry
+        continue
+      new_entry = self.get_entry(storage, path, stat)
+      hashed += 1
+      result[prefixed_path] = new_entry
+      if entry and entry['hash'] == new_entry['hash'] and staticfiles_storage.exists(prefixed_path):
+        continue
+      copied += 1
+      copied_size += new_entry['size']
+      self.log(f"{'Would copy' if self.dry_run else 'Copying'} '{prefixed_path}'")
+      if not self.dry_run:
+        self.copy_file(storage, path, prefixed_path)
+    for prefixed_path in manifest.keys() - sources.keys():
+      deleted += 1
+      self.log(f"{'Would delete' if self.dry_run else 'Deleting'} '{prefixed_path}'")
+      if not self.dry_run and staticfiles_storage.exists(prefixed_path):
+        staticfiles_storage.delete(prefixed_path)
+    self.stdout.write(
+      f"{'Would copy' if self.dry_run else 'Copied'} {copied} files ({copied_size / 1024:.1f} kB), "
+      f"{'would delete' if self.dry_run else 'deleted'} {deleted} files, "
+      f"hashed {hashed} of {len(sources)} files."
+    )
+    return result
+
+  def copy_file(self, storage, path, prefixed_path):
+    if staticfiles_storage.exists(prefixed_path):
+      staticfiles_storage.delete(prefixed_path)
+    with storage.open(path) as source_file:
+      staticfiles_storage.save(prefixed_path, source_file)
+
+  def log(self, message):
+    if self.verbosity > 1:
+      self.stdout.write(message)
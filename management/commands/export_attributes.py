@@ -0,0 +1,38 @@
+import sys
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+
+from cmnsdjango.attribute_transfer import AttributeExporter, Progress
+
+class Command(BaseCommand):
+  help = 'Export attributes of a model as NDJSON, one value or many-to-many link per line'
+
+  def add_arguments(self, parser):
+    parser.add_argument('model', help='Model to export (app_label.ModelName)')
+    parser.add_argument('fields', nargs='+', help='Fields to export')
+    parser.add_argument('--output', default='-', help='File to write to, - for stdout (default)')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='Number of rows fetched from the database at once')
+
+  def handle(self, *args, **options):
+    try:
+      model = apps.get_model(options['model'])
+    except (LookupError, ValueError) as e:
+      raise CommandError(e)
+    exporter = AttributeExporter(model, chunk_size=options['chunk_size'])
+    output = sys.stdout if options['output'] == '-' else open(options['output'], 'w', encoding='utf-8')
+    # Progress goes to stderr, stdout may be the export itself
+    progress = Progress(self.stderr.write)
+    count = 0
+    try:
+      for line in exporter.lines(options['fields']):
+        output.write(line + '\n')
+        count += 1
+        progress.update(count)
+    except (FieldDoesNotExist, ValueError) as e:
+      raise CommandError(e)
+    finally:
+      if output is not sys.stdout:
+        output.close()
+    self.stderr.write(self.style.SUCCESS(f'{model._meta.label}: exported {progress.summary(count)}'))
@@ -0,0 +1,50 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+
+from cmnsdjango.attribute_transfer import AttributeImporter, Progress
+
+class Command(BaseCommand):
+  help = 'Import attributes from NDJSON written by export_attributes'
+
+  def add_arguments(self, parser):
+    parser.add_argument('input', nargs='?', default='-', help='File to read, - for stdin (default)')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Number of lines imported per transaction')
+    parser.add_argument('--no-create', action='store_true', help='Skip links to related objects that do not exist, instead of creating them')
+    parser.add_argument('--user', help='Username set as user of created related objects')
+    parser.add_argument('--no-rebuild-counts', action='store_true', help='Do not rebuild the counted relations that received links')
+
+  def handle(self, *args, **options):
+    user = None
+    if options['user']:
+      try:
+        user = get_user_model()._default_manager.get_by_natural_key(options['user'])
+      except get_user_model().DoesNotExist:
+        raise CommandError(f"User '{options['user']}' does not exist.")
+    importer = AttributeImporter(batch_size=options['batch_size'], create_missing=not options['no_create'], user=user)
+    source = sys.stdin if options['input'] == '-' else open(options['input'], encoding='utf-8')
+    progress = Progress(self.stderr.write)
+    count = 0
+    try:
+      for count in importer.import_lines(source):
+        progress.update(count)
+    except (LookupError, FieldDoesNotExist, ValueError) as e:
+      raise CommandError(f'Import stopped after {count} lines: {e}')
+    finally:
+      if source is not sys.stdin:
+        source.close()
+    stats = importer.stats
+    self.stdout.write(self.style.SUCCESS(
+      f"Imported {progress.summary(count)}: {stats['linked']} links, {stats['updated']} values, "
+      f"{stats['created']} related objects created, {stats['skipped']} lines skipped"
+    ))
+    for label, values in importer.unresolved.items():
+      if values:
+        shown = ', '.join(repr(value) for value in sorted(values, key=str)[:20])
+        more = f' and {len(values) - 20} more' if len(values) > 20 else ''
+        self.stderr.write(self.style.WARNING(f'{label}: {len(values)} related values not found or created: {shown}{more}'))
+    if not options['no_rebuild_counts']:
+      for key in importer.rebuild_counts():
+        self.stdout.write(f'{key}: rebuilt relation counts')
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cmnsdjango.counters import counters
+
+class Command(BaseCommand):
+  help = 'Rebuild the related object counts declared with counted_relations'
+
+  def add_arguments(self, parser):
+    parser.add_argument('models', nargs='*', help='Only rebuild counts of these models (app_label.ModelName)')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Number of related objects updated per query')
+
+  def handle(self, *args, **options):
+    selected = [counter for counter in counters if not options['models'] or counter.model._meta.label in options['models']]
+    if not selected:
+      raise CommandError('No counted relations found. Declare counted_relations on your models.')
+    for counter in selected:
+      start = time.monotonic()
+      updated = counter.rebuild(batch_size=options['batch_size'])
+      self.stdout.write(self.style.SUCCESS(
+        f'{counter.key}: rebuilt {counter.related_model._meta.label}.{counter.column} for {updated} objects in {time.monotonic() - start:.2f}s'
+      ))
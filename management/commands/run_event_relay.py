@@ -0,0 +1,19 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from cmnsdjango.event_relay import EventRelay
+
+class Command(BaseCommand):
+  help = 'Run a local stand-in for Redis publish/subscribe, to use RedisBroker without a Redis server'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=6379, help='Port to listen on (default 6379)')
+
+  def handle(self, *args, **options):
+    self.stdout.write(f"Event relay listening on {options['host']}:{options['port']}")
+    try:
+      asyncio.run(EventRelay().serve(options['host'], options['port']))
+    except KeyboardInterrupt:
+      pass
@@ -1,4 +1,4 @@
-from django.contrib.sites.models import Site
+from django.apps import apps
 from django.conf import settings
 import logging
 
@@ -8,6 +8,8 @@ class DynamicSiteMiddleware:
     """Middleware to set SITE_ID dynamically based on request domain."""
     def __init__(self, get_response):
         self.get_response = get_response
+        # Looked up when the middleware is loaded, so importing this module does not require the sites app
+        self.site_model = apps.get_model('sites', 'Site')
 
     def __call__(self, request):
         # Get the domain from the request
@@ -15,11 +17,11 @@ class DynamicSiteMiddleware:
 
         # Get the site corresponding to the domain
         try:
-            site = Site.objects.get(domain=domain)
+            site = self.site_model.objects.get(domain=domain)
             settings.SITE_ID = site.id
             logger.info(f'Current Site: {domain}: {site}')
 
-        except Site.DoesNotExist:
+        except self.site_model.DoesNotExist:
             logger.warning(f'No site found for domain: {domain}')
             pass  # Handle missing site logic if needed
             # By doing nothing, we fall back to the default site id
@@ -0,0 +1,36 @@
+# Generated by Django 6.1.2 on 2026-10-19 01:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField()),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.CharField(max_length=64)),
+                ('field', models.CharField(max_length=100)),
+                ('action', models.CharField(max_length=20)),
+                ('old_value', models.JSONField(blank=True, null=True)),
+                ('new_value', models.JSONField(blank=True, null=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'audit entry',
+                'verbose_name_plural': 'audit entries',
+                'indexes': [models.Index(fields=['model', 'object_id', '-date_created'], name='cmnsdjango__model_75e7d3_idx'), models.Index(fields=['user', '-date_created'], name='cmnsdjango__user_id_128e88_idx'), models.Index(fields=['-date_created'], name='cmnsdjango__date_cr_dc2073_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.1.2 on 2026-10-19 01:35
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cmnsdjango', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='auditentry',
+            options={'permissions': [('undo_auditentry', 'Can undo audit entry')], 'verbose_name': 'audit entry', 'verbose_name_plural': 'audit entries'},
+        ),
+    ]
@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models.functions import Lower
+from django.db.backends.utils import names_digest
+from django.core.exceptions import FieldDoesNotExist
 from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
@@ -7,6 +10,99 @@ if 'django.contrib.sites' in settings.INSTALLED_APPS:
   from django.contrib.sites.models import Site
   from django.contrib.sites.managers import CurrentSiteManager
 
+''' Case-insensitive unique constraint
+    Unique functional index on Lower(field). Add it to Meta.constraints of a
+    concrete model so that case-insensitive lookups of that field, such as
+    finding or creating a tag by name via JsonSetAttribute, use an index and
+    cannot produce duplicates under concurrent requests.
+    Example:
+      class Meta:
+        constraints = [case_insensitive_unique('name')]
+'''
+def case_insensitive_unique(field='name'):
+  return models.UniqueConstraint(
+    Lower(field),
+    name=f'%(app_label)s_%(class)s_{field}_ci_unique',
+  )
+
+''' Conditional Index
+    Partial index that does not require an explicit name. Django only
+    generates index names for plain field indexes, while names given on an
+    abstract model must be unique and at most 30 characters for every
+    subclass. A ConditionalIndex is named per concrete model like a plain
+    index, with the condition included in the hash so partial indexes on
+    the same fields do not clash.
+'''
+class ConditionalIndex(models.Index):
+  suffix = 'prt'
+
+  def __init__(self, *, fields=(), condition=None, name='', **kwargs):
+    # Index refuses a condition without a name; the name is set per model later
+    super().__init__(fields=fields, condition=condition, name=name or 'unnamed', **kwargs)
+    self.name = name
+
+  def set_name_with_model(self, model):
+    super().set_name_with_model(model)
+    prefix = self.name[:-(len(self.suffix) + 7)]
+    self.name = f'{prefix}{names_digest(self.name, str(self.condition), length=6)}_{self.suffix}'
+
+''' BaseModel QuerySet
+    Status and visibility filters for BaseModel objects. Concept and
+    published objects are live; revoked and deleted objects are not.
+'''
+class BaseModelQuerySet(models.QuerySet):
+  live_statuses = ['c', 'p']
+
+  def live(self):
+    return self.filter(status__in=self.live_statuses)
+
+  def published(self):
+    return self.filter(status='p')
+
+  def visible_to(self, user):
+    ''' Published objects and the concept objects of the user itself.
+        If the model has a visibility field, the visibility rules are applied
+        as well: public and community objects, family objects of the user or
+        the user's family, and private objects of the user.
+    '''
+    if user is None or not user.is_authenticated:
+      queryset = self.published()
+      if self._has_field('visibility'):
+        queryset = queryset.filter(visibility='p')
+      return queryset
+    queryset = self.filter(models.Q(status='p') | models.Q(status='c', user=user))
+    if self._has_field('visibility'):
+      visibility = models.Q(visibility__in=['p', 'c']) | models.Q(visibility__in=['f', 'q'], user=user)
+      try:
+        # Family members are stored on the user profile if the project has one
+        user._meta.get_field('profile').related_model._meta.get_field('family')
+        family = get_user_model().objects.filter(profile__family=user)
+        visibility |= models.Q(visibility='f', user__in=family)
+      except FieldDoesNotExist:
+        pass
+      queryset = queryset.filter(visibility)
+    return queryset
+
+  def _has_field(self, field_name):
+    try:
+      self.model._meta.get_field(field_name)
+      return True
+    except FieldDoesNotExist:
+      return False
+
+''' BaseModel Manager
+    Model.objects of BaseModel. Hides revoked and deleted objects, use
+    Model.objects.all_with_deleted() to include them. It is not the default
+    manager: Django uses the default manager for unique checks, constraint
+    validation and related managers, which need to see all rows.
+'''
+class BaseModelManager(models.Manager.from_queryset(BaseModelQuerySet)):
+  def get_queryset(self):
+    return super().get_queryset().live()
+
+  def all_with_deleted(self):
+    return super().get_queryset()
+
 ''' BaseModel
     Abstract base model with common fields and methods
     for all models in the project.
@@ -20,6 +116,11 @@ class BaseModel(models.Model):
   )
   status = models.CharField(max_length=1, choices=status_choices, default='p')
 
+  # The first manager is the default manager: all objects, so a slug of a deleted
+  # object fails validation instead of the insert. Related managers use it as well.
+  all_objects = BaseModelQuerySet.as_manager()
+  objects = BaseModelManager()
+
   date_created = models.DateTimeField(auto_now_add=True)
   date_modified = models.DateTimeField(auto_now=True)
   user = models.ForeignKey(
@@ -32,6 +133,18 @@ class BaseModel(models.Model):
 
   class Meta:
     abstract = True
+    ''' Default indexes for admin changelists and public listings.
+        Override Meta.indexes in a subclass to replace them, or extend them with
+        class Meta(BaseModel.Meta):
+          indexes = BaseModel.Meta.indexes + [...]
+    '''
+    indexes = [
+      models.Index(fields=['-date_created']),
+      models.Index(fields=['status', '-date_created']),
+      models.Index(fields=['user', 'status']),
+      ConditionalIndex(fields=['-date_created'], condition=models.Q(status='p')),
+      ConditionalIndex(fields=['-date_created'], condition=models.Q(status__in=BaseModelQuerySet.live_statuses)),
+    ]
 
   def __str__(self):
     if hasattr(self, "name"):
@@ -44,18 +157,66 @@ class BaseModel(models.Model):
 
 # Alleen MultiSiteBaseModel laden als 'django.contrib.sites' beschikbaar is
 if 'django.contrib.sites' in settings.INSTALLED_APPS:
+  ''' CurrentSiteBaseModelManager
+      Site-specific manager that hides revoked and deleted objects.
+  '''
+  class CurrentSiteBaseModelManager(CurrentSiteManager.from_queryset(BaseModelQuerySet)):
+    def get_queryset(self):
+      return super().get_queryset().live()
+
+    def all_with_deleted(self):
+      return super().get_queryset()
+
   ''' MultiSiteBaseModel 
       Extends BaseModel with multi-site support.
   '''
   class MultiSiteBaseModel(BaseModel):
     """Abstract base model with common fields and methods."""
     sites = models.ManyToManyField(Site, related_name="%(class)s_sites")
-    objects = models.Manager()  # Default manager
-    on_site = CurrentSiteManager()  # Site-specific manager
+    all_objects = BaseModelQuerySet.as_manager()  # Default manager
+    objects = BaseModelManager()  # Live objects
+    on_site = CurrentSiteBaseModelManager()  # Site-specific manager
 
-    class Meta:
+    class Meta(BaseModel.Meta):
       abstract = True
 
     def count_sites(self):
+      # BaseModelAdmin annotates the count to avoid a query per row
+      if hasattr(self, 'sites_count'):
+        return self.sites_count
       return self.sites.count()
-    count_sites.short_description = _('sites')
\ No newline at end of file
+    count_sites.short_description = _('sites')
+    count_sites.admin_order_field = 'sites_count'
+
+''' AuditEntry
+    A change of a field made through JsonSetAttribute, written in batches
+    by cmnsdjango.audit.DatabaseSink. Values of related fields are primary keys.
+'''
+class AuditEntry(models.Model):
+  date_created = models.DateTimeField()
+  user = models.ForeignKey(
+    settings.AUTH_USER_MODEL,
+    on_delete=models.SET_NULL,
+    null=True,
+    blank=True,
+    related_name='+'
+  )
+  model = models.CharField(max_length=100)
+  object_id = models.CharField(max_length=64)
+  field = models.CharField(max_length=100)
+  action = models.CharField(max_length=20)
+  old_value = models.JSONField(null=True, blank=True)
+  new_value = models.JSONField(null=True, blank=True)
+
+  class Meta:
+    verbose_name = _('audit entry')
+    verbose_name_plural = _('audit entries')
+    permissions = [('undo_auditentry', _('Can undo audit entry'))]
+    indexes = [
+      models.Index(fields=['model', 'object_id', '-date_created']),
+      models.Index(fields=['user', '-date_created']),
+      models.Index(fields=['-date_created']),
+    ]
+
+  def __str__(self):
+    return f'{self.action} {self.model}:{self.object_id}.{self.field}'
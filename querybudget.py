@@ -0,0 +1,185 @@
+import functools
+import json
+import logging
+import re
+from collections import Counter
+from inspect import isawaitable, iscoroutinefunction
+
+from django.conf import settings
+
+from cmnsdjango.instrumentation import recording
+
+logger = logging.getLogger(__name__)
+
+''' Query budgets
+
+    Declare the maximum number of SQL queries and template renders of a
+    JsonUtils endpoint, to notice regressions like an extra count() in
+    get_object() or a query per rendered item. The budget can grow with the
+    number of payload items: queries=3, per_item=1 allows 3 queries plus one
+    per item. Queries repeated for every payload item are reported as N+1
+    queries, unless allow_n_plus_one is set.
+
+    As a context manager, in tests:
+      with QueryBudget(queries=4, renders=10) as budget:
+        response = client.get(url)
+        budget.observe_response(response)
+
+    As a view decorator, which raises when DEBUG is on and logs a warning
+    otherwise:
+      @method_decorator(query_budget(queries=4), name='dispatch')
+      class MyView(JsonGetAttributes):
+        ...
+
+    As a pytest fixture, after adding pytest_plugins = ['cmnsdjango.querybudget']
+    to conftest.py:
+      def test_attributes(client, query_budget):
+        with query_budget(queries=4) as budget:
+          ...
+'''
+
+
+class QueryBudgetExceeded(AssertionError):
+  pass
+
+
+class QueryBudget:
+  """
+  Records the queries and template renders while active and checks them
+  against the budget when the context exits.
+  """
+  # Queries repeated this often are reported as N+1 when the number of
+  # payload items is unknown
+  repeat_limit = 3
+
+  def __init__(self, queries=None, renders=None, per_item=0, renders_per_item=0, allow_n_plus_one=False):
+    self.max_queries = queries
+    self.max_renders = renders
+    self.per_item = per_item
+    self.renders_per_item = renders_per_item
+    self.allow_n_plus_one = allow_n_plus_one
+    self.queries = []
+    self.renders = 0
+    self.items = None
+    self.recorder = None
+
+  def __enter__(self):
+    self.recorder = recording(self)
+    self.recorder.__enter__()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.recorder.__exit__(exc_type, exc_value, traceback)
+    if exc_type is None:
+      self.check()
+
+  def record_query(self, sql, params, many, duration):
+    self.queries.append((sql, params))
+
+  def record_render(self):
+    self.renders += 1
+
+  def observe_response(self, response):
+    ''' Take the number of payload items from a JsonUtils response '''
+    try:
+      self.items = len(json.loads(response.content).get('payload', []))
+    except (AttributeError, TypeError, ValueError):
+      pass
+    return response
+
+  def get_query_limit(self):
+    if self.max_queries is None:
+      return None
+    return self.max_queries + self.per_item * (self.items or 0)
+
+  def get_render_limit(self):
+    if self.max_renders is None:
+      return None
+    return self.max_renders + self.renders_per_item * (self.items or 0)
+
+  def get_repeated_queries(self):
+    ''' Queries with identical SQL executed for every payload item '''
+    limit = max(self.items, 2) if self.items else self.repeat_limit
+    counts = Counter(normalize(sql) for sql, params in self.queries)
+    return {sql: count for sql, count in counts.items() if count >= limit}
+
+  def get_errors(self):
+    errors = []
+    query_limit = self.get_query_limit()
+    if query_limit is not None and len(self.queries) > query_limit:
+      errors.append(f'{len(self.queries)} queries executed, {query_limit} allowed')
+    render_limit = self.get_render_limit()
+    if render_limit is not None and self.renders > render_limit:
+      errors.append(f'{self.renders} templates rendered, {render_limit} allowed')
+    if not self.allow_n_plus_one:
+      for sql, count in self.get_repeated_queries().items():
+        errors.append(f'N+1 query executed {count} times: {sql}')
+    return errors
+
+  def check(self):
+    errors = self.get_errors()
+    if errors:
+      items = f' for {self.items} payload items' if self.items is not None else ''
+      queries = '\n'.join(f'{number}. {sql} {params}' for number, (sql, params) in enumerate(self.queries, start=1))
+      raise QueryBudgetExceeded('Query budget exceeded{}:\n{}\nQueries:\n{}'.format(items, '\n'.join(errors), queries))
+
+
+def normalize(sql):
+  ''' Collapse IN lists so queries differing only in the number of parameters match '''
+  return re.sub(r'IN \((%s, )*%s\)', 'IN (...)', sql)
+
+
+def query_budget(strict=None, **limits):
+  """
+  View decorator that checks every request against a QueryBudget. Raises
+  QueryBudgetExceeded if strict, which defaults to settings.DEBUG, and
+  logs a warning otherwise. Works on async views and on the dispatch() of
+  async class-based views, which returns a coroutine.
+  """
+  def check(budget, view):
+    try:
+      budget.check()
+    except QueryBudgetExceeded as e:
+      if strict if strict is not None else settings.DEBUG:
+        raise
+      logger.warning(f'{ view.__qualname__ }: { e }')
+
+  def decorator(view):
+    if iscoroutinefunction(view):
+      @functools.wraps(view)
+      async def async_wrapper(*args, **kwargs):
+        with recording(QueryBudget(**limits)) as budget:
+          response = budget.observe_response(await view(*args, **kwargs))
+        check(budget, view)
+        return response
+      return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+      with recording(QueryBudget(**limits)) as budget:
+        response = view(*args, **kwargs)
+      if isawaitable(response):
+        # The dispatch() of an async view returns a coroutine, which runs after this wrapper returns
+        async def observe():
+          with recording(budget):
+            result = budget.observe_response(await response)
+          check(budget, view)
+          return result
+        return observe()
+      budget.observe_response(response)
+      check(budget, view)
+      return response
+    return wrapper
+  return decorator
+
+
+try:
+  import pytest
+except ImportError:
+  pytest = None
+
+if pytest:
+  @pytest.fixture(name='query_budget')
+  def query_budget_fixture():
+    ''' QueryBudget class for use as context manager in tests '''
+    return QueryBudget
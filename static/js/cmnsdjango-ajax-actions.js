@@ -1,8 +1,13 @@
 // cmnsdjango-ajax-actions.js
 
 /** SUGGESTIONS */
+const SUGGESTION_DEBOUNCE_DELAY = 250;  // Milliseconds to wait after the last keystroke
+const SUGGESTION_CACHE_SIZE = 20;       // Number of responses to keep per input
+
 /**
  * Sets up a listener for the attribute input to fetch suggestions via AJAX.
+ * Requests are debounced, stale requests are cancelled when the user keeps
+ * typing and recent responses are reused.
  * 
  * @param {HTMLElement} inputElement - The input element to monitor.
  */
@@ -15,35 +20,76 @@ function setupSuggestionListener(inputElement) {
     return;
   }
 
-  inputElement.addEventListener('input', async function () {
+  const responseCache = new Map();
+  let debounceTimer = null;
+  let controller = null;
+
+  function renderSuggestions(data) {
+    // Clear existing suggestions
+    suggestionList.innerHTML = '';
+
+    // Populate new suggestions from payload
+    data.payload.forEach(item => {
+      const suggestionItem = document.createElement('li');
+      suggestionItem.className = 'clickable';  // Optional: make suggestions clickable
+      suggestionItem.setAttribute('data-slug', item.slug);
+      suggestionItem.setAttribute('data-action', 'setAttribute');
+      suggestionItem.setAttribute('data-url', inputElement.getAttribute('data-url'));  // Submit URL
+      suggestionItem.setAttribute('data-attribute', inputElement.getAttribute('data-attribute'));  // Attribute
+      suggestionItem.setAttribute('data-success-url', inputElement.getAttribute('data-success-url'));  // Success URL
+      suggestionItem.innerHTML = item.display_text;
+      suggestionList.appendChild(suggestionItem);
+    });
+  }
+
+  async function fetchSuggestions(query) {
+    // Cancel the request for the previous query, also when this one is cached
+    if (controller) {
+      controller.abort();
+      controller = null;
+    }
+    if (responseCache.has(query)) {
+      renderSuggestions(responseCache.get(query));
+      return;
+    }
+    controller = new AbortController();
+    try {
+      const data = await sendAjaxRequest(suggestionUrl, "GET", { q: query }, { signal: controller.signal });
+      responseCache.set(query, data);
+      if (responseCache.size > SUGGESTION_CACHE_SIZE) {
+        // Maps keep insertion order, remove the oldest response
+        responseCache.delete(responseCache.keys().next().value);
+      }
+      // Only show the suggestions of what is still in the input
+      if (query === inputElement.value.trim()) {
+        renderSuggestions(data);
+      }
+    } catch (error) {
+      if (error.name !== "AbortError") {
+        showMessage("danger", "Failed to fetch suggestions.");
+      }
+    }
+  }
+
+  inputElement.addEventListener('input', function () {
     const query = inputElement.value.trim();
+    clearTimeout(debounceTimer);
 
     if (query.length < 2) {
+      if (controller) {
+        controller.abort();
+      }
       suggestionList.innerHTML = '';  // Clear suggestions if input is too short
       return;
     }
 
-    try {
-      const data = await sendAjaxRequest(suggestionUrl, "GET", { q: query });
-
-      // Clear existing suggestions
-      suggestionList.innerHTML = '';
-
-      // Populate new suggestions from payload
-      data.payload.forEach(item => {
-        const suggestionItem = document.createElement('li');
-        suggestionItem.className = 'clickable';  // Optional: make suggestions clickable
-        suggestionItem.setAttribute('data-slug', item.slug);
-        suggestionItem.setAttribute('data-action', 'setAttribute');
-        suggestionItem.setAttribute('data-url', inputElement.getAttribute('data-url'));  // Submit URL
-        suggestionItem.setAttribute('data-attribute', inputElement.getAttribute('data-attribute'));  // Attribute
-        suggestionItem.setAttribute('data-success-url', inputElement.getAttribute('data-success-url'));  // Success URL
-        suggestionItem.innerHTML = item.display_text;
-        suggestionList.appendChild(suggestionItem);
-      });
+    debounceTimer = setTimeout(() => fetchSuggestions(query), SUGGESTION_DEBOUNCE_DELAY);
+  });
 
-    } catch (error) {
-      showMessage("danger", "Failed to fetch suggestions.");
+  // Cached suggestions are outdated once an item is added to the attribute
+  document.addEventListener('cmnsdjango:attributeset', function (event) {
+    if (event.detail.attribute === inputElement.getAttribute('data-attribute')) {
+      responseCache.clear();
     }
   });
 }
@@ -133,9 +179,13 @@ async function setAttributeValue(url, attribute, data, successurl) {
     const response = await sendAjaxRequest(url, "POST", data);
     processResponse(response);
 
-    // If successful, refresh the attributes and close the overlay
+    // If successful, refresh the attributes and close the overlay. Live
+    // attributes are refreshed by the change event of the server.
     if (response.status === 200) {
-      getAttributes(successurl, attribute);
+      document.dispatchEvent(new CustomEvent('cmnsdjango:attributeset', { detail: { attribute: attribute } }));
+      if (typeof isLiveAttribute !== 'function' || !isLiveAttribute(attribute)) {
+        getAttributes(successurl, attribute);
+      }
       closeOverlay();
     }
   } catch (error) {
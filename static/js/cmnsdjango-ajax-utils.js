@@ -98,12 +98,14 @@ function parseDataFields(fields) {
  * @param {string} url - The URL to make the request to.
  * @param {string} method - HTTP method ('GET' or 'POST').
  * @param {Object} data - Data to send with the request (optional).
+ * @param {Object} options - Extra fetch options, such as an AbortController signal (optional).
  * @returns {Promise<Object>} - Returns a promise that resolves with the JSON response.
  */
-async function sendAjaxRequest(url, method = "GET", data = {}) {
+async function sendAjaxRequest(url, method = "GET", data = {}, options = {}) {
   const csrfToken = getCSRFToken();
   
   const fetchOptions = {
+    ...options,
     method: method.toUpperCase(),
     headers: {
       "X-CSRFToken": csrfToken,
@@ -122,7 +124,9 @@ async function sendAjaxRequest(url, method = "GET", data = {}) {
     if (!response.ok) throw new Error(`HTTP error! Status: ${response.status}`);
     return await response.json();
   } catch (error) {
-    console.error(`Error during AJAX call to ${url}:`, error);
+    if (error.name !== "AbortError") {
+      console.error(`Error during AJAX call to ${url}:`, error);
+    }
     throw error;
   }
 }
@@ -0,0 +1,68 @@
+// cmnsdjango-events.js
+
+/** LIVE ATTRIBUTES */
+/**
+ * Keeps attributes up to date with the change events of the server, instead
+ * of fetching them again after every change and polling for the changes of
+ * other users. Requires JSON_EVENTS = True in settings.
+ *
+ * Opt in by adding data-live="<model>:<pk>:<field>" to the target element of
+ * an attribute, with the URL to fetch the attribute from in data-live-url:
+ *   <div id="target-tags" data-live="location:12:tags" data-live-url="{% url 'json-get-attributes' ... %}"></div>
+ * The events URL can be set with data-events-url on the body, it defaults to
+ * /json/events/.
+ */
+const liveAttributes = new Map();  // "model:pk:field" => target elements
+
+/**
+ * Returns true if the attribute is refreshed by change events, so it does
+ * not need to be fetched again after setting it.
+ *
+ * @param {string} attribute - The name of the attribute.
+ */
+function isLiveAttribute(attribute) {
+  const target = document.getElementById('target-' + attribute);
+  return Boolean(target && target.hasAttribute('data-live') && liveAttributes.size);
+}
+
+/**
+ * Refreshes the live attributes matching a change event. Events without
+ * field refresh all live attributes of the object.
+ *
+ * @param {Object} change - The change event: model, pk, field and action.
+ */
+function refreshLiveAttributes(change) {
+  liveAttributes.forEach((elements, key) => {
+    const [model, pk, field] = key.split(':');
+    if (model === change.model && pk === String(change.pk) && (!change.field || field === change.field)) {
+      elements.forEach(element => {
+        getAttributes(element.getAttribute('data-live-url'), element.id.replace('target-', ''));
+      });
+    }
+  });
+}
+
+/**
+ * Subscribes to the change events of all elements with a data-live attribute.
+ */
+function setupLiveAttributes() {
+  document.querySelectorAll('[data-live]').forEach(element => {
+    const key = element.getAttribute('data-live');
+    if (!liveAttributes.has(key)) {
+      liveAttributes.set(key, []);
+    }
+    liveAttributes.get(key).push(element);
+  });
+  if (!liveAttributes.size || !window.EventSource) {
+    liveAttributes.clear();
+    return;
+  }
+  const eventsUrl = document.body.getAttribute('data-events-url') || '/json/events/';
+  const params = new URLSearchParams();
+  liveAttributes.forEach((elements, key) => params.append('subscribe', key));
+  const source = new EventSource(`${eventsUrl}?${params.toString()}`);
+  source.addEventListener('change', event => refreshLiveAttributes(JSON.parse(event.data)));
+  source.onerror = () => console.warn('Change events interrupted, reconnecting');
+}
+
+document.addEventListener("DOMContentLoaded", setupLiveAttributes);
@@ -1,12 +1,12 @@
 from django import template
 from django.template.defaultfilters import stringfilter
 
-import markdown as md
-
 register = template.Library()
 
 
 @register.filter()
 @stringfilter
 def markdown(value):
+    # Imported on first use, markdown is slow to import
+    import markdown as md
     return md.markdown(value, extensions=['markdown.extensions.fenced_code'])
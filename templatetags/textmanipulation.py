@@ -1,5 +1,6 @@
 from django import template
-import re
+
+from cmnsdjango.highlight import Highlighter, get_highlighter
 ''' https://stackoverflow.com/questions/21483003/replacing-a-character-in-django-template '''
 register = template.Library()
 
@@ -16,21 +17,18 @@ def replace(value, arg):
     what, to = arg.split('|')
     return value.replace(what, to)
 
-@register.filter
+@register.filter(is_safe=True)
 def highlight(value, query):
   """
-  Highlight the query in value while preserving original casing.
+  Highlight the terms of the query in value while preserving original casing.
+  The query is a string or a Highlighter, such as the highlighter in the
+  context of suggestions. The value is escaped unless it is safe HTML.
   Usage: {{ "First Lastname"|highlight:"last" }}
   """
   if not query:
     return value
-
-  regex = re.compile(re.escape(query), re.IGNORECASE)
-
-  def replace_match(match):
-    return f"<span class='highlight'>{match.group()}</span>"  # Preserve original case
-
-  return regex.sub(replace_match, value)
+  highlighter = query if isinstance(query, Highlighter) else get_highlighter(str(query))
+  return highlighter.highlight(value)
 
 @register.filter
 def split(value, delimiter=','):
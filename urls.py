@@ -4,6 +4,10 @@ from cmnsdjango import views as cmnsviews
 #from core.views import SignUpView
 
 urlpatterns = [
+  # Metrics of the instrumented views (JSON_INSTRUMENTATION)
+  path('json/metrics/', cmnsviews.MetricsView.as_view(), name='json-metrics'),
+  # Change events of attributes (JSON_EVENTS), use AsyncJsonEvents under ASGI
+  path('json/events/', cmnsviews.JsonEvents.as_view(), name='json-events'),
   # JSON GET Attributes
   path('json/<str:model>/<int:pk>:<str:slug>/attribute/<str:field>/', cmnsviews.JsonGetAttributes.as_view(), name='json-get-attributes-by-pk-slug'),
   path('json/<str:model>/<str:slug>/attribute/<str:field>/', cmnsviews.JsonGetAttributes.as_view(), name='json-get-attributes'),
@@ -0,0 +1,31 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.core.exceptions import PermissionDenied
+import time
+
+from cmnsdjango import events
+from cmnsdjango.views.async_json_utils import AsyncJsonUtils
+from cmnsdjango.views.JsonEvents import JsonEvents
+
+class AsyncJsonEvents(AsyncJsonUtils, JsonEvents):
+  """ Async version of JsonEvents, streams do not occupy a worker thread """
+  async def get(self, request, *args, **kwargs):
+    try:
+      await self.setup_async_request()
+      channels = await sync_to_async(self.get_channels)()
+    except PermissionDenied as e:
+      return JsonResponse({"error": str(e)}, status=403)
+    except ValueError as e:
+      return JsonResponse({"error": str(e)}, status=400)
+    return self.get_stream_response(self.astream(channels))
+
+  async def astream(self, channels):
+    # Subscribe within the event loop that reads the events
+    subscription = events.get_broker().subscribe(channels)
+    try:
+      yield 'retry: 1000\n\n'
+      deadline = self.get_deadline()
+      while time.monotonic() < deadline:
+        yield self.format_event(await subscription.aget(timeout=self.keepalive))
+    finally:
+      subscription.close()
@@ -0,0 +1,37 @@
+from django.http import JsonResponse
+from django.core.exceptions import PermissionDenied
+from django.utils.translation import gettext_lazy as _
+from django.db.models import QuerySet
+import traceback
+from django.conf import settings
+
+from cmnsdjango.views.async_json_utils import AsyncJsonUtils
+
+class AsyncJsonGetAttributes(AsyncJsonUtils):
+  """ Async version of JsonGetAttributes, for projects served under ASGI """
+  async def get(self, request, *args, **kwargs):
+    await self.setup_async_request()
+    return await self.arun_single_flight(self.aget_attributes)
+
+  async def aget_attributes(self):
+    try:
+      # Check CSRF token
+      self.check_csrf_token()
+      await self.aget_model(action='read')
+      # Fetch current values of field in model
+      values = await self.aget_field_value()
+      # Process search query
+      if isinstance(values, QuerySet):
+        values = self.search_queryset(values)
+      items = await self.aget_items(values)
+      return await self.arender_response(items)
+    except PermissionDenied as e:
+        return JsonResponse({"error": str(e)}, status=403)
+    except ValueError as e:
+      # Handle specific errors and return as JSON
+      return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+      response = {"error": _("an unexpected error occurred: {}").format(str(e))}
+      if settings.DEBUG and self.request.user.is_staff:
+        response['traceback'] = traceback.format_exc()
+      return JsonResponse(response, status=500)
@@ -0,0 +1,53 @@
+import asyncio
+from django.http import JsonResponse
+from django.core.exceptions import PermissionDenied
+from django.utils.translation import gettext_lazy as _
+import traceback
+from django.conf import settings
+
+from cmnsdjango.views.async_json_utils import AsyncJsonUtils
+from cmnsdjango.views.JsonGetSuggestions import JsonGetSuggestions
+
+class AsyncJsonGetSuggestions(AsyncJsonUtils, JsonGetSuggestions):
+  """ Async version of JsonGetSuggestions, for projects served under ASGI """
+  async def get(self, request, *args, **kwargs):
+    try:
+      await self.setup_async_request()
+      # Check CSRF token
+      self.check_csrf_token()
+      await self.aget_model(action='suggest')
+      suggestion_model = self.get_field_model()
+      # The object and the suggestion candidates do not depend on each other
+      obj, candidates = await asyncio.gather(
+        self.aget_object(),
+        self.aget_suggestion_candidates(suggestion_model),
+      )
+      current_values = getattr(obj, self.get_field_name().name).all()
+      suggestions = self.get_unused_related_objects(model=suggestion_model, exclude_queryset=current_values, extra_filters=None)
+      q = self.get_value_from_request('q', False)
+      if q:
+        suggestions = self.limit_to_candidates(suggestions, candidates, q)
+      suggestions = self.order_suggestions(suggestions)
+      items = await self.aget_items(suggestions)
+      return await self.arender_response(items, format='json', context=self.get_suggestion_context())
+    except PermissionDenied as e:
+        return JsonResponse({"[PermissionDenied error]": str(e)}, status=403)
+    except ValueError as e:
+      # Handle specific errors and return as JSON
+      return JsonResponse({"[ValueError": str(e)}, status=400)
+    except Exception as e:
+      response = {"error": _("an unexpected error occurred: {}").format(str(e))}
+      if settings.DEBUG and self.request.user.is_staff:
+        response['traceback'] = traceback.format_exc()
+      return JsonResponse(response, status=500)
+
+  async def aget_suggestion_candidates(self, model):
+    ''' Primary keys of the objects matching q from the suggestion cache, or None '''
+    q = self.get_value_from_request('q', False)
+    if not q:
+      return None
+    suggestion_cache = self.get_suggestion_cache(model)
+    candidates = await suggestion_cache.aget(q)
+    if candidates is None:
+      candidates = await suggestion_cache.afetch(self.get_candidates_queryset(model, q), q)
+    return candidates
@@ -0,0 +1,150 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.core.exceptions import PermissionDenied
+from django.utils.translation import gettext_lazy as _
+import traceback
+from django.conf import settings
+from django.db import models
+from django.utils.text import slugify
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+
+from cmnsdjango.views.async_json_utils import AsyncJsonUtils
+from cmnsdjango import events
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncJsonSetAttribute(AsyncJsonUtils):
+  """ Async version of JsonSetAttribute, for projects served under ASGI """
+  action = 'set'
+  read_only = False
+  rate_limit_action = 'set'
+
+  async def get(self, request, *args, **kwargs):
+    return await self.set_attribute(request, *args, **kwargs)
+
+  async def post(self, request, *args, **kwargs):
+    return await self.set_attribute(request, *args, **kwargs)
+
+  async def set_attribute(self, request, *args, **kwargs):
+    try:
+      await self.setup_async_request()
+      # Check CSRF token
+      self.check_csrf_token()
+      new_value = self.get_new_value()
+      await self.aget_model(action='set')
+      obj = await self.aget_object()
+      field = self.get_field_name().name
+      # Changes are published by record_change(), not by the model signals
+      with events.suppress_signals():
+        if field:
+          field_type = self.get_field_name().__class__.__name__
+          ''' Based on Field Type, toggle the value '''
+          if field_type == 'BooleanField':
+            await self.__toggle_boolean_field(obj, field)
+          elif field_type == 'ForeignKey':
+            await self.__toggle_foreign_key_field(obj, field)
+          elif field_type == 'ManyToManyField':
+            await self.__toggle_many_to_many_field(obj, field)
+          elif field_type == 'TextField':
+            await self.__update_text_field(obj, field, new_value)
+          else:
+            raise ValueError(_('field type "{}" not supported').format(field_type).capitalize())
+      return self.mark_recent_write(await sync_to_async(self.return_response)())
+    except models.ObjectDoesNotExist as e:
+      return JsonResponse({"error": _('object not found: {}').format(str(e)).capitalize()}, status=404)
+    except PermissionDenied as e:
+      return JsonResponse({"error": _('permission to object is denied: {}').format(str(e)).capitalize()}, status=403)
+    except ValueError as e:
+      # Handle specific errors and return as JSON
+      return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+      response = {"error": _("an unexpected error occurred: {}").format(str(e))}
+      if settings.DEBUG and self.request.user.is_staff:
+        response['traceback'] = traceback.format_exc()
+      return JsonResponse(response, status=500)
+
+  async def __update_text_field(self, obj, field, new_value):
+    try:
+      value = new_value['value']
+      if not self.get_field_name().editable:
+        raise ValueError(f"Field '{field}' is not editable.")
+      old_value = getattr(obj, field)
+      setattr(obj, field, value)
+      await obj.asave(update_fields=self.get_update_fields(obj.__class__, field))
+      self.record_change(obj, field, 'update', old_value, value)
+      self.messages.add(_('updated field "{}" on "{}"').format(field, obj), 'success')
+      return True
+    except Exception as e:
+      self.messages.add(_('error when setting {} {} to {}: {}').format(obj, field, new_value.get('value'), e).capitalize(), 'error')
+      return False
+
+  async def __toggle_boolean_field(self, obj, field):
+    try:
+      setattr(obj, field, not getattr(obj, field))
+      await obj.asave(update_fields=self.get_update_fields(obj.__class__, field))
+      self.record_change(obj, field, 'toggle', not getattr(obj, field), getattr(obj, field))
+      self.messages.add(f"{ _('toggled {} on {} to {}').format(field, obj, getattr(obj, field)).capitalize() }", 'success',)
+      return True
+    except Exception as e:
+      raise ValueError(_("Error when toggling {} of {}: {}").format(field, obj, e).capitalize())
+
+  async def __toggle_many_to_many_field(self, obj, field):
+    related_obj = await self.__get_related_object()
+    manager = getattr(obj, field)
+    if await manager.filter(pk=related_obj.pk).aexists():
+      # Object is already in the ManyToManyField: Remove it
+      await manager.aremove(related_obj)
+      self.messages.add(f"{ _('removed "{}" from {} {}').format(related_obj, field, obj).capitalize() }", 'success')
+      change = ('remove', related_obj.pk, None)
+    else:
+      # Object should be added
+      await manager.aadd(related_obj)
+      self.messages.add(f"{ _('added "{}" to {} {}').format(related_obj, field, obj).capitalize() }", 'success')
+      change = ('add', None, related_obj.pk)
+    await obj.asave(update_fields=self.get_update_fields(obj.__class__))
+    self.record_change(obj, field, *change)
+
+  async def __toggle_foreign_key_field(self, obj, field):
+    related_obj = await self.__get_related_object()
+    # Compare the key, the related object can not be loaded lazily
+    old_value = getattr(obj, self.get_field_name().attname)
+    if old_value == related_obj.pk:
+      # Value is already set: Remove it
+      setattr(obj, field, None)
+      self.messages.add(f"{ _('removed {} from {}').format(related_obj, field).capitalize() }", 'success')
+    else:
+      # Value should be set
+      setattr(obj, field, related_obj)
+      self.messages.add(f"{ _('set {} to {}').format(field, related_obj).capitalize() }", 'success')
+    await obj.asave(update_fields=self.get_update_fields(obj.__class__, field))
+    self.record_change(obj, field, 'set', old_value, getattr(obj, self.get_field_name().attname))
+
+  async def __get_related_object(self):
+    search_model = self.get_field_name().related_model
+    new_value = self.get_new_value()
+    # If key or slug is mentioned in new_value.keys(), assume it is safe
+    # to search the object by key or slug
+    if new_value['key'] in ['id', 'slug']:
+      try:
+        return await search_model.objects.aget(**{new_value['key']: new_value['value']})
+      except search_model.DoesNotExist:
+        raise ValueError(_("related {} object not found with {}: {}").format(search_model.__name__, new_value['key'], new_value['value']).capitalize())
+    elif new_value['key'] in ['value', 'name', 'title']:
+      # Find the field to search for
+      field_names = [field.name for field in search_model._meta.get_fields()]
+      target_field = next((field for field in ['name', 'title'] if field in field_names), None)
+      if not target_field:
+        raise ValueError(_("No valid field found to search for related object").capitalize())
+      try:
+        defaults = self.get_defaults(search_model, {
+          'slug': slugify(new_value['value']),
+          target_field: new_value['value']
+          })
+        related_obj = await self.aget_or_create_case_insensitive(search_model, target_field, new_value['value'], defaults)
+        if related_obj[1]:
+          self.messages.add(_("Created new {} with {}").format(search_model, related_obj[0]), 'success')
+        return related_obj[0]
+      except Exception as e:
+        raise ValueError(_("Error when creating object: {}").format(e))
+    else:
+      raise ValueError(_("No valid identifier found in new value ").capitalize())
@@ -0,0 +1,85 @@
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.exceptions import PermissionDenied, FieldDoesNotExist
+from django.utils.translation import gettext_lazy as _
+import json
+import time
+from django.conf import settings
+
+from cmnsdjango import events
+from cmnsdjango.views.json_utils import JsonUtils
+
+class JsonEvents(JsonUtils):
+  """
+  Streams the change events of attributes with Server-Sent Events.
+  Subscribe with one or more subscribe=<model>:<pk>:<field> parameters.
+  Every stream occupies a worker thread, so the stream is closed after
+  JSON_EVENTS_MAX_DURATION seconds, after which the browser reconnects.
+  Use AsyncJsonEvents under ASGI.
+  """
+  keepalive = 15  # Seconds between keepalive comments
+
+  def get(self, request, *args, **kwargs):
+    try:
+      channels = self.get_channels()
+    except PermissionDenied as e:
+      return JsonResponse({"error": str(e)}, status=403)
+    except ValueError as e:
+      return JsonResponse({"error": str(e)}, status=400)
+    return self.get_stream_response(self.stream(channels))
+
+  def get_subscriptions(self):
+    ''' The subscribed (model, pk, field) tuples, after checking read access '''
+    if not getattr(settings, 'JSON_EVENTS', False):
+      raise PermissionDenied(_('change events are not enabled').capitalize())
+    values = self.request.GET.getlist('subscribe')
+    if not values:
+      raise ValueError(_('the subscribe parameter is required but was not provided.').capitalize())
+    if len(values) > getattr(settings, 'JSON_EVENTS_MAX_SUBSCRIPTIONS', 50):
+      raise ValueError(_('too many subscriptions').capitalize())
+    subscriptions = []
+    for value in values:
+      try:
+        model_name, pk, field = value.split(':')
+        model = self.resolve_model(model_name)
+        model._meta.get_field(field)
+      except (ValueError, FieldDoesNotExist):
+        raise ValueError(_("invalid subscription '{}', use model:pk:field").format(value).capitalize())
+      obj = self.filter_queryset(model.objects.filter(pk=pk)).first()
+      if obj is None:
+        raise ValueError(_("object '{}' not found").format(value).capitalize())
+      self.check_model_access(model, 'read', obj)
+      subscriptions.append((model, obj.pk, field))
+    return subscriptions
+
+  def get_channels(self):
+    channels = set()
+    for model, pk, field in self.get_subscriptions():
+      channels.add(events.get_object_channel(model, pk))
+      channels.add(events.get_field_channel(model, pk, field))
+    return list(channels)
+
+  def get_stream_response(self, stream):
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Do not buffer the stream in nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+  def get_deadline(self):
+    return time.monotonic() + getattr(settings, 'JSON_EVENTS_MAX_DURATION', 300)
+
+  def format_event(self, event):
+    if event is None:
+      return ': keepalive\n\n'
+    return f'event: change\ndata: { json.dumps(event) }\n\n'
+
+  def stream(self, channels):
+    subscription = events.get_broker().subscribe(channels)
+    try:
+      # Milliseconds before the browser reconnects
+      yield 'retry: 1000\n\n'
+      deadline = self.get_deadline()
+      while time.monotonic() < deadline:
+        yield self.format_event(subscription.get(timeout=self.keepalive))
+    finally:
+      subscription.close()
@@ -3,13 +3,15 @@ from django.core.exceptions import PermissionDenied
 from django.utils.translation import gettext_lazy as _
 import traceback
 from django.conf import settings
-from markdown import markdown
 from django.db.models import TextField
 
 from cmnsdjango.views.json_utils import JsonUtils
 
 class JsonGetAttributes(JsonUtils):
   def get(self, request, *args, **kwargs):
+    return self.run_single_flight(self.get_attributes)
+
+  def get_attributes(self):
     try:
       # Check CSRF token
       self.check_csrf_token()
@@ -3,11 +3,17 @@ from django.core.exceptions import PermissionDenied
 from django.utils.translation import gettext_lazy as _
 import traceback
 from django.conf import settings
-from django.template.loader import render_to_string
 
 from cmnsdjango.views.json_utils import JsonUtils
+from cmnsdjango.views.suggestion_cache import SuggestionCache
+from cmnsdjango.views.overlay_cache import OverlayCache, get_overlay_template
+from cmnsdjango.counters import get_count_column
+from cmnsdjango.highlight import get_highlighter
 
 class JsonGetSuggestions(JsonUtils):
+  action = 'suggest'
+  rate_limit_action = 'suggest'
+
   def get(self, request, *args, **kwargs):
     try:
       # Check CSRF token
@@ -15,14 +21,16 @@ class JsonGetSuggestions(JsonUtils):
       # Get Field to fetch suggestions for
       current_values = self.get_field_value()
       # Get Model of Field to query for all objects
-      model = self.get_model('suggest')
+      model = self.get_model(action='suggest')
       suggestion_model = self.get_field_model()
       suggestions = self.get_unused_related_objects(model=suggestion_model, exclude_queryset=self.get_field_value(), extra_filters=None)
       # Process search query
-      suggestions = self.search_queryset(suggestions)
+      suggestions = self.search_suggestions(suggestions)
+      # Order by popularity if the relation is counted
+      suggestions = self.order_suggestions(suggestions)
       # Add the suggestions to the payload
       for suggestion in suggestions:
-        self.payload.append(self.render_attribute(suggestion, format='json', context={'query': self.get_value_from_request('q')}))
+        self.payload.append(self.render_attribute(suggestion, format='json', context=self.get_suggestion_context()))
       return self.return_response()
     except PermissionDenied as e:
         return JsonResponse({"[PermissionDenied error]": str(e)}, status=403)
@@ -35,37 +43,83 @@ class JsonGetSuggestions(JsonUtils):
         response['traceback'] = traceback.format_exc()
       return JsonResponse(response, status=500)
 
-from archive.models import Tag
+  def get_suggestion_context(self):
+    ''' The query and its highlighter, compiled once for all suggestions '''
+    q = self.get_value_from_request('q')
+    return {'query': q, 'highlighter': get_highlighter(q) if q else None}
+
+  def render_attribute(self, attribute, format='html', context={}):
+    ''' Suggestions get their name with the query highlighted as highlighted '''
+    if context.get('highlighter'):
+      context = context | {'highlighted': context['highlighter'].highlight(str(attribute))}
+    return super().render_attribute(attribute, format, context)
+
+  def search_suggestions(self, suggestions):
+    """
+    Search the suggestions for the q parameter.
+
+    The candidates matching q are taken from the suggestion cache when q or
+    a prefix of q was searched before, so typing a longer query does not run
+    the full text search again. The candidates are then limited to the
+    suggestions that are not used by the object yet.
+    """
+    q = self.get_value_from_request('q', False)
+    if not q:
+      return suggestions
+    suggestion_cache = self.get_suggestion_cache(suggestions.model)
+    candidates = suggestion_cache.get(q)
+    if candidates is None:
+      candidates = suggestion_cache.fetch(self.get_candidates_queryset(suggestions.model, q), q)
+    return self.limit_to_candidates(suggestions, candidates, q)
+
+  def get_suggestion_cache(self, model):
+    return SuggestionCache(model, self.get_searchable_fields(model), self.get_visibility_class())
+
+  def get_candidates_queryset(self, model, q):
+    ''' All visible objects of the model matching q, regardless of the object '''
+    return self.search_queryset(self.filter_queryset(self.using_read_database(model.objects.all())), q)
+
+  def limit_to_candidates(self, suggestions, candidates, q):
+    if candidates is None:
+      # Not cacheable, search the suggestions directly
+      return self.search_queryset(suggestions, q)
+    return suggestions.filter(pk__in=candidates)
+
+  def order_suggestions(self, suggestions):
+    ''' Order suggestions by popularity if the relation is counted '''
+    count_column = get_count_column(self.get_model(), self.get_field_name().name)
+    if count_column:
+      suggestions = suggestions.order_by(f'-{ count_column }', 'pk')
+    return suggestions
 
 class GetJsonAddObjectForm(JsonUtils):
+  rate_limit_action = 'suggest'
+
   def get(self, request, *args, **kwargs):
-    try:
-      field = self.get_field_model().__name__.lower()
-    except AttributeError:
-      #field = self.get_model()._meta.get_field(self.get_field_name().name)
-      #Image._meta.get_field('description')
-      field_name = self.get_field_name().name
-      field = self.get_model()._meta.get_field(field_name).__class__.__name__.lower()
-      
+    field_name = self.get_field_name().name
+    # The related model, or the field itself for other fields
+    field_model = self.get_field_model()
+    field = (field_model if isinstance(field_model, type) else field_model.__class__).__name__.lower()
+
     # Fetch specific model configuration
-    allow_create_attribute = getattr(self.get_field_model(field), 'allow_create_attribute', True)
+    allow_create_attribute = getattr(field_model, 'allow_create_attribute', True)
 
     # Set context for AddObjectForm
     template_context = {
       'model': self.kwargs['model'], # Model name, required for URL building
-      'field': type(field), # Field name, required for URL building
-      'related_field': self.get_field_name().name, # Related field name, required for URL building
+      'field': field, # Field name, required for URL building
+      'related_field': field_name, # Related field name, required for URL building
       'object': self.get_object(), # Object to add a new related object to
       'title': _('add new {}').format(field).capitalize(), # Title of the overlay
-      'attribute': self.get_field_name().verbose_name, 
+      'attribute': self.get_field_name().verbose_name,
       'allow_create_attribute': allow_create_attribute,
     }
-    ''' Try to render the specific form for the field, if that fails, render the generic form '''
     try:
-      self.payload.append(render_to_string(f'sections/add_{ field}_overlay.html', template_context))
-    except:
-      try:
-        self.payload.append(render_to_string('sections/add_object_overlay.html', template_context))
-      except Exception as e:
-        raise ValueError(_('could not render form: {}').format(str(e)).capitalize())
-    return self.return_response()
\ No newline at end of file
+      self.payload.append(self.render_overlay(field, template_context))
+    except Exception as e:
+      raise ValueError(_('could not render form: {}').format(str(e)).capitalize())
+    return self.return_response()
+
+  def render_overlay(self, field, context):
+    ''' Render the specific form for the field if it exists, otherwise the generic form '''
+    return OverlayCache(get_overlay_template(field)).render(context)
@@ -3,7 +3,6 @@ from django.core.exceptions import PermissionDenied
 from django.utils.translation import gettext_lazy as _
 import traceback
 from django.conf import settings
-from markdown import markdown
 from django.db import models
 from django.utils.text import slugify
 from django.utils.html import escape
@@ -11,9 +10,14 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 
 from cmnsdjango.views.json_utils import JsonUtils
+from cmnsdjango import events
 
 @method_decorator(csrf_exempt, name='dispatch')
 class JsonSetAttribute(JsonUtils):
+  action = 'set'
+  read_only = False
+  rate_limit_action = 'set'
+
   def get(self, request, *args, **kwargs):
     return self.set_attribute(request, *args, **kwargs)
   
@@ -31,20 +35,22 @@ class JsonSetAttribute(JsonUtils):
       # Should new value be set to field, or should an object be toggled?
       obj = self.get_object()
       field = self.get_field_name().name
-      if field: 
-        field_type = self.get_model('set')._meta.get_field(self.get_field_name().name).__class__.__name__
-        ''' Based on Field Type, toggle the value '''
-        if field_type == 'BooleanField':
-          self.__toggle_boolean_field(obj, field)
-        elif field_type == 'ForeignKey':
-          self.__toggle_foreign_key_field(onj, field)
-        elif field_type == 'ManyToManyField':
-          self.__toggle_many_to_many_field(obj, field)
-        elif field_type == 'TextField':
-          self.__update_text_field(obj, field, new_value)
-        else:
-          raise ValueError(_('field type "{}" not supported').format(field_type).capitalize())
-      return self.return_response()
+      # Changes are published by record_change(), not by the model signals
+      with events.suppress_signals():
+        if field: 
+          field_type = self.get_model(action='set')._meta.get_field(self.get_field_name().name).__class__.__name__
+          ''' Based on Field Type, toggle the value '''
+          if field_type == 'BooleanField':
+            self.__toggle_boolean_field(obj, field)
+          elif field_type == 'ForeignKey':
+            self.__toggle_foreign_key_field(obj, field)
+          elif field_type == 'ManyToManyField':
+            self.__toggle_many_to_many_field(obj, field)
+          elif field_type == 'TextField':
+            self.__update_text_field(obj, field, new_value)
+          else:
+            raise ValueError(_('field type "{}" not supported').format(field_type).capitalize())
+      return self.mark_recent_write(self.return_response())
     except models.ObjectDoesNotExist as e:
       return self.return_response({'message': _('object not found: {}').format(str(e)).capitalize(), 'status': 404})
     except PermissionDenied as e:
@@ -63,8 +69,10 @@ class JsonSetAttribute(JsonUtils):
       value = new_value['value']
       if not self.get_field_name().editable:
         raise ValueError(f"Field '{field}' is not editable.")
+      old_value = getattr(obj, field)
       setattr(obj, field, value)
-      obj.save()
+      obj.save(update_fields=self.get_update_fields(obj.__class__, field))
+      self.record_change(obj, field, 'update', old_value, value)
       self.messages.add(_('updated field "{}" on "{}"').format(self.get_field_name().name, self.get_object()), 'success')
       return True
     except Exception as e:
@@ -74,7 +82,8 @@ class JsonSetAttribute(JsonUtils):
   def __toggle_boolean_field(self, obj, field):
     try:
       setattr(obj, field, not getattr(obj, field))
-      obj.save()
+      obj.save(update_fields=self.get_update_fields(obj.__class__, field))
+      self.record_change(obj, field, 'toggle', not getattr(obj, field), getattr(obj, field))
       self.messages.add(f"{ _('toggled {} on {} to {}').format(field, obj, getattr(obj, field)).capitalize() }", 'success',)
       return True
     except Exception as e:
@@ -86,14 +95,18 @@ class JsonSetAttribute(JsonUtils):
       # Object is already in the ManyToManyField: Remove it
       getattr(self.get_object(), field).remove(related_obj)
       self.messages.add(f"{ _('removed "{}" from {} {}').format(related_obj, field, self.get_object()).capitalize() }", 'success')
+      change = ('remove', related_obj.pk, None)
     else:
       # Object should be added
       getattr(self.get_object(), field).add(related_obj)
       self.messages.add(f"{ _('added "{}" to {} {}').format(related_obj, field, self.get_object()).capitalize() }", 'success')
-    obj.save()
+      change = ('add', None, related_obj.pk)
+    obj.save(update_fields=self.get_update_fields(obj.__class__))
+    self.record_change(obj, field, *change)
 
   def __toggle_foreign_key_field(self, obj, field):
     related_obj = self.__get_related_object()
+    old_value = getattr(obj, self.get_field_name().attname)
     if getattr(self.get_object(), field) == related_obj:
       # Value is already set: Remove it
       setattr(self.get_object(), field, None)
@@ -102,7 +115,8 @@ class JsonSetAttribute(JsonUtils):
       # Value should be set
       setattr(self.get_object(), field, related_obj)
       self.messages.add(f"{ _('set {} to {}').format(field, related_obj).capitalize() }", 'success')
-    obj.save()
+    obj.save(update_fields=self.get_update_fields(obj.__class__, field))
+    self.record_change(obj, field, 'set', old_value, getattr(obj, self.get_field_name().attname))
 
 
   def __get_related_object(self):
@@ -118,7 +132,7 @@ class JsonSetAttribute(JsonUtils):
         return search_model.objects.get(**{new_value['key']: new_value['value']})
       except search_model.DoesNotExist:
         raise ValueError(_("related {} object not found with {}: {}").format(search_model.__name__, new_value['key'], new_value['value']).capitalize())
-    elif new_value['key'] in ['value', 'name' 'title']:
+    elif new_value['key'] in ['value', 'name', 'title']:
       # Find the field to search for
       target_field = None
       target_fields = ['name', 'title']
@@ -129,16 +143,11 @@ class JsonSetAttribute(JsonUtils):
       if not target_field:
         raise ValueError(_("No valid field found to search for related object").capitalize())
       try:
-        print(target_field + '__iexact' + ' = ' + new_value['value'])
-        print(new_value['value'])
         defaults = self.get_defaults(search_model, {
           'slug': slugify(new_value['value']),
           target_field: new_value['value']  
           })
-        related_obj = search_model.objects.get_or_create(
-          **{target_field + '__iexact': new_value['value']},
-          defaults=defaults)
-        print(str(related_obj))
+        related_obj = self.get_or_create_case_insensitive(search_model, target_field, new_value['value'], defaults)
         if related_obj[1]:
           self.messages.add(_("Created new {} with {}").format(search_model, related_obj[0]), 'success')
         return related_obj[0]
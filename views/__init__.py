@@ -1,4 +1,9 @@
 from .JsonGetAttributes import JsonGetAttributes
 from .JsonGetSuggestions import JsonGetSuggestions, GetJsonAddObjectForm
 from .JsonSetAttribute import JsonSetAttribute
-from .json_utils import DebugView
\ No newline at end of file
+from .AsyncJsonGetAttributes import AsyncJsonGetAttributes
+from .AsyncJsonGetSuggestions import AsyncJsonGetSuggestions
+from .AsyncJsonSetAttribute import AsyncJsonSetAttribute
+from .JsonEvents import JsonEvents
+from .AsyncJsonEvents import AsyncJsonEvents
+from .json_utils import DebugView, MetricsView
@@ -0,0 +1,121 @@
+from asgiref.sync import sync_to_async
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import ForeignKey, OneToOneField, QuerySet
+from django.utils.translation import gettext_lazy as _
+
+from cmnsdjango.instrumentation import timed
+from cmnsdjango.views.json_utils import JsonUtils
+
+class AsyncJsonUtils(JsonUtils):
+  """
+  Async Json Utility Class
+  Extends JsonUtils with coroutines that use the async ORM API, for views
+  that are served under ASGI. Model resolution, access checks and queryset
+  building are shared with JsonUtils, as they do not query the database.
+  Rendering templates and building the response run in a single
+  sync_to_async call per request.
+  """
+
+  async def setup_async_request(self):
+    ''' Resolve the user before synchronous code accesses request.user '''
+    self.request.user = await self.request.auser()
+
+  @timed('get_model')
+  async def aget_model(self, model_name=None, action=None):
+    """
+    Async version of get_model(). Fetches the object first when the access
+    policy of the model depends on the object user.
+    """
+    action = action or self.action
+    if not self.model:
+      try:
+        self.model = self.resolve_model(model_name)
+      except ValueError as e:
+        raise ValueError(_('error when accessing model: {}.').format(e).capitalize())
+    model = self.model
+    obj = None
+    key = self.get_access_key(model, action)
+    if key not in self.access_checks and self.get_access_policy(model, action) == 'self':
+      # aget_object() gets the model again, allow it while fetching the object
+      self.access_checks[key] = None
+      try:
+        obj = await self.aget_object()
+      finally:
+        del self.access_checks[key]
+    self.check_access(action, obj)
+    return model
+
+  @timed('get_object')
+  async def aget_object(self):
+    """
+    Async version of get_object(). A requested forward relation is selected
+    with the object, as it can not be loaded lazily in async code.
+    """
+    if self.object:
+      return self.object
+    model = await self.aget_model()
+    queryset = self.get_object_queryset()
+    try:
+      field = self.get_value_from_request('field')
+      if field and isinstance(model._meta.get_field(field), (ForeignKey, OneToOneField)):
+        queryset = queryset.select_related(field)
+    except FieldDoesNotExist:
+      pass
+    try:
+      self.object = self.select_object([obj async for obj in queryset[:2]])
+      return self.object
+    except Exception as e:
+      raise ValueError(_("an error occurred while retrieving the object: {}".format({str(e)})).capitalize())
+
+  @timed('get_field_value')
+  async def aget_field_value(self, field=None):
+    """
+    Async version of get_field_value(). Callable attributes may query the
+    database and are called with sync_to_async.
+    """
+    if self.field_value != None:
+      return self.field_value
+    if not field:
+      field = self.get_value_from_request('field')
+    if not field:
+      raise ValueError(_('the field parameter is required but was not provided.').capitalize())
+    obj = await self.aget_object()
+    if not hasattr(obj, field):
+      raise ValueError(_("the attribute {} does not exist on the object.".format({field})).capitalize())
+    value = getattr(obj, field)
+    if callable(value) and not hasattr(value, 'all'):
+      try:
+        self.field_value = await sync_to_async(value)()
+      except Exception as e:
+        raise ValueError(_('error when fetching field: {}').format(str(e)).capitalize())
+    else:
+      self.field_value = self.convert_field_value(value)
+    return self.field_value
+
+  async def aget_items(self, values):
+    ''' Evaluate a field value to the list of items to render '''
+    if isinstance(values, QuerySet):
+      return [value async for value in values]
+    elif isinstance(values, (list, tuple)):
+      return list(values)
+    return [values]
+
+  async def aget_or_create_case_insensitive(self, model, field, value, defaults={}):
+    """
+    Async version of get_or_create_case_insensitive(). Creating the object
+    needs a transaction, which is not supported in async code, so it is
+    done with sync_to_async.
+    """
+    obj = await self.get_case_insensitive_queryset(model, field, value).afirst()
+    if obj:
+      return obj, False
+    return await sync_to_async(self.get_or_create_case_insensitive)(model, field, value, defaults)
+
+  def render_response(self, items=[], format='html', context={}):
+    ''' Render the items to the payload and return the response '''
+    for item in items:
+      self.payload.append(self.render_attribute(item, format=format, context=context))
+    return self.return_response()
+
+  async def arender_response(self, items=[], format='html', context={}):
+    return await sync_to_async(self.render_response)(items, format, context)
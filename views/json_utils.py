@@ -1,14 +1,15 @@
 from django.views import View
 from django.conf import settings
 from django.middleware.csrf import get_token
-from django.core.exceptions import PermissionDenied
-from django.http import JsonResponse
+from django.core.exceptions import PermissionDenied, FieldDoesNotExist
+from django.http import JsonResponse, HttpResponse
 from django.apps import apps
-from django.template.loader import render_to_string
+from django.template.loader import select_template
 from django.template.exceptions import TemplateDoesNotExist
 from django.utils.translation import gettext_lazy as _
-from django.db.models import Q
-from django.db import models
+from django.db.models import Q, Value
+from django.db.models.functions import Lower
+from django.db import models, IntegrityError, router, transaction
 from django.contrib.auth.context_processors import PermWrapper
 
 
@@ -25,17 +26,53 @@ from django.db.models import (
     DateTimeField,
     FloatField,
 )
-from markdown import markdown
 import json
+import time
+import warnings
 from django.db.models import TextField
 
+from cmnsdjango import audit, events
+from cmnsdjango.models import BaseModelManager, BaseModelQuerySet
+from cmnsdjango.instrumentation import RequestTimer, count_render, metrics, timed
 from .messages import Messages
+from .rate_limit import RateLimit, get_client_ip, get_rate
+from .single_flight import SingleFlight
+# Cookie with the time of the last change by the client, see mark_recent_write()
+WRITE_COOKIE = 'cmnsdjango_write'
+
+def get_defaults(model, fields={}, user=None):
+  """
+  Get default values for creating an object of model.
+
+  Args:
+      model (models.Model): The model to create an object of.
+      fields (dict, optional): Field values that override the defaults.
+      user (User, optional): Set as the user of the object, if the model has a user field.
+
+  Returns:
+      dict: The field values for the new object.
+  """
+  defaults = {}
+  for field in model._meta.get_fields():
+    if field.is_relation:
+      continue
+    if hasattr(field, 'default') and field.has_default():
+      defaults[field.name] = field.get_default()
+  if user is not None and 'user' in [f.name for f in model._meta.get_fields()]:
+    defaults['user'] = user
+  for field in fields:
+    defaults[field] = fields[field]
+  return defaults
+
 class JsonUtils(View):
   """
   Json Utility Class
   Extend this class to include basic and reusable utilities for
   handling JSON responses in Django views.
   """
+  read_only = True    # Views that change objects read from the write database
+  action = 'read'     # Access policy checked by get_model(), see get_access_policy()
+  rate_limit_action = 'read'  # Budget of JSON_RATE_LIMITS the requests count against
 
   def __init__(self, *args, **kwargs):
     super().__init__(**kwargs)
@@ -51,8 +88,46 @@ class JsonUtils(View):
     self.csrf_token = None
     self.payload = []
     self.messages = Messages()
+    self.timer = None         # RequestTimer when JSON_INSTRUMENTATION is enabled
+    self.access_checks = {}   # Access decisions per (user, model, action)
+    self.render_context = None  # Context shared by all rendered attributes
+    self.templates = {}       # Attribute templates per (field name, format)
+
+  def dispatch(self, request, *args, **kwargs):
+    if self.view_is_async:
+      return self.adispatch(request, *args, **kwargs)
+    if not getattr(settings, 'JSON_INSTRUMENTATION', False):
+      return self.dispatch_within_rate_limit(request, *args, **kwargs)
+    self.timer = RequestTimer(self.__class__.__name__)
+    with self.timer.instrument():
+      response = self.dispatch_within_rate_limit(request, *args, **kwargs)
+    return self.timer.finish(request, response)
+
+  async def adispatch(self, request, *args, **kwargs):
+    if not getattr(settings, 'JSON_INSTRUMENTATION', False):
+      return await self.adispatch_within_rate_limit(request, *args, **kwargs)
+    self.timer = RequestTimer(self.__class__.__name__)
+    with self.timer.instrument():
+      response = await self.adispatch_within_rate_limit(request, *args, **kwargs)
+    return self.timer.finish(request, response)
+
+  def dispatch_within_rate_limit(self, request, *args, **kwargs):
+    ''' Shed requests over the rate limit before the view fetches anything '''
+    rate_limit = self.get_rate_limit(request.user)
+    retry_after = rate_limit.hit() if rate_limit else None
+    if retry_after:
+      return self.get_rate_limited_response(retry_after)
+    return super().dispatch(request, *args, **kwargs)
+
+  async def adispatch_within_rate_limit(self, request, *args, **kwargs):
+    rate_limit = self.get_rate_limit(await request.auser())
+    retry_after = await rate_limit.ahit() if rate_limit else None
+    if retry_after:
+      return self.get_rate_limited_response(retry_after)
+    return await super().dispatch(request, *args, **kwargs)
 
   ''' Value Retrieve Functions '''
+  @timed('params')
   def get_value_from_request(self, key, default=None):
     """
     Retrieve a value from the request in the following order of priority:
@@ -90,6 +165,7 @@ class JsonUtils(View):
       self.messages.add(_("error when fetching value: {}").format(str(e)).capitalize(), "debug")
     return value if value else default
 
+  @timed('params')
   def get_new_value(self, field=None):
     # Get the value for the request parameters. 
     # The value can be stored in get, post or
@@ -110,6 +186,124 @@ class JsonUtils(View):
         return self.get_new_value(field) # Recursively call the function to get the value if field is specified
     raise ValueError(_("no valid identifier found in new value").capitalize())
   
+  ''' Request Coalescing '''
+  def get_single_flight(self):
+    """
+    Return a SingleFlight to share the response with identical concurrent
+    requests, or None if the request should be handled by itself. Staff users
+    get debug information in the response and are never coalesced. Requests
+    failing the CSRF check are answered on their own with the error.
+    """
+    if not getattr(settings, 'JSON_SINGLE_FLIGHT', False) or self.request.method != 'GET' or self.request.user.is_staff:
+      return None
+    if self.has_recent_write():
+      # Reads from another database than the other requests
+      return None
+    try:
+      self.check_csrf_token()
+    except PermissionDenied:
+      return None
+    return SingleFlight(self.get_single_flight_key())
+
+  def get_single_flight_key(self):
+    ''' Requests with the same model, object, field, parameters and visibility class share a response '''
+    return ':'.join([
+      self.__class__.__name__,
+      *[f'{ key }={ value }' for key, value in sorted(self.kwargs.items())],
+      self.request.GET.urlencode(),
+      self.get_visibility_class(),
+    ])
+
+  def run_single_flight(self, compute):
+    single_flight = self.get_single_flight()
+    if single_flight:
+      return single_flight.run(compute)
+    return compute()
+
+  async def arun_single_flight(self, compute):
+    single_flight = self.get_single_flight()
+    if single_flight:
+      return await single_flight.arun(compute)
+    return await compute()
+
+  ''' Rate Limiting '''
+  def get_rate_limit(self, user):
+    """
+    Return the RateLimit of the client for the action, model and field of
+    the request, or None if the action is not limited.
+    """
+    rate = get_rate(self.rate_limit_action)
+    if not rate:
+      return None
+    return RateLimit(':'.join([
+      self.get_rate_limit_client(user),
+      self.rate_limit_action,
+      str(self.kwargs.get('model', '')),
+      str(self.kwargs.get('field', '')),
+    ]), rate)
+
+  def get_rate_limit_client(self, user):
+    ''' The key of the client the requests are counted for: the user, or the IP address '''
+    if user.is_authenticated:
+      return f'user:{ user.pk }'
+    return f'ip:{ get_client_ip(self.request) }'
+
+  def get_rate_limited_response(self, retry_after):
+    response = JsonResponse({
+      'error': _('too many requests, try again in {} seconds').format(retry_after).capitalize(),
+    }, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+  ''' Database Routing '''
+  def get_read_database(self, model):
+    """
+    Return the database alias to read the model from, or None to let the
+    database router decide. Read-only views use JSON_READ_DATABASE, unless the
+    client changed something less than JSON_READ_YOUR_WRITES_WINDOW seconds
+    ago: then, like views that write, they read from the database the router
+    writes the model to, so the change is visible.
+    """
+    if not self.read_only or self.has_recent_write():
+      return router.db_for_write(model)
+    return getattr(settings, 'JSON_READ_DATABASE', None)
+
+  def using_read_database(self, queryset):
+    alias = self.get_read_database(queryset.model)
+    return queryset.using(alias) if alias else queryset
+
+  def has_recent_write(self):
+    try:
+      written = float(self.request.COOKIES.get(WRITE_COOKIE, 0))
+    except ValueError:
+      return False
+    return time.time() - written < getattr(settings, 'JSON_READ_YOUR_WRITES_WINDOW', 10)
+
+  def mark_recent_write(self, response):
+    ''' Set the write cookie when reads can be routed to another database than writes '''
+    if getattr(settings, 'JSON_READ_DATABASE', None) or settings.DATABASE_ROUTERS:
+      response.set_cookie(
+        WRITE_COOKIE,
+        str(time.time()),
+        max_age=getattr(settings, 'JSON_READ_YOUR_WRITES_WINDOW', 10),
+        httponly=True,
+        samesite='Lax',
+      )
+    return response
+
+  ''' Change Recording '''
+  def record_change(self, obj, field, action, old_value=None, new_value=None):
+    """
+    Called by JsonSetAttribute after every change of a field. Publishes a
+    change event if JSON_EVENTS is enabled and queues an audit event if
+    JSON_AUDIT is enabled. Related objects are passed by primary key.
+    Extend to record changes elsewhere.
+    """
+    if getattr(settings, 'JSON_EVENTS', False):
+      events.publish(obj.__class__, obj.pk, field, obj._state.db, action=action)
+    if getattr(settings, 'JSON_AUDIT', False):
+      audit.record(audit.ChangeEvent.from_change(obj, field, action, old_value, new_value, self.request.user), obj._state.db)
+
   ''' Security Functions ''' 
   def check_csrf_token(self):
     """
@@ -135,58 +329,124 @@ class JsonUtils(View):
     
 
   ''' Model Functions '''
-  def get_model(self, model_name=None, action='read'):
+  @timed('get_model')
+  def get_model(self, model_name=None, action=None):
+    """
+    Retrieve a model class based on the 'model' parameter from the request,
+    and check access for the action, by default the action of the view.
+    """
+    action = action or self.action
+    if not self.model:
+      try:
+        self.model = self.resolve_model(model_name)
+      except ValueError as e:
+        raise ValueError(_('error when accessing model: {}.').format(e).capitalize())
+    model = self.model
+    self.check_access(action)
+    """ Authentication check passed: return model """
+    return model
+
+  def resolve_model(self, model_name=None):
     """
-    Retrieve a model class based on the 'model' parameter from the request.
+    Find the model class by name in the installed apps, without checking access.
     """
-    if self.model:
-      return self.model
-    self.action = action
     # Get the model name from the request
     model_name = model_name if model_name else self.get_value_from_request('model')
     if not model_name:
       raise ValueError(_('the model parameter is required but was not provided.').capitalize())
     # Get the specific model supplied by the model name
-    try:
-      # Loop through all installed apps to find the first
-      # model with the specified name
-      matching_models = []
-      for app_config in apps.get_app_configs():
-        try:
-          model = app_config.get_model(str(model_name))
-          if model:
-            matching_models.append(model)
-        except LookupError:
-          continue
-      if len(matching_models) == 0:
-        raise ValueError(_("no model with the name '{}' could be found".format(model_name)).capitalize())
-      elif len(matching_models) > 1:
-        raise ValueError(_("multiple models with the name '{}' were found. specify 'app_label.modelname' instead.".format({model_name})).capitalize())
-      model = matching_models[0]
-      self.model = model
-      """ Authentication check
-          Raise ValueError if the model does not allow access via the 'allow_read_attribute' attribute """
-      if getattr(model, f'allow_{action}_attribute', getattr(settings, 'ALLOW{action.upper()}_attribute', False)) is False:
-        raise ValueError(_("{} access to the model '{}' is not allowed".format(action, model_name)).capitalize())
-      elif str(getattr(model, f'allow_{action}_attribute', getattr(settings, 'ALLOW_{action.upper()}_attribute', False))).lower()[:4] == 'auth' and not self.request.user.is_authenticated:
-        raise ValueError(_("{} access to the model '{}' is not allowed for unauthenticated users".format(action, model_name)).capitalize())
-      elif str(getattr(model, f'allow_{action}_attribute', getattr(settings, 'ALLOW_{action.upper()}_attribute', False))).lower() == 'staff' and not self.request.user.is_staff:
-        raise ValueError(_("{} access to the model '{}' is not allowed for non-staff users".format(action, model_name)).capitalize())
-      elif str(getattr(model, f'allow_{action}_attribute', getattr(settings, 'ALLOW_{action.upper()}_attribute', False))).lower() == 'self' and not self.get_object().user == self.request.user:
-        self.model = None
-        raise ValueError(_("{} access to the model '{}' is is only allowed for object user".format(action, model_name)).capitalize())
-      """ Authentication check passed: set model """
-      return model
-    except ValueError as e:
-      raise ValueError(_('error when accessing model: {}.').format(e).capitalize())
+    # Loop through all installed apps to find the first
+    # model with the specified name
+    matching_models = []
+    for app_config in apps.get_app_configs():
+      try:
+        model = app_config.get_model(str(model_name))
+        if model:
+          matching_models.append(model)
+      except LookupError:
+        continue
+    if len(matching_models) == 0:
+      raise ValueError(_("no model with the name '{}' could be found".format(model_name)).capitalize())
+    elif len(matching_models) > 1:
+      raise ValueError(_("multiple models with the name '{}' were found. specify 'app_label.modelname' instead.".format({model_name})).capitalize())
+    return matching_models[0]
+
+  def get_access_policy(self, model, action):
+    """
+    Return the access policy for an action on a model: False, True, 'auth',
+    'staff' or 'self'. The policy is set with the 'allow_{action}_attribute'
+    attribute of the model, with ALLOW_{ACTION}_ATTRIBUTE in settings as fallback.
+    """
+    policy = getattr(model, f'allow_{action}_attribute', getattr(settings, f'ALLOW_{action.upper()}_ATTRIBUTE', False))
+    if policy is False:
+      return False
+    policy = str(policy).lower()
+    if policy[:4] == 'auth':
+      return 'auth'
+    elif policy in ['staff', 'self']:
+      return policy
+    return True
+
+  def check_model_access(self, model, action, obj=None):
+    """
+    Raise ValueError if the access policy of the model does not allow the action
+    for the requesting user. The 'self' policy compares the user of the object,
+    which is fetched with get_object() unless obj is supplied.
+    """
+    policy = self.get_access_policy(model, action)
+    model_name = model.__name__.lower()
+    if policy is False:
+      raise ValueError(_("{} access to the model '{}' is not allowed".format(action, model_name)).capitalize())
+    elif policy == 'auth' and not self.request.user.is_authenticated:
+      raise ValueError(_("{} access to the model '{}' is not allowed for unauthenticated users".format(action, model_name)).capitalize())
+    elif policy == 'staff' and not self.request.user.is_staff:
+      raise ValueError(_("{} access to the model '{}' is not allowed for non-staff users".format(action, model_name)).capitalize())
+    elif policy == 'self' and not (obj if obj else self.get_object()).user == self.request.user:
+      self.model = None
+      raise ValueError(_("{} access to the model '{}' is is only allowed for object user".format(action, model_name)).capitalize())
+
+  def get_access_key(self, model, action):
+    return (self.request.user.pk, model._meta.label, action)
+
+  def check_access(self, action, obj=None):
+    """
+    Check access to the model for an action once per request. The decision is
+    stored before check_model_access() runs, as the 'self' policy fetches the
+    object, which gets the model again.
+    """
+    key = self.get_access_key(self.model, action)
+    if key not in self.access_checks:
+      self.access_checks[key] = None
+      try:
+        self.check_model_access(self.model, action, obj)
+      except ValueError as e:
+        self.access_checks[key] = e
+      except:
+        del self.access_checks[key]
+        raise
+    if self.access_checks[key]:
+      raise ValueError(_('error when accessing model: {}.').format(self.access_checks[key]).capitalize())
 
   ''' Object functions '''
+  @timed('get_object')
   def get_object(self):
     """
     Retrieve an object instance based on the model and identifiers (pk, slug) from the request.
     """
     if self.object:
       return self.object
+    queryset = self.get_object_queryset()
+    try:
+      self.object = self.select_object(list(queryset[:2]))
+      return self.object
+    except Exception as e:
+      raise ValueError(_("an error occurred while retrieving the object: {}".format({str(e)})).capitalize())
+
+  def get_object_queryset(self):
+    """
+    Build the queryset that selects the requested object, filtered by
+    filter_queryset(). Does not query the database.
+    """
     model = self.get_model()
     pk = self.get_value_from_request('pk')
     slug = self.get_value_from_request('slug')
@@ -206,29 +466,62 @@ class JsonUtils(View):
       elif 'for-self' in self.request.resolver_match.url_name:
         if not user.is_authenticated:
           raise ValueError(_('unauthenticated users are not allowed to access this object.').capitalize())
-        elif str(getattr(model, f'allow_{self.action}_attribute', getattr(settings, 'ALLOW_{action.upper()}_attribute', False))).lower() == 'self':
+        elif self.get_access_policy(model, self.action) == 'self':
           obj = model.objects.filter(user=user)
         else:
           raise ValueError(_('unable to retrieve object without key or slug.').capitalize())
       else:
         raise ValueError(_('unable to determine the object retrieval criteria.').capitalize())
-      if hasattr(self, 'filter_status'):
-        obj = self.filter_status(obj)
-      if hasattr(self, 'filter_visibility'):
-        obj = self.filter_visibility(obj)
-      if obj.count() == 0:
-        raise ValueError(_('the requested object does no longer exist.').capitalize())
-      elif obj.count() > 1:
-        raise ValueError(_('multiple objects were found.').capitalize())
-      else:
-        obj = obj.first()
-      self.object = obj
-      return obj
-    except model.DoesNotExist:
-      raise ValueError(_('the requested object does not exist.').capitalize())
+      queryset = self.filter_queryset(obj)
+      fields = self.get_object_fields(model)
+      if fields:
+        queryset = queryset.only(*fields)
+      return self.using_read_database(queryset)
     except Exception as e:
       raise ValueError(_("an error occurred while retrieving the object: {}".format({str(e)})).capitalize())
 
+  def get_object_fields(self, model):
+    """
+    Return the columns to load for the object, or None to load the full row.
+    Loads the primary key, the identifying and access fields and the requested
+    field, so wide columns such as long descriptions are only loaded when they
+    are requested. The object_fields attribute of the model adds fields that
+    are used elsewhere, for example in templates; set it to '__all__' or set
+    JSON_PRUNE_OBJECT_FIELDS to False to load the full row.
+    """
+    extra_fields = getattr(model, 'object_fields', [])
+    if extra_fields == '__all__' or not getattr(settings, 'JSON_PRUNE_OBJECT_FIELDS', True):
+      return None
+    field_name = self.get_value_from_request('field')
+    columns = {field.name for field in model._meta.concrete_fields}
+    if field_name and field_name not in columns:
+      try:
+        field = model._meta.get_field(field_name)
+      except FieldDoesNotExist:
+        # Methods and properties may use any field
+        return None
+      if not (field.many_to_many or field.one_to_many or field.one_to_one):
+        return None
+    fields = {model._meta.pk.name, field_name, *extra_fields}
+    fields |= {'slug', 'status', 'user', 'visibility', 'name', 'title'} & columns
+    return sorted(fields & columns)
+
+  def get_update_fields(self, model, field=None):
+    ''' The fields to save after changing a field: the field itself and the auto_now fields '''
+    columns = model._meta.concrete_fields
+    fields = [field] if field in [column.name for column in columns] else []
+    return fields + [column.name for column in columns if getattr(column, 'auto_now', False)]
+
+  def select_object(self, objects):
+    """
+    Return the single object of a list of at most two fetched objects.
+    """
+    if len(objects) == 0:
+      raise ValueError(_('the requested object does no longer exist.').capitalize())
+    elif len(objects) > 1:
+      raise ValueError(_('multiple objects were found.').capitalize())
+    return objects[0]
+
   ''' Field Functions '''
   def get_field(self, field_name=None):
     """
@@ -260,41 +553,54 @@ class JsonUtils(View):
     if not field:
       field = self.get_value_from_request('field')
     if self.is_related_field(field):
-      self.field_model = self.get_object()._meta.get_field(field).related_model
+      self.field_model = self.get_model()._meta.get_field(field).related_model
     else:
-      self.field_model = self.get_object()._meta.get_field(field)
+      self.field_model = self.get_model()._meta.get_field(field)
     return self.get_field_model(field) # Recursively call the function to get the value if field is specified
   
+  @timed('get_field_value')
   def get_field_value(self, field=None):
     if self.field_value != None:
       return self.field_value
     if not field:
       field = self.get_value_from_request('field')
-    field = self.get_field(field)
+    value = self.get_field(field)
     # Based on the field model and type, retrieve the value
-    if hasattr(field, 'all') and callable(field.all):
-      # If attributes is a queryset, display each attribute
-      result = field.all()  
-    elif callable(field):
+    if callable(value) and not hasattr(value, 'all'):
       # If attributes is a callable function, add its result to payload
       try:
-        result = field()
+        self.field_value = value()
       except Exception as e:
         # If the function raises an exception, return it as JSON
         raise ValueError(_('error when fetching field: {}').format(str(e)).capitalize())
+    else:
+      self.field_value = self.convert_field_value(value)
+    return self.field_value
+
+  def convert_field_value(self, value):
+    """
+    Convert the value of a field for rendering: related managers are turned
+    into querysets and markdown text fields into html.
+    """
+    if hasattr(value, 'all') and callable(value.all):
+      # If attributes is a queryset, display each attribute
+      queryset = value.all()
+      if isinstance(queryset, BaseModelQuerySet):
+        # Related managers include revoked and deleted objects
+        queryset = queryset.live()
+      return self.using_read_database(queryset)
     elif (
       # Handle textfield values and apply markdown filter if "markdown" is mentioned in the 
       # field's help_text (example: "This field supports markdown")
-      isinstance(field, str) and 
+      isinstance(value, str) and 
       isinstance(self.get_model()._meta.get_field(self.get_value_from_request('field')), TextField) and
       "markdown" in (self.get_model()._meta.get_field(self.get_value_from_request('field')).help_text or "").lower()
     ):
-      result = markdown(field)
+      # Imported on first use, markdown is slow to import
+      from markdown import markdown
+      return markdown(value)
     # Handle non-iterable values directly
-    else:
-      result = field
-    self.field_value = result
-    return self.get_field_value(field) # Recursively call the function to get the value if field is specified
+    return value
 
   def is_related_field(self, field_name=None):
     """
@@ -315,18 +621,62 @@ class JsonUtils(View):
     return isinstance(self.get_field_name(field), (TextField, CharField, IntegerField, BooleanField, DateField, DateTimeField, FloatField))
 
 
+  @timed('search_queryset')
   def search_queryset(self, queryset, q=False):
     if not q:
       q = self.get_value_from_request('q', False)
     if q:
-      ### Add searchable fields from searched model to searchable_fields
-      searchable_fields = ['name', 'title', 'description']
-      if hasattr(queryset.model, 'searchable_fields'):
-        searchable_fields += queryset.model.searchable_fields
-      return self.filter_queryset_by_fields(queryset, searchable_fields, q)
+      return self.filter_queryset_by_fields(queryset, self.get_searchable_fields(queryset.model), q)
     return queryset
+
+  def get_searchable_fields(self, model):
+    ''' Default searchable fields, extended with the searchable_fields of the model '''
+    searchable_fields = ['name', 'title', 'description']
+    if hasattr(model, 'searchable_fields'):
+      searchable_fields += model.searchable_fields
+    return searchable_fields
+
+  def get_visibility_class(self):
+    ''' Identify which objects the requesting user can see, for use in cache keys.
+        Visibility depends on the user itself, so authenticated users each have
+        their own class.
+    '''
+    if self.request.user.is_authenticated:
+      return f'user-{ self.request.user.pk }'
+    return 'anonymous'
     
   
+  def get_render_context(self):
+    ''' The part of the render context that is the same for every attribute, built once per request '''
+    if self.render_context is None:
+      object_name = self.get_object().__class__.__name__.lower()
+      self.render_context = {
+        'perms': PermWrapper(self.request.user),
+        'request': self.request,
+        object_name: self.get_object(),
+        'object_name': object_name,
+      }
+    return self.render_context
+
+  def get_attribute_template(self, field_name, format):
+    """
+    Find the template in templates/objects/ to render the attribute with,
+    once per request. Returns None if no template exists.
+    """
+    key = (field_name, format)
+    if key not in self.templates:
+      object_name = self.get_render_context()['object_name']
+      try:
+        self.templates[key] = select_template([
+          f'objects/{ field_name }.{ format }',
+          f'objects/{ object_name }_{ field_name }.{ format }',
+        ])
+      except TemplateDoesNotExist:
+        self.templates[key] = None
+        self.messages.add(_("{} template for {} not found in objects/ when rendering {}").format(format, field_name, self.get_field_name().name).capitalize(), "debug")
+    return self.templates[key]
+
+  @timed('render_attribute')
   def render_attribute(self, attribute, format='html', context={}):
     """ Returns the attribute as string.
         If a template exists in templates/objects, the string will be 
@@ -338,26 +688,18 @@ class JsonUtils(View):
     else:
       field_name = self.get_field_name().name.lower()
     rendered_attribute = None
-    object_name = self.get_object().__class__.__name__.lower()
-    context = context | {
+    # The per-item context is layered over the context shared by all items
+    context = self.get_render_context() | context | {
       'field_name': field_name,
       field_name: attribute,
-      'perms': PermWrapper(self.request.user),
-      'request': self.request,
-      self.get_object().__class__.__name__.lower(): self.get_object(),
-      'object_name': object_name,
     }
     try:
-      # Try to find the attribute template to render in templates/objects/
-      rendered_attribute = render_to_string(f'objects/{ field_name }.{ format }', context) 
-    except TemplateDoesNotExist:
-      # Try again with extended file name
-      try:
-        rendered_attribute = render_to_string(f'objects/{ object_name }_{ field_name }.{ format }', context)
-      except TemplateDoesNotExist:
+      template = self.get_attribute_template(field_name, format)
+      if template:
+        rendered_attribute = template.render(context)
+        count_render()
+      else:
         # If the template does not exist, return the string representation of the attribute
-        self.messages.add(_("{} template for {} not found in objects/ when rendering {}").format(format, field_name, self.get_field_name().name).capitalize(), "debug")
-        # self.messages.add("Tried {} and {}".format(f'objects/{ field_name }.{ format }', f'objects/{ object_name }_{ field_name }.{ format }'), "debug")
         rendered_attribute = str(attribute)
     except Exception as e:
       self.messages.add(_("error rendering attribute: {}").format(e).capitalize(), "debug")
@@ -369,6 +711,7 @@ class JsonUtils(View):
         raise ValueError(_("error when parsing JSON: {}").format(str(e)).capitalize())
     return rendered_attribute
 
+  @timed('serialization')
   def return_response(self, **kwargs):
     """
     Prepare and return a structured JSON response.
@@ -427,21 +770,43 @@ class JsonUtils(View):
         ValueError: If the related_field_name is invalid for the given model.
     """
     # Query the related model for objects not in the used IDs
-    queryset = model.objects.all()
-    if exclude_queryset:
+    queryset = self.using_read_database(model.objects.all())
+    if exclude_queryset is not None:
       # Fetch the primary keys of the related objects that are already used 
       # and exclude them from the queryset
       used_related_ids = exclude_queryset.values_list('pk', flat=True)
       queryset = queryset.exclude(pk__in=used_related_ids)
     # Apply default filters
-    for filter in ['filter_status', 'filter_visibility']:
-      if hasattr(self, filter):
-        queryset = getattr(self, filter)(queryset)
+    queryset = self.filter_queryset(queryset)
     # Apply additional filters if provided
     if extra_filters:
       queryset = queryset.filter(**extra_filters)
     return queryset
 
+  def filter_queryset(self, queryset):
+    """
+    Limit a queryset to the objects the requesting user is allowed to see.
+
+    Querysets of BaseModel subclasses are limited by status and visibility
+    through BaseModelQuerySet.visible_to(). Other querysets are returned
+    unchanged. Override this method to apply project specific filters.
+    The filter_status and filter_visibility hooks of views written for
+    earlier versions are still applied, but are deprecated.
+
+    Args:
+        queryset (QuerySet): The queryset to filter.
+
+    Returns:
+        QuerySet: The filtered queryset.
+    """
+    if isinstance(queryset, BaseModelQuerySet):
+      queryset = queryset.visible_to(self.request.user)
+    for hook in ['filter_status', 'filter_visibility']:
+      if hasattr(self, hook):
+        warnings.warn(f'{ self.__class__.__name__ }.{ hook }() is deprecated, override filter_queryset() instead.', DeprecationWarning, stacklevel=2)
+        queryset = getattr(self, hook)(queryset)
+    return queryset
+
   def filter_queryset_by_fields(self, queryset, searchable_fields, q):
     """
     Filters a queryset based on a search term in the specified fields.
@@ -498,21 +863,54 @@ class JsonUtils(View):
 
   def get_defaults(self, model=None, fields={}):
     """
-    Get default values for a model.
+    Get default values for a model, see get_defaults().
     """
-    if not model:
-      model = self.get_model()
-    defaults = {}
-    for field in model._meta.get_fields():
-      if field.is_relation:
-        continue
-      if hasattr(field, 'default') and field.default != models.NOT_PROVIDED:
-        defaults[field.name] = field.default
-    if 'user' in [f.name for f in model._meta.get_fields()]:
-      defaults['user'] = self.request.user
-    for field in fields:
-      defaults[field] = fields[field]
-    return defaults
+    return get_defaults(model or self.get_model(), fields, self.request.user)
+
+  def get_case_insensitive_queryset(self, model, field, value, queryset=None):
+    """
+    Filter objects of which the field equals value case-insensitively,
+    comparing Lower(field) so a functional index can be used.
+    """
+    queryset = model.objects.all() if queryset is None else queryset
+    return queryset.alias(lookup_value=Lower(field)).filter(lookup_value=Lower(Value(value)))
+
+  def get_or_create_case_insensitive(self, model, field, value, defaults={}):
+    """
+    Fetch the object of which the field matches value case-insensitively,
+    or create it with the supplied defaults.
+
+    The lookup compares Lower(field) to Lower(value), so it can be answered
+    by a functional index such as the one declared by
+    cmnsdjango.models.case_insensitive_unique(). When a concurrent request
+    inserted the same value first, the resulting IntegrityError is caught
+    and the existing object is returned instead of a duplicate.
+
+    Args:
+        model (models.Model): The model to search in.
+        field (str): The name of the field to compare.
+        value (str): The value to search for.
+        defaults (dict, optional): Field values used when creating the object.
+
+    Returns:
+        tuple: The object and a boolean that is True if the object was created.
+    """
+    queryset = self.get_case_insensitive_queryset(model, field, value)
+    obj = queryset.first()
+    if obj:
+      return obj, False
+    try:
+      # Use a savepoint so a failed insert does not break an outer transaction
+      with transaction.atomic():
+        return model.objects.create(**(defaults | {field: value})), True
+    except IntegrityError:
+      # Another request created the object in the meantime
+      obj = queryset.first()
+      if obj:
+        return obj, False
+      if isinstance(model.objects, BaseModelManager) and self.get_case_insensitive_queryset(model, field, value, model.objects.all_with_deleted()).exists():
+        raise ValueError(_("{} '{}' exists but has been revoked or deleted").format(model._meta.verbose_name, value).capitalize())
+      raise
 
 class DebugView(View):
   def get(self, request, *args, **kwargs):
@@ -522,4 +920,11 @@ class DebugView(View):
       'server_token': server_token,
       'cookie_token': cookie_token,
       'message': 'Tokens logged',
-    })
\ No newline at end of file
+    })
+
+class MetricsView(View):
+  ''' Histograms of the instrumented views in Prometheus text format, staff only '''
+  def get(self, request, *args, **kwargs):
+    if not request.user.is_staff:
+      raise PermissionDenied(_('metrics are only available for staff users').capitalize())
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,115 @@
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import select_template
+from django.utils.html import conditional_escape
+from django.utils.translation import get_language
+
+from cmnsdjango.instrumentation import count_render
+
+''' Overlay Cache
+    The add object overlay of GetJsonAddObjectForm only depends on the
+    model, the field, the create permission and the language, apart from
+    the object the related object is added to. The overlay is rendered once
+    with a placeholder object, whose attributes render as markers, and the
+    result is cached as a skeleton for JSON_OVERLAY_CACHE_TIMEOUT seconds
+    (default 0, the cache is disabled). Every request fills the markers in
+    with the escaped attributes of the object.
+
+    Templates can output attributes of the object, also in {% url %} tags
+    with str or slug converters. Templates that test an attribute, such as
+    {% if object.featured %}, fail with the placeholder, and filters change
+    its marker. The first skeleton is therefore compared with a normal render
+    for the real object. When they differ, or when the template fails with
+    the placeholder (also for example with an int converter), the template
+    is marked as not cacheable and rendered for every request. Comparisons
+    that happen to give the same result for the first object are not
+    detected: only enable the cache for overlays that output attributes.
+'''
+
+MARKER = re.compile(r'--cmnsdjango-object-([\w.]*)--')
+templates = {}  # Chosen overlay template per field, not kept when DEBUG is on
+
+
+def get_overlay_template(field):
+  ''' The overlay for the field, or the generic overlay '''
+  template = templates.get(field)
+  if template is None:
+    template = select_template([f'sections/add_{ field }_overlay.html', 'sections/add_object_overlay.html'])
+    if not settings.DEBUG:
+      templates[field] = template
+  return template
+
+
+class ObjectPlaceholder:
+  """
+  Renders as a marker of its attribute path, such as object.slug.
+  """
+
+  def __init__(self, path=''):
+    self.path = path
+
+  def __getattr__(self, name):
+    if name.startswith('_'):
+      raise AttributeError(name)
+    return ObjectPlaceholder(f'{ self.path }.{ name }' if self.path else name)
+
+  def __str__(self):
+    return f'--cmnsdjango-object-{ self.path }--'
+
+  def __bool__(self):
+    # Fails the render of templates that test an attribute, so they are not cached
+    raise TypeError(f'the overlay tests object.{ self.path }')
+
+
+def resolve(obj, path):
+  ''' The value of an attribute path of the object, like the template would render it '''
+  value = obj
+  for name in filter(None, path.split('.')):
+    value = getattr(value, name)
+    if callable(value):
+      value = value()
+  return conditional_escape(value)
+
+
+class OverlayCache:
+  def __init__(self, template):
+    self.template = template
+    self.timeout = getattr(settings, 'JSON_OVERLAY_CACHE_TIMEOUT', 0)
+
+  def get_key(self, context):
+    identity = sorted((key, str(value)) for key, value in context.items() if key != 'object')
+    digest = hashlib.md5(f'{ self.template.origin.name }:{ get_language() }:{ identity }'.encode()).hexdigest()
+    return f'cmnsdjango:overlay:{ digest }'
+
+  def render_template(self, context):
+    rendered = self.template.render(context)
+    count_render()
+    return rendered
+
+  def render(self, context):
+    if not self.timeout:
+      return self.render_template(context)
+    key = self.get_key(context)
+    skeleton = cache.get(key)
+    if skeleton is None:
+      rendered = self.render_template(context)
+      try:
+        skeleton = self.render_template(context | {'object': ObjectPlaceholder()})
+        if self.fill(skeleton, context['object']) != rendered:
+          # The template tests or filters attributes of the object
+          skeleton = ''
+      except Exception:
+        # The template needs the real object
+        skeleton = ''
+      # An empty skeleton marks the template as not cacheable
+      cache.set(key, skeleton, self.timeout)
+      return rendered
+    if not skeleton:
+      return self.render_template(context)
+    return self.fill(skeleton, context['object'])
+
+  def fill(self, skeleton, obj):
+    return MARKER.sub(lambda match: resolve(obj, match.group(1)), skeleton)
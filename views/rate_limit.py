@@ -0,0 +1,119 @@
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+''' Rate Limiting
+    Sheds requests of clients that call the JSON views too often, for example
+    a runaway script or a held down key on a toggle button, before the view
+    fetches or changes anything. Requests are counted per client (the user,
+    or the IP address for anonymous users), action and (model, field).
+    Enable with JSON_RATE_LIMITING = True.
+
+    Behind a reverse proxy or load balancer REMOTE_ADDR is the address of
+    the proxy, so all anonymous users would share one budget. Set
+    JSON_RATE_LIMIT_PROXIES to the number of proxies in front of Django to
+    take the client address from X-Forwarded-For instead. Only the addresses
+    added by those proxies are used, the client can send any
+    X-Forwarded-For itself.
+
+    The budget of an action is a rate such as '60/m': 60 requests per minute,
+    refilled continuously like a token bucket. It is approximated with two
+    fixed windows in the cache, which are counted with the atomic cache.incr()
+    so all processes share the count when the cache backend is shared: the
+    count of the previous window is weighed by the part of it that still
+    overlaps the last period.
+
+    JSON_RATE_LIMITS overrides the budgets of the actions below, a rate of
+    None disables the limit for that action.
+'''
+
+RATE_LIMITS = {
+  'read': None,       # JsonGetAttributes, JsonEvents
+  'suggest': '120/m', # JsonGetSuggestions, GetJsonAddObjectForm
+  'set': '60/m',      # JsonSetAttribute
+}
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def get_rate(action):
+  if not getattr(settings, 'JSON_RATE_LIMITING', False):
+    return None
+  return (RATE_LIMITS | getattr(settings, 'JSON_RATE_LIMITS', {})).get(action)
+
+def get_client_ip(request):
+  ''' The address of the client, from X-Forwarded-For behind JSON_RATE_LIMIT_PROXIES proxies '''
+  proxies = getattr(settings, 'JSON_RATE_LIMIT_PROXIES', 0)
+  if proxies:
+    # Every proxy appends the address it received the request from
+    forwarded = [address.strip() for address in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if address.strip()]
+    if len(forwarded) >= proxies:
+      return forwarded[-proxies]
+  return request.META.get('REMOTE_ADDR')
+
+def parse_rate(rate):
+  ''' Return (requests, seconds) of a rate such as '60/m' or '10/5s' '''
+  try:
+    count, period = rate.split('/')
+    multiplier = int(period[:-1] or 1)
+    return int(count), multiplier * PERIODS[period[-1]]
+  except (ValueError, KeyError):
+    raise ImproperlyConfigured(f"Invalid rate '{ rate }' in JSON_RATE_LIMITS, use for example '60/m'")
+
+
+class RateLimit:
+  """
+  Count the requests of a key and tell how long to wait when the rate is
+  exceeded. Rejected requests are counted too, so a client that keeps
+  sending requests stays limited.
+  """
+
+  def __init__(self, key, rate):
+    self.key = hashlib.md5(key.encode()).hexdigest()
+    self.limit, self.period = parse_rate(rate)
+
+  def get_window_key(self, window):
+    return f'cmnsdjango:rate:{ self.key }:{ window }'
+
+  def get_retry_after(self, now, current, previous):
+    ''' Seconds until the weighed count is within the limit, or None if it is '''
+    elapsed = now % self.period
+    if previous * (1 - elapsed / self.period) + current <= self.limit:
+      return None
+    if current >= self.limit or not previous:
+      # Wait for the next window
+      return max(1, math.ceil(self.period - elapsed))
+    # Wait until enough of the previous window has passed
+    return max(1, math.ceil(self.period * (1 - (self.limit - current) / previous) - elapsed))
+
+  def hit(self):
+    ''' Count a request, return the seconds to wait if it is over the limit '''
+    now = time.time()
+    window = int(now // self.period)
+    key = self.get_window_key(window)
+    # Keep a window for two periods, it is the previous window in the next period
+    cache.add(key, 0, self.period * 2)
+    try:
+      current = cache.incr(key)
+    except ValueError:
+      # Expired between add() and incr()
+      cache.set(key, 1, self.period * 2)
+      current = 1
+    previous = cache.get(self.get_window_key(window - 1), 0)
+    return self.get_retry_after(now, current, previous)
+
+  async def ahit(self):
+    now = time.time()
+    window = int(now // self.period)
+    key = self.get_window_key(window)
+    await cache.aadd(key, 0, self.period * 2)
+    try:
+      current = await cache.aincr(key)
+    except ValueError:
+      await cache.aset(key, 1, self.period * 2)
+      current = 1
+    previous = await cache.aget(self.get_window_key(window - 1), 0)
+    return self.get_retry_after(now, current, previous)
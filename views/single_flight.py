@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+''' Single Flight
+    Coalesces identical concurrent read requests, so a popular object is
+    rendered once when many clients request it at the same time, for example
+    right after a cache invalidation. The first request of a key computes the
+    response, identical requests wait for its result.
+
+    Within a process, requests wait on a threading.Event or, for async views,
+    an asyncio future. Across processes, the first request takes a lock in
+    the cache with cache.add() and stores the result under the lock token,
+    while the requests of other processes poll for it.
+
+    Enable with JSON_SINGLE_FLIGHT = True. JSON_SINGLE_FLIGHT_TIMEOUT (default
+    10) is the time-to-live in seconds of the lock and the shared result,
+    JSON_SINGLE_FLIGHT_WAIT (default 5) is the maximum time a request waits
+    before computing the response itself. Only successful responses are
+    shared across processes: requests in other processes compute the
+    response themselves as soon as the lock is released without a result.
+
+    Shared responses have the status, content and headers of the response of
+    the first request, but not its cookies, which belong to that client.
+'''
+
+POLL_INTERVAL = 0.05
+UNSHARED_HEADERS = {'content-length', 'set-cookie'}
+
+
+class Flight:
+  def __init__(self):
+    self.event = threading.Event()
+    self.result = None
+
+
+class SingleFlight:
+  """
+  Share the response of one computation with identical concurrent requests.
+  """
+  flights = {}          # Flights in progress in this process, per key
+  async_flights = {}    # Futures in progress per event loop and key
+  lock = threading.Lock()
+
+  def __init__(self, key):
+    self.key = hashlib.md5(key.encode()).hexdigest()
+    self.timeout = getattr(settings, 'JSON_SINGLE_FLIGHT_TIMEOUT', 10)
+    self.wait = getattr(settings, 'JSON_SINGLE_FLIGHT_WAIT', 5)
+
+  def get_lock_key(self):
+    return f'cmnsdjango:flight:{ self.key }:lock'
+
+  def get_result_key(self, token):
+    return f'cmnsdjango:flight:{ self.key }:{ token }'
+
+  def to_result(self, response):
+    headers = [(name, value) for name, value in response.items() if name.lower() not in UNSHARED_HEADERS]
+    return (response.status_code, response.content, headers)
+
+  def to_response(self, result):
+    ''' Every request gets its own response object '''
+    status, content, headers = result
+    return HttpResponse(content, status=status, headers=dict(headers))
+
+  ''' Synchronous views '''
+  def run(self, compute):
+    with self.lock:
+      flight = self.flights.get(self.key)
+      leader = flight is None
+      if leader:
+        flight = self.flights[self.key] = Flight()
+    if not leader:
+      if flight.event.wait(self.wait) and flight.result:
+        return self.to_response(flight.result)
+      return compute()
+    try:
+      response = self.compute_shared(compute)
+      flight.result = self.to_result(response)
+      return response
+    finally:
+      with self.lock:
+        del self.flights[self.key]
+      flight.event.set()
+
+  def compute_shared(self, compute):
+    ''' Compute the response once across processes '''
+    token = uuid.uuid4().hex
+    if cache.add(self.get_lock_key(), token, self.timeout):
+      try:
+        response = compute()
+        if response.status_code == 200:
+          cache.set(self.get_result_key(token), self.to_result(response), self.timeout)
+        return response
+      finally:
+        cache.delete(self.get_lock_key())
+    token = cache.get(self.get_lock_key())
+    deadline = time.monotonic() + self.wait
+    while token and time.monotonic() < deadline:
+      result = cache.get(self.get_result_key(token))
+      if result:
+        return self.to_response(result)
+      if cache.get(self.get_lock_key()) != token:
+        # Released without a result, the response was not successful
+        break
+      time.sleep(POLL_INTERVAL)
+    return compute()
+
+  ''' Asynchronous views '''
+  async def arun(self, compute):
+    key = (id(asyncio.get_running_loop()), self.key)
+    future = self.async_flights.get(key)
+    if future is not None:
+      try:
+        result = await asyncio.wait_for(asyncio.shield(future), self.wait)
+      except asyncio.TimeoutError:
+        result = None
+      if result:
+        return self.to_response(result)
+      return await compute()
+    future = self.async_flights[key] = asyncio.get_running_loop().create_future()
+    result = None
+    try:
+      response = await self.acompute_shared(compute)
+      result = self.to_result(response)
+      return response
+    finally:
+      del self.async_flights[key]
+      future.set_result(result)
+
+  async def acompute_shared(self, compute):
+    token = uuid.uuid4().hex
+    if await cache.aadd(self.get_lock_key(), token, self.timeout):
+      try:
+        response = await compute()
+        if response.status_code == 200:
+          await cache.aset(self.get_result_key(token), self.to_result(response), self.timeout)
+        return response
+      finally:
+        await cache.adelete(self.get_lock_key())
+    token = await cache.aget(self.get_lock_key())
+    deadline = time.monotonic() + self.wait
+    while token and time.monotonic() < deadline:
+      result = await cache.aget(self.get_result_key(token))
+      if result:
+        return self.to_response(result)
+      if await cache.aget(self.get_lock_key()) != token:
+        # Released without a result, the response was not successful
+        break
+      await asyncio.sleep(POLL_INTERVAL)
+    return await compute()
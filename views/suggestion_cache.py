@@ -0,0 +1,154 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, TextField
+
+''' Suggestion Cache
+    Caches the candidates that matched a suggestion search, so that the next
+    keystroke can be answered by narrowing the cached candidates in memory
+    instead of running the full text search again. Searches are case-insensitive
+    substring matches, so every object matching "abc" also matches "ab".
+
+    Candidates are cached per model, searchable fields and visibility class,
+    for SUGGESTION_CACHE_TIMEOUT seconds (default 60, 0 disables the cache).
+    Searches with more than SUGGESTION_CACHE_MAX_CANDIDATES results (default
+    250) are not cached. Saving or deleting an object of a model invalidates
+    its cached candidates, see invalidate().
+'''
+
+MIN_QUERY_LENGTH = 2
+
+def get_version_key(model):
+  return f'cmnsdjango:suggest:{ model._meta.label_lower }:version'
+
+def invalidate(sender, **kwargs):
+  ''' Signal receiver to invalidate the cached candidates of a model '''
+  try:
+    cache.incr(get_version_key(sender))
+  except ValueError:
+    # Nothing cached for this model
+    pass
+
+
+class SuggestionCache:
+  """
+  Prefix cache for the candidates of a suggestion search.
+  """
+
+  def __init__(self, model, searchable_fields, visibility_class):
+    self.model = model
+    self.visibility_class = visibility_class
+    self.timeout = getattr(settings, 'SUGGESTION_CACHE_TIMEOUT', 60)
+    self.max_candidates = getattr(settings, 'SUGGESTION_CACHE_MAX_CANDIDATES', 250)
+    field_names = [field.name for field in model._meta.get_fields()]
+    self.fields = [field for field in searchable_fields if field in field_names]
+    # Narrowing in memory only works for text stored on the model itself
+    self.enabled = bool(self.timeout) and bool(self.fields) and all(
+      isinstance(model._meta.get_field(field), (CharField, TextField)) for field in self.fields
+    )
+
+  def get_key(self, q, version):
+    digest = hashlib.md5(f'{ ",".join(self.fields) }:{ q.lower() }'.encode()).hexdigest()
+    return f'cmnsdjango:suggest:{ self.model._meta.label_lower }:{ version }:{ self.visibility_class }:{ digest }'
+
+  def get_version(self):
+    # Start at the current time, so an evicted version key does not revive old entries
+    cache.add(get_version_key(self.model), int(time.time()), None)
+    return cache.get(get_version_key(self.model))
+
+  async def aget_version(self):
+    await cache.aadd(get_version_key(self.model), int(time.time()), None)
+    return await cache.aget(get_version_key(self.model))
+
+  def is_cacheable(self, q):
+    return self.enabled and len(q) >= MIN_QUERY_LENGTH
+
+  def get_prefix_keys(self, q, version):
+    ''' Cache keys of q and its prefixes, mapped to the prefix length '''
+    return {self.get_key(q[:length], version): length for length in range(len(q), MIN_QUERY_LENGTH - 1, -1)}
+
+  def narrow(self, q, keys, cached):
+    """
+    Narrow the candidates of the longest cached prefix of q.
+
+    Returns:
+        tuple: The candidates matching q, and True if they were narrowed
+        from a shorter prefix and should be cached for q.
+    """
+    # Use the longest cached prefix, it has the fewest candidates
+    key = max(cached, key=lambda key: keys[key])
+    candidates = cached[key]
+    if keys[key] == len(q):
+      return candidates, False
+    needle = q.lower()
+    return [candidate for candidate in candidates if needle in candidate[1]], True
+
+  def to_candidates(self, rows):
+    ''' Convert (pk, *fields) rows to (pk, searchable text) candidates, or None if there are too many '''
+    if len(rows) > self.max_candidates:
+      return None
+    return [(row[0], '\n'.join(str(value) for value in row[1:] if value).lower()) for row in rows]
+
+  def get_rows_queryset(self, queryset):
+    return queryset.values_list('pk', *self.fields)[:self.max_candidates + 1]
+
+  def get(self, q):
+    """
+    Return the primary keys of cached candidates matching q, or None if
+    neither q nor a prefix of q is cached.
+    """
+    if not self.is_cacheable(q):
+      return None
+    version = self.get_version()
+    keys = self.get_prefix_keys(q, version)
+    cached = cache.get_many(keys.keys())
+    if not cached:
+      return None
+    candidates, narrowed = self.narrow(q, keys, cached)
+    if narrowed:
+      cache.set(self.get_key(q, version), candidates, self.timeout)
+    return [candidate[0] for candidate in candidates]
+
+  async def aget(self, q):
+    ''' Async version of get() '''
+    if not self.is_cacheable(q):
+      return None
+    version = await self.aget_version()
+    keys = self.get_prefix_keys(q, version)
+    cached = await cache.aget_many(keys.keys())
+    if not cached:
+      return None
+    candidates, narrowed = self.narrow(q, keys, cached)
+    if narrowed:
+      await cache.aset(self.get_key(q, version), candidates, self.timeout)
+    return [candidate[0] for candidate in candidates]
+
+  def fetch(self, queryset, q):
+    """
+    Evaluate the candidates of a searched queryset and cache them.
+
+    Returns:
+        list or None: The primary keys of the candidates, or None if there
+        are too many candidates to cache.
+    """
+    if not self.is_cacheable(q):
+      return None
+    version = self.get_version()
+    candidates = self.to_candidates(list(self.get_rows_queryset(queryset)))
+    if candidates is None:
+      return None
+    cache.set(self.get_key(q, version), candidates, self.timeout)
+    return [candidate[0] for candidate in candidates]
+
+  async def afetch(self, queryset, q):
+    ''' Async version of fetch() '''
+    if not self.is_cacheable(q):
+      return None
+    version = await self.aget_version()
+    candidates = self.to_candidates([row async for row in self.get_rows_queryset(queryset)])
+    if candidates is None:
+      return None
+    await cache.aset(self.get_key(q, version), candidates, self.timeout)
+    return [candidate[0] for candidate in candidates]